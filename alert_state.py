@@ -0,0 +1,127 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_ALERT_STATE_PATH = os.getenv("ALERT_STATE_DB", "alert_state.db")
+
+LEVEL_RANK = {"low": 0, "medium": 1, "high": 2, "critical": 3}
+
+# Minimum gap before the same (or a lower) level is re-sent to the same subject and location.
+DEFAULT_COOLDOWNS = {
+    "critical": 6 * 3600,
+    "high": 12 * 3600,
+    "medium": 24 * 3600,
+    "low": 24 * 3600,
+}
+
+class AlertStateStore:
+    """Persistent record of sent alerts, used to suppress repeats during multi-day episodes"""
+    def __init__(self, path: str = DEFAULT_ALERT_STATE_PATH, cooldowns: Optional[Dict[str, float]] = None) -> None:
+        self.path = path
+        self.cooldowns = dict(DEFAULT_COOLDOWNS, **(cooldowns or {}))
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS alert_state ("
+            "subject TEXT NOT NULL, location TEXT NOT NULL, level TEXT NOT NULL, last_sent REAL NOT NULL, "
+            "PRIMARY KEY (subject, location, level))"
+        )
+        self._conn.commit()
+        # Everything is mirrored in memory so the per-send check never touches disk.
+        self._state: Dict[Tuple[str, str], Dict[str, float]] = {}
+        for subject, location, level, last_sent in self._conn.execute("SELECT subject, location, level, last_sent FROM alert_state"):
+            self._state.setdefault((subject, location), {})[level] = last_sent
+        # (subject, location, level) -> last_sent before an in-flight claim, restored if the send fails.
+        self._claims: Dict[Tuple[str, str, str], Optional[float]] = {}
+
+    @staticmethod
+    def _normalize_location(location: str) -> str:
+        return location.strip().lower()
+
+    def should_send(self, subject: str, location: str, level: str, now: Optional[float] = None) -> bool:
+        """False while this level, or any higher one, is still inside its cooldown for the subject."""
+        now = time.time() if now is None else now
+        with self._lock:
+            return self._should_send_locked(subject, self._normalize_location(location), level, now)
+
+    def _should_send_locked(self, subject: str, location: str, level: str, now: float) -> bool:
+        rank = LEVEL_RANK[level]
+        for sent_level, last_sent in self._state.get((subject, location), {}).items():
+            # Escalations always go out; repeats and de-escalations wait for the cooldown.
+            if LEVEL_RANK[sent_level] >= rank and now - last_sent < self.cooldowns[sent_level]:
+                return False
+        return True
+
+    def claim(self, subjects: List[str], location: str, level: str, now: Optional[float] = None) -> Tuple[List[str], List[str]]:
+        """Split subjects into (to_send, suppressed) and reserve the to_send ones in one step.
+
+        Reservations only live in memory: a concurrent sender for the same location sees them as
+        sent, record_many() makes the successful ones durable and release() hands back the rest.
+        """
+        now = time.time() if now is None else now
+        location = self._normalize_location(location)
+        to_send, suppressed = [], []
+        with self._lock:
+            for subject in subjects:
+                if not self._should_send_locked(subject, location, level, now):
+                    suppressed.append(subject)
+                    continue
+                sent = self._state.setdefault((subject, location), {})
+                self._claims[(subject, location, level)] = sent.get(level)
+                sent[level] = now
+                to_send.append(subject)
+        return to_send, suppressed
+
+    def release(self, subjects: List[str], location: str, level: str) -> None:
+        """Give back claims whose send failed, restoring what was recorded before them."""
+        location = self._normalize_location(location)
+        with self._lock:
+            for subject in subjects:
+                key = (subject, location, level)
+                if key not in self._claims:
+                    continue
+                previous = self._claims.pop(key)
+                sent = self._state.get((subject, location), {})
+                if previous is None:
+                    sent.pop(level, None)
+                else:
+                    sent[level] = previous
+
+    def record_sent(self, subject: str, location: str, level: str, now: Optional[float] = None) -> None:
+        self.record_many([subject], location, level, now)
+
+    def record_many(self, subjects: List[str], location: str, level: str, now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        location = self._normalize_location(location)
+        with self._lock:
+            for subject in subjects:
+                self._state.setdefault((subject, location), {})[level] = now
+                self._claims.pop((subject, location, level), None)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO alert_state (subject, location, level, last_sent) VALUES (?, ?, ?, ?)",
+                [(subject, location, level, now) for subject in subjects]
+            )
+            self._conn.commit()
+
+    def partition(self, subjects: List[str], location: str, level: str, now: Optional[float] = None) -> Tuple[List[str], List[str]]:
+        """Split subjects into (to_send, suppressed)."""
+        to_send, suppressed = [], []
+        for subject in subjects:
+            (to_send if self.should_send(subject, location, level, now) else suppressed).append(subject)
+        return to_send, suppressed
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+_stores: Dict[str, AlertStateStore] = {}
+_stores_lock = threading.Lock()
+
+def get_alert_state_store(path: str = DEFAULT_ALERT_STATE_PATH) -> AlertStateStore:
+    """Process-wide store per database path, so every sender shares one in-memory view."""
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = AlertStateStore(path)
+        return _stores[path]
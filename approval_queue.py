@@ -0,0 +1,242 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional
+from threshold_agent import AlertLevel
+
+DEFAULT_APPROVAL_QUEUE_PATH = os.getenv("APPROVAL_QUEUE_DB", "approval_queue.db")
+# An alert still SENDING this long after it was claimed belongs to a dispatcher that died mid-send.
+DEFAULT_SENDING_TIMEOUT = float(os.getenv("APPROVAL_SENDING_TIMEOUT", "900"))
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+APPROVED = "approved"
+REJECTED = "rejected"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+
+@dataclass
+class PendingAlert:
+    id: str
+    created_at: float
+    status: str
+    alert_level: str
+    reason: str
+    location: str
+    aqi_data: Dict[str, float]
+    recipients: List[str]
+    decided_at: Optional[float] = None
+    decided_by: Optional[str] = None
+    deliveries: Optional[List[Dict]] = None
+    claimed_at: Optional[float] = None
+
+class ApprovalQueue:
+    """Persistent queue of alerts awaiting operator approval, dispatched asynchronously once approved"""
+    def __init__(self, path: str = DEFAULT_APPROVAL_QUEUE_PATH, poll_interval: float = 5.0, sending_timeout: float = DEFAULT_SENDING_TIMEOUT) -> None:
+        self.path = path
+        self.poll_interval = poll_interval
+        self.sending_timeout = sending_timeout
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pending_alerts ("
+            "id TEXT PRIMARY KEY, created_at REAL NOT NULL, status TEXT NOT NULL, alert_level TEXT NOT NULL, "
+            "reason TEXT NOT NULL, location TEXT NOT NULL, aqi_data TEXT NOT NULL, recipients TEXT NOT NULL, "
+            "decided_at REAL, decided_by TEXT, deliveries TEXT, claimed_at REAL)"
+        )
+        if "claimed_at" not in [column[1] for column in self._conn.execute("PRAGMA table_info(pending_alerts)")]:
+            self._conn.execute("ALTER TABLE pending_alerts ADD COLUMN claimed_at REAL")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_pending_alerts_status ON pending_alerts (status, created_at)")
+        self._conn.commit()
+        self._wake = threading.Event()
+        self._dispatcher: Optional[threading.Thread] = None
+        self._notification_agent = None
+
+    def submit(self, alert_level: str, reason: str, aqi_data: Dict[str, float], recipients: List[str], location: str) -> str:
+        alert_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO pending_alerts (id, created_at, status, alert_level, reason, location, aqi_data, recipients) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (alert_id, time.time(), PENDING, alert_level, reason, location, json.dumps(aqi_data), json.dumps(recipients))
+            )
+            self._conn.commit()
+        return alert_id
+
+    def _row_to_alert(self, row: tuple) -> PendingAlert:
+        return PendingAlert(
+            id=row[0], created_at=row[1], status=row[2], alert_level=row[3], reason=row[4], location=row[5],
+            aqi_data=json.loads(row[6]), recipients=json.loads(row[7]), decided_at=row[8], decided_by=row[9],
+            deliveries=json.loads(row[10]) if row[10] else None, claimed_at=row[11]
+        )
+
+    def get(self, alert_id: str) -> Optional[PendingAlert]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM pending_alerts WHERE id = ?", (alert_id,)).fetchone()
+        return self._row_to_alert(row) if row else None
+
+    def list(self, status: Optional[str] = PENDING, limit: int = 100) -> List[PendingAlert]:
+        with self._lock:
+            if status is None:
+                rows = self._conn.execute("SELECT * FROM pending_alerts ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+            else:
+                rows = self._conn.execute("SELECT * FROM pending_alerts WHERE status = ? ORDER BY created_at LIMIT ?", (status, limit)).fetchall()
+        return [self._row_to_alert(row) for row in rows]
+
+    def _decide(self, alert_ids: List[str], status: str, decided_by: Optional[str]) -> int:
+        with self._lock:
+            cursor = self._conn.executemany(
+                "UPDATE pending_alerts SET status = ?, decided_at = ?, decided_by = ? WHERE id = ? AND status = ?",
+                [(status, time.time(), decided_by, alert_id, PENDING) for alert_id in alert_ids]
+            )
+            self._conn.commit()
+            changed = cursor.rowcount
+        if status == APPROVED and changed:
+            self._wake.set()
+        return changed
+
+    def approve(self, alert_id: str, decided_by: Optional[str] = None) -> bool:
+        return self._decide([alert_id], APPROVED, decided_by) == 1
+
+    def reject(self, alert_id: str, decided_by: Optional[str] = None) -> bool:
+        return self._decide([alert_id], REJECTED, decided_by) == 1
+
+    def approve_all(self, alert_ids: Optional[List[str]] = None, decided_by: Optional[str] = None) -> int:
+        """Approve the given pending alerts, or every pending alert when no ids are passed."""
+        if alert_ids is None:
+            alert_ids = [alert.id for alert in self.list(PENDING, limit=10000)]
+        return self._decide(alert_ids, APPROVED, decided_by)
+
+    def _claim_next_approved(self) -> Optional[PendingAlert]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM pending_alerts WHERE status = ? ORDER BY created_at LIMIT 1", (APPROVED,)).fetchone()
+            if row is None:
+                return None
+            # Conditional update so two dispatchers sharing the database never send the same alert.
+            cursor = self._conn.execute(
+                "UPDATE pending_alerts SET status = ?, claimed_at = ? WHERE id = ? AND status = ?",
+                (SENDING, time.time(), row[0], APPROVED)
+            )
+            self._conn.commit()
+            if cursor.rowcount != 1:
+                return None
+        return self._row_to_alert(row)
+
+    def _fail_abandoned(self) -> int:
+        """Mark alerts whose dispatcher died mid-send as FAILED; returns how many were found.
+
+        They are not re-sent: sends are not idempotent and some recipients may already have the SMS.
+        """
+        deliveries = json.dumps([{"error": "Dispatcher stopped while sending; some recipients may have been messaged"}])
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE pending_alerts SET status = ?, deliveries = ? WHERE status = ? AND (claimed_at IS NULL OR claimed_at < ?)",
+                (FAILED, deliveries, SENDING, time.time() - self.sending_timeout)
+            )
+            self._conn.commit()
+        return cursor.rowcount
+
+    def _finish(self, alert_id: str, status: str, deliveries: List[Dict]) -> None:
+        with self._lock:
+            self._conn.execute("UPDATE pending_alerts SET status = ?, deliveries = ? WHERE id = ?", (status, json.dumps(deliveries), alert_id))
+            self._conn.commit()
+
+    def start_dispatcher(self, notification_agent) -> bool:
+        """Send approved alerts in the background through notification_agent.send_bulk_sms.
+
+        Returns False, keeping the current agent, when a dispatcher is already running.
+        """
+        with self._lock:
+            if self._dispatcher and self._dispatcher.is_alive():
+                return False
+            self._notification_agent = notification_agent
+            self._dispatcher = threading.Thread(target=self._dispatch_forever, name="approval-dispatcher", daemon=True)
+        self._dispatcher.start()
+        return True
+
+    def _dispatch_forever(self) -> None:
+        while True:
+            try:
+                if not self._dispatch_next():
+                    # Approvals from this process wake us at once; other processes are picked up by polling.
+                    self._wake.wait(self.poll_interval)
+                    self._wake.clear()
+            except Exception:
+                # A locked or unavailable database must not kill the only sender; try again next poll.
+                logger.exception("approval dispatcher failed; retrying in %.0fs", self.poll_interval)
+                time.sleep(self.poll_interval)
+
+    def _dispatch_next(self) -> bool:
+        """Send the oldest approved alert; returns False when there was nothing to send."""
+        abandoned = self._fail_abandoned()
+        if abandoned:
+            logger.warning("marked %d abandoned SENDING alert(s) as failed", abandoned)
+        alert = self._claim_next_approved()
+        if alert is None:
+            return False
+        try:
+            results = self._notification_agent.send_bulk_sms(
+                recipients=alert.recipients,
+                alert_level=AlertLevel(alert.alert_level),
+                aqi_data=alert.aqi_data,
+                reason=alert.reason,
+                location=alert.location,
+                **self._notification_agent.bulk_options
+            )
+        except Exception as e:
+            self._finish(alert.id, FAILED, [{"error": str(e)}])
+            return True
+        all_failed = results and not any(r.success or r.suppressed for r in results)
+        self._finish(alert.id, FAILED if all_failed else SENT, [asdict(result) for result in results])
+        return True
+
+_queues: Dict[str, ApprovalQueue] = {}
+_queues_lock = threading.Lock()
+
+def get_approval_queue(path: str = DEFAULT_APPROVAL_QUEUE_PATH) -> ApprovalQueue:
+    """Process-wide queue per database path."""
+    with _queues_lock:
+        if path not in _queues:
+            _queues[path] = ApprovalQueue(path)
+        return _queues[path]
+
+if __name__ == "__main__":
+    import argparse
+    from alert_state import DEFAULT_ALERT_STATE_PATH
+    parser = argparse.ArgumentParser(description="Review alerts waiting for SMS approval")
+    parser.add_argument("command", choices=["list", "approve", "reject", "approve-all", "dispatch"])
+    parser.add_argument("alert_ids", nargs="*")
+    parser.add_argument("--db", default=DEFAULT_APPROVAL_QUEUE_PATH)
+    parser.add_argument("--by", default=os.getenv("USER"))
+    parser.add_argument("--alert-state-db", default=DEFAULT_ALERT_STATE_PATH, help="cooldown store shared with the pipeline (dispatch only)")
+    args = parser.parse_args()
+    queue = ApprovalQueue(args.db)
+    if args.command == "list":
+        for alert in queue.list():
+            print(f"{alert.id}  {alert.alert_level.upper():8}  {alert.location}  {len(alert.recipients)} recipients  {alert.reason}")
+    elif args.command == "dispatch":
+        # Long-running sender for approved alerts, using Twilio credentials from the environment.
+        # Built like the pipeline's agent, so sends claim and record recipient cooldowns in the same store.
+        from notification_agent import NotificationAgent
+        NotificationAgent.from_config({
+            'account_sid': os.environ["TWILIO_ACCOUNT_SID"],
+            'auth_token': os.environ["TWILIO_AUTH_TOKEN"],
+            'from_number': os.environ["TWILIO_FROM_NUMBER"],
+            'approval_queue_path': args.db,
+            'alert_state_path': args.alert_state_db
+        })
+        print(f"Dispatching approved alerts from {args.db} (Ctrl+C to stop)")
+        threading.Event().wait()
+    elif args.command == "approve-all":
+        print(f"Approved {queue.approve_all(args.alert_ids or None, args.by)} alerts")
+    else:
+        decide = queue.approve if args.command == "approve" else queue.reject
+        for alert_id in args.alert_ids:
+            print(f"{alert_id}: {'ok' if decide(alert_id, args.by) else 'not pending'}")
@@ -1,27 +1,73 @@
-from typing import Dict
-import requests
-from datetime import datetime
+from typing import Dict, List, Optional
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from readings import AQIReading
+from cache import SHARED_CACHE, STALE_FALLBACK_SECONDS, fetch_through, location_key
+from resilience import call_upstream
+from tracing import count
+
+logger = logging.getLogger(__name__)
+
+# OpenWeatherMap recomputes its air-pollution forecast hourly; cache entries live
+# until the next hour boundary (plus a small grace period for publication lag).
+FORECAST_CADENCE_SECONDS = 3600
+FORECAST_GRACE_SECONDS = 120
+COORDINATES_TTL_SECONDS = 7 * 24 * 3600
+AQI_TTL_SECONDS = 600
+# A location's UTC offset only changes at DST transitions, so a day-old value is close enough.
+UTC_OFFSET_TTL_SECONDS = 24 * 3600
+
+def _seconds_until_next_cycle(now: Optional[float] = None) -> float:
+    now = time.time() if now is None else now
+    return FORECAST_CADENCE_SECONDS - (now % FORECAST_CADENCE_SECONDS) + FORECAST_GRACE_SECONDS
+
+class AQIAnalyzer:
+    """Fetch AQI and weather data using OpenWeatherMap API"""
+    _fetch_locks: Dict[tuple, threading.Lock] = {}
+    _fetch_locks_guard = threading.Lock()
+    _forecast_locations: Dict[tuple, tuple] = {}
+    _refresh_thread: Optional[threading.Thread] = None
 
-class 
     def __init__(self, api_key: str) -> None:
         self.api_key = api_key
         self.base_geo_url = "http://api.openweathermap.org/geo/1.0/direct"
         self.base_air_url = "http://api.openweathermap.org/data/2.5/air_pollution"
+        self.base_forecast_url = "http://api.openweathermap.org/data/2.5/air_pollution/forecast"
         self.base_weather_url = "http://api.openweathermap.org/data/2.5/weather"
 
+    @classmethod
+    def _lock_for(cls, key: tuple) -> threading.Lock:
+        with cls._fetch_locks_guard:
+            return cls._fetch_locks.setdefault(key, threading.Lock())
+
+    def _get_json(self, url: str):
+        return call_upstream("openweathermap", self._request_json, url)
+
+    def _request_json(self, url: str):
+        # Deferred so importing the analyzer (and everything that builds on it) stays cheap.
+        import requests
+        response = requests.get(url, timeout=10)
+        response.raise_for_status()
+        return response.json()
+
     def _get_coordinates(self, city: str, state: str, country: str) -> tuple:
+        cache_key = ("coords",) + location_key(city, state, country)
+        cached = SHARED_CACHE.get(cache_key)
+        if cached:
+            return cached
         if state and state.lower() != 'none':
             location_query = f"{city},{state},{country}"
         else:
             location_query = f"{city},{country}"
         geo_url = f"{self.base_geo_url}?q={location_query}&limit=1&appid={self.api_key}"
-        response = requests.get(geo_url, timeout=10)
-        response.raise_for_status()
-        geo_data = response.json()
+        geo_data = self._get_json(geo_url)
         if not geo_data:
             raise ValueError(f"No coordinates found for {location_query}")
         lat = geo_data[0]['lat']
         lon = geo_data[0]['lon']
+        SHARED_CACHE.set(cache_key, (lat, lon), ttl=COORDINATES_TTL_SECONDS)
         return lat, lon
 
     def _convert_aqi_scale(self, aqi: int) -> int:
@@ -29,39 +75,215 @@ class
         return aqi_mapping.get(aqi, 0)
 
     def fetch_aqi_data(self, city: str, state: str, country: str) -> Dict[str, float]:
+        return self.fetch_reading(city, state, country).to_dict()
+
+    def fetch_reading(self, city: str, state: str, country: str) -> AQIReading:
+        """Current reading as a typed record; batch and grid callers use this instead of the legacy dict."""
+        # Cached (or stale-while-revalidating) readings return without waiting on OpenWeatherMap.
+        return fetch_through(("aqi",) + location_key(city, state, country), self.refresh_reading, city, state, country, source="aqi")
+
+    def refresh_aqi_data(self, city: str, state: str, country: str, ttl: Optional[float] = None) -> Dict[str, float]:
+        """Fetch current AQI and weather from upstream and store them in the shared cache."""
+        return self.refresh_reading(city, state, country, ttl).to_dict()
+
+    def refresh_reading(self, city: str, state: str, country: str, ttl: Optional[float] = None) -> AQIReading:
+        reading = self._download_reading(city, state, country)
+        # Readings are immutable once cached; callers that need the dict get a fresh copy from to_dict().
+        SHARED_CACHE.set(("aqi",) + location_key(city, state, country), reading, ttl=AQI_TTL_SECONDS if ttl is None else ttl)
+        # Make sure the hourly forecast for this location is warm for the prompt.
+        self._track_forecast_location(city, state, country)
+        return reading
+
+    def fetch_reading_at(self, lat: float, lon: float) -> AQIReading:
+        """Air-quality reading for a coordinate (no weather), cached per ~10 m cell; used by aqi_grid."""
+        return fetch_through(self._point_key(lat, lon), self.refresh_reading_at, lat, lon, source="aqi_point")
+
+    def refresh_reading_at(self, lat: float, lon: float, ttl: Optional[float] = None) -> AQIReading:
+        reading = self._download_reading_at(lat, lon, with_weather=False)
+        SHARED_CACHE.set(self._point_key(lat, lon), reading, ttl=AQI_TTL_SECONDS if ttl is None else ttl)
+        return reading
+
+    def _point_key(self, lat: float, lon: float) -> tuple:
+        return ("aqi_point", round(lat, 4), round(lon, 4))
+
+    def _utc_offset_key(self, lat: float, lon: float) -> tuple:
+        return ("utc_offset", round(lat, 4), round(lon, 4))
+
+    def _utc_offset(self, city: str, state: str, country: str) -> int:
+        """The location's offset from UTC in seconds, from the OpenWeatherMap weather response; 0 if unavailable."""
+        try:
+            lat, lon = self._get_coordinates(city, state, country)
+            cached = SHARED_CACHE.get(self._utc_offset_key(lat, lon))
+            if cached is not None:
+                return cached
+            weather_url = f"{self.base_weather_url}?lat={lat}&lon={lon}&appid={self.api_key}"
+            offset = int(self._get_json(weather_url).get('timezone', 0))
+        except Exception as exc:
+            logger.warning("No UTC offset for %s, %s; forecast times shown in UTC: %s", city, country, exc)
+            return 0
+        SHARED_CACHE.set(self._utc_offset_key(lat, lon), offset, ttl=UTC_OFFSET_TTL_SECONDS)
+        return offset
+
+    def _download_reading(self, city: str, state: str, country: str) -> AQIReading:
         lat, lon = self._get_coordinates(city, state, country)
+        return self._download_reading_at(lat, lon)
+
+    def _download_reading_at(self, lat: float, lon: float, with_weather: bool = True) -> AQIReading:
         air_url = f"{self.base_air_url}?lat={lat}&lon={lon}&appid={self.api_key}"
-        air_response = requests.get(air_url, timeout=10)
-        air_response.raise_for_status()
-        air_data = air_response.json()
-        weather_url = f"{self.base_weather_url}?lat={lat}&lon={lon}&appid={self.api_key}&units=metric"
-        weather_response = requests.get(weather_url, timeout=10)
-        weather_response.raise_for_status()
-        weather_data = weather_response.json()
+        air_data = self._get_json(air_url)
         components = air_data['list'][0]['components']
         aqi_raw = air_data['list'][0]['main']['aqi']
-        aqi_converted = self._convert_aqi_scale(aqi_raw)
-        temperature = weather_data['main']['temp']
-        humidity = weather_data['main']['humidity']
-        wind_speed = weather_data['wind']['speed'] * 3.6
-        timestamp = datetime.fromtimestamp(air_data['list'][0]['dt']).strftime('%Y-%m-%d %H:%M:%S')
-        result = {
-            'aqi': aqi_converted,
-            'aqi_category': self._get_aqi_category(aqi_raw),
-            'temperature': temperature,
-            'humidity': humidity,
-            'wind_speed': wind_speed,
-            'pm25': components.get('pm2_5', 0),
-            'pm10': components.get('pm10', 0),
-            'co': components.get('co', 0),
-            'no2': components.get('no2', 0),
-            'o3': components.get('o3', 0),
-            'so2': components.get('so2', 0),
-            'timestamp': timestamp
-        }
-        return result
+        weather = {}
+        if with_weather:
+            weather_url = f"{self.base_weather_url}?lat={lat}&lon={lon}&appid={self.api_key}&units=metric"
+            weather_data = self._get_json(weather_url)
+            if 'timezone' in weather_data:
+                SHARED_CACHE.set(self._utc_offset_key(lat, lon), weather_data['timezone'], ttl=UTC_OFFSET_TTL_SECONDS)
+            weather = {
+                'temperature': weather_data['main']['temp'],
+                'humidity': weather_data['main']['humidity'],
+                'wind_speed': weather_data['wind']['speed'] * 3.6
+            }
+        return AQIReading(
+            aqi=self._convert_aqi_scale(aqi_raw),
+            aqi_category=self._get_aqi_category(aqi_raw),
+            pm25=components.get('pm2_5', 0),
+            pm10=components.get('pm10', 0),
+            co=components.get('co', 0),
+            no2=components.get('no2', 0),
+            o3=components.get('o3', 0),
+            so2=components.get('so2', 0),
+            timestamp=float(air_data['list'][0]['dt']),
+            lat=lat,
+            lon=lon,
+            **weather
+        )
+
+    def fetch_forecast(self, city: str, state: str, country: str) -> List[Dict[str, float]]:
+        """Return the hourly air-pollution forecast, fetched at most once per location per cycle."""
+        loc_key = location_key(city, state, country)
+        cache_key = ("forecast",) + loc_key
+        cached = SHARED_CACHE.get(cache_key)
+        if cached is not None:
+            return cached
+        with self._lock_for(cache_key):
+            # Another caller may have fetched it while we waited for the lock.
+            cached = SHARED_CACHE.get(cache_key)
+            if cached is not None:
+                return cached
+            try:
+                forecast = self._download_forecast(city, state, country)
+            except Exception as exc:
+                stale = SHARED_CACHE.get_entry(cache_key, stale_for=STALE_FALLBACK_SECONDS)
+                if stale is None:
+                    raise
+                logger.warning("Serving cached forecast for %s, %s: %s", city, country, exc)
+                return stale[0]
+            SHARED_CACHE.set(cache_key, forecast, ttl=_seconds_until_next_cycle())
+        self._track_forecast_location(city, state, country)
+        return forecast
+
+    def _download_forecast(self, city: str, state: str, country: str) -> List[Dict[str, float]]:
+        lat, lon = self._get_coordinates(city, state, country)
+        forecast_url = f"{self.base_forecast_url}?lat={lat}&lon={lon}&appid={self.api_key}"
+        hours = []
+        for entry in self._get_json(forecast_url).get('list', []):
+            aqi_raw = entry['main']['aqi']
+            components = entry.get('components', {})
+            hours.append({
+                'dt': entry['dt'],
+                'aqi': self._convert_aqi_scale(aqi_raw),
+                'aqi_category': self._get_aqi_category(aqi_raw),
+                'pm25': components.get('pm2_5', 0),
+                'pm10': components.get('pm10', 0)
+            })
+        return hours
+
+    def best_window(self, forecast: List[Dict[str, float]], hours: int = 12, window_hours: int = 2, now: Optional[float] = None) -> Optional[Dict[str, float]]:
+        """Find the contiguous window with the lowest mean PM2.5 in the next `hours` hours."""
+        now = time.time() if now is None else now
+        upcoming = [h for h in forecast if now - FORECAST_CADENCE_SECONDS < h['dt'] <= now + hours * 3600]
+        if not upcoming:
+            return None
+        window_hours = max(1, min(window_hours, len(upcoming)))
+        best = None
+        for start in range(len(upcoming) - window_hours + 1):
+            window = upcoming[start:start + window_hours]
+            avg_pm25 = sum(h['pm25'] for h in window) / window_hours
+            avg_aqi = sum(h['aqi'] for h in window) / window_hours
+            if best is None or (avg_pm25, avg_aqi) < (best['avg_pm25'], best['avg_aqi']):
+                best = {
+                    'start': window[0]['dt'],
+                    'end': window[-1]['dt'] + FORECAST_CADENCE_SECONDS,
+                    'avg_pm25': avg_pm25,
+                    'avg_aqi': avg_aqi,
+                    'aqi_category': max(window, key=lambda h: h['aqi'])['aqi_category']
+                }
+        worst = max(upcoming, key=lambda h: (h['pm25'], h['aqi']))
+        best['worst_hour'] = worst['dt']
+        best['worst_aqi'] = worst['aqi']
+        best['worst_category'] = worst['aqi_category']
+        return best
+
+    def get_forecast_summary(self, city: str, state: str, country: str, hours: int = 12, window_hours: int = 2) -> str:
+        """Precomputed "best window in the next N hours" text for the recommendation prompt."""
+        cache_key = ("forecast_summary",) + location_key(city, state, country) + (hours, window_hours)
+        cached = SHARED_CACHE.get(cache_key)
+        if cached is not None:
+            count("cache.forecast.hit")
+            return cached
+        count("cache.forecast.miss")
+        window = self.best_window(self.fetch_forecast(city, state, country), hours, window_hours)
+        if window is None:
+            summary = f"No hourly forecast available for the next {hours} hours."
+        else:
+            offset = self._utc_offset(city, state, country)
+            fmt = lambda ts: self._format_hour(ts, offset)
+            summary = (
+                f"Best {window_hours}h window in the next {hours}h: {fmt(window['start'])}-{fmt(window['end'])} "
+                f"(AQI ~{window['avg_aqi']:.0f} {window['aqi_category']}, PM2.5 ~{window['avg_pm25']:.1f} µg/m³). "
+                f"Worst hour: {fmt(window['worst_hour'])} (AQI {window['worst_aqi']} {window['worst_category']})."
+            )
+        # The summary is only as fresh as the forecast it was computed from.
+        SHARED_CACHE.set(cache_key, summary, ttl=_seconds_until_next_cycle())
+        return summary
+
+    def _format_hour(self, ts: float, utc_offset: int = 0) -> str:
+        """Local time at the location, labelled with its offset, e.g. "Tue 14:00 UTC+05:30"."""
+        return datetime.fromtimestamp(ts, timezone(timedelta(seconds=utc_offset))).strftime('%a %H:%M %Z')
+
+    def _track_forecast_location(self, city: str, state: str, country: str) -> None:
+        loc_key = location_key(city, state, country)
+        with self._fetch_locks_guard:
+            self._forecast_locations[loc_key] = (city, state, country)
+        self.start_forecast_refresh()
+
+    def start_forecast_refresh(self) -> None:
+        """Start (once per process) a daemon thread that re-fetches tracked forecasts each cycle."""
+        with self._fetch_locks_guard:
+            if AQIAnalyzer._refresh_thread and AQIAnalyzer._refresh_thread.is_alive():
+                return
+            thread = threading.Thread(target=self._refresh_forecasts_forever, name="aqi-forecast-refresh", daemon=True)
+            AQIAnalyzer._refresh_thread = thread
+        thread.start()
+
+    def _refresh_forecasts_forever(self) -> None:
+        while True:
+            time.sleep(_seconds_until_next_cycle())
+            with self._fetch_locks_guard:
+                locations = list(self._forecast_locations.values())
+            for city, state, country in locations:
+                try:
+                    forecast = self._download_forecast(city, state, country)
+                except Exception:
+                    # Keep serving callers; the next cycle or an on-demand fetch will retry.
+                    continue
+                loc_key = location_key(city, state, country)
+                SHARED_CACHE.set(("forecast",) + loc_key, forecast, ttl=_seconds_until_next_cycle())
+                for key in SHARED_CACHE.keys("forecast_summary"):
+                    if key[1:4] == loc_key:
+                        SHARED_CACHE.delete(key)
 
     def _get_aqi_category(self, aqi: int) -> str:
         categories = {1: "Good", 2: "Fair", 3: "Moderate", 4: "Poor", 5: "Very Poor"}
         return categories.get(aqi, "Unknown")
-
@@ -0,0 +1,256 @@
+import contextvars
+import logging
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+from aqi_analyzer import AQI_TTL_SECONDS, AQIAnalyzer
+from cache import SHARED_CACHE, SWR_WINDOW_SECONDS
+from fingerprint import POLLUTANT_BANDS, band
+from rate_limit import Priority, request_priority
+from readings import POLLUTANTS, AQIReading, ReadingBatch
+from singleflight import SINGLE_FLIGHT
+from tracing import count
+
+try:
+    import numpy as np
+except ImportError:  # without numpy, fields answer by direct IDW over the stations instead of a precomputed raster
+    np = None
+
+logger = logging.getLogger(__name__)
+
+GRID_WORKERS = int(os.getenv("AQI_GRID_WORKERS", "8"))
+# Inverse-distance weighting exponent; 2 is the usual choice for air-quality surfaces.
+IDW_POWER = 2.0
+# Raster cell size (~275 m) for precomputed fields; queries between cells are bilinear.
+RASTER_RESOLUTION_DEG = 0.0025
+RASTER_PADDING_DEG = 0.01
+# Upper bound on raster cells x stations (the size of the IDW weight matrix); larger fields get coarser cells.
+RASTER_MAX_CELL_STATIONS = int(os.getenv("AQI_RASTER_MAX_CELL_STATIONS", "2000000"))
+FIELDS = ("aqi",) + POLLUTANTS
+KM_PER_DEG_LAT = 110.57
+KM_PER_DEG_LON_EQUATOR = 111.32
+
+@dataclass(frozen=True)
+class Ward:
+    name: str
+    area: str
+    lat: float
+    lon: float
+
+# BMC's 24 administrative wards with approximate centroids.
+MUMBAI_WARDS = [
+    Ward("A", "Colaba, Fort", 18.920, 72.830), Ward("B", "Dongri, Sandhurst Road", 18.955, 72.835),
+    Ward("C", "Kalbadevi, Marine Lines", 18.948, 72.827), Ward("D", "Malabar Hill, Grant Road", 18.960, 72.810),
+    Ward("E", "Byculla", 18.975, 72.835), Ward("F/S", "Parel", 19.000, 72.840),
+    Ward("F/N", "Matunga, Sion", 19.030, 72.855), Ward("G/S", "Worli", 19.010, 72.818),
+    Ward("G/N", "Dadar, Mahim, Dharavi", 19.035, 72.845), Ward("H/E", "Bandra East, Santacruz East", 19.070, 72.850),
+    Ward("H/W", "Bandra West, Khar", 19.065, 72.830), Ward("K/E", "Andheri East", 19.115, 72.870),
+    Ward("K/W", "Andheri West, Juhu", 19.125, 72.830), Ward("L", "Kurla", 19.070, 72.885),
+    Ward("M/E", "Govandi, Mankhurd", 19.050, 72.925), Ward("M/W", "Chembur", 19.060, 72.900),
+    Ward("N", "Ghatkopar", 19.085, 72.910), Ward("P/S", "Goregaon", 19.160, 72.850),
+    Ward("P/N", "Malad", 19.190, 72.845), Ward("R/S", "Kandivali", 19.205, 72.850),
+    Ward("R/C", "Borivali", 19.230, 72.855), Ward("R/N", "Dahisar", 19.255, 72.860),
+    Ward("S", "Bhandup, Vikhroli, Powai", 19.130, 72.930), Ward("T", "Mulund", 19.170, 72.955),
+]
+# Cities with ward-level fields, keyed like location_key's city part.
+CITY_WARDS: Dict[str, List[Ward]] = {"mumbai": MUMBAI_WARDS}
+
+def category_for_aqi(aqi: float) -> str:
+    # Inverse of AQIAnalyzer._convert_aqi_scale's 25/75/125/175/250 steps.
+    for limit, category in ((50, "Good"), (100, "Fair"), (150, "Moderate"), (200, "Poor")):
+        if aqi <= limit:
+            return category
+    return "Very Poor"
+
+def grid_points(south: float, west: float, north: float, east: float, rows: int, cols: int) -> List[Tuple[float, float]]:
+    """rows x cols evenly spaced (lat, lon) points covering the bounding box, corners included."""
+    lat_step = (north - south) / max(1, rows - 1)
+    lon_step = (east - west) / max(1, cols - 1)
+    return [(south + i * lat_step, west + j * lon_step) for i in range(rows) for j in range(cols)]
+
+def pm25_band_text(pm25: float) -> str:
+    """The NAQI PM2.5 band a concentration falls in, e.g. "61-90 µg/m³"."""
+    edges = POLLUTANT_BANDS["pm25"]
+    index = band(pm25, edges)
+    if index == 0:
+        return f"0-{edges[0]:g} µg/m³"
+    if index == len(edges):
+        return f">{edges[-1]:g} µg/m³"
+    return f"{edges[index - 1] + 1:g}-{edges[index]:g} µg/m³"
+
+class AQIField:
+    """Continuous AQI and pollutant surface interpolated (IDW) from point readings"""
+    def __init__(self, batch: ReadingBatch, names: Optional[Sequence[str]] = None, power: float = IDW_POWER, resolution: float = RASTER_RESOLUTION_DEG) -> None:
+        if not len(batch):
+            raise ValueError("AQIField needs at least one reading")
+        self.power = power
+        self.names = list(names) if names is not None else [f"{lat:.4f},{lon:.4f}" for lat, lon in zip(batch.columns["lat"], batch.columns["lon"])]
+        self.lats = list(batch.columns["lat"])
+        self.lons = list(batch.columns["lon"])
+        self.values: Dict[str, List[float]] = {"aqi": [float(v) for v in batch.aqi]}
+        self.values.update({name: list(batch.columns[name]) for name in POLLUTANTS})
+        self.stations: Dict[str, Dict[str, float]] = {
+            name: {field: self.values[field][i] for field in FIELDS} for i, name in enumerate(self.names)
+        }
+        self._lon_scale = math.cos(math.radians(sum(self.lats) / len(self.lats))) * KM_PER_DEG_LON_EQUATOR
+        self.south = min(self.lats) - RASTER_PADDING_DEG
+        self.west = min(self.lons) - RASTER_PADDING_DEG
+        self.north = max(self.lats) + RASTER_PADDING_DEG
+        self.east = max(self.lons) + RASTER_PADDING_DEG
+        self.resolution = self._fit_resolution(resolution)
+        self._raster = self._build_raster() if np is not None else None
+
+    def _raster_shape(self, resolution: float) -> Tuple[int, int]:
+        return int(math.ceil((self.north - self.south) / resolution)) + 1, int(math.ceil((self.east - self.west) / resolution)) + 1
+
+    def _fit_resolution(self, resolution: float) -> float:
+        """The requested cell size, coarsened until cells x stations fits RASTER_MAX_CELL_STATIONS."""
+        rows, cols = self._raster_shape(resolution)
+        while rows * cols * len(self.names) > RASTER_MAX_CELL_STATIONS:
+            resolution *= math.sqrt(rows * cols * len(self.names) / RASTER_MAX_CELL_STATIONS) * 1.05
+            rows, cols = self._raster_shape(resolution)
+        return resolution
+
+    def _build_raster(self) -> "np.ndarray":
+        rows, cols = self._raster_shape(self.resolution)
+        lats = self.south + np.arange(rows) * self.resolution
+        lons = self.west + np.arange(cols) * self.resolution
+        grid_lat, grid_lon = np.meshgrid(lats, lons, indexing="ij")
+        # (rows, cols, fields): each cell is the IDW blend of every station.
+        return self.values_at(grid_lat.ravel(), grid_lon.ravel()).reshape(rows, cols, len(FIELDS))
+
+    def values_at(self, lats: "np.ndarray", lons: "np.ndarray") -> "np.ndarray":
+        """Vectorized IDW for many points at once: an (n, len(FIELDS)) array (requires numpy)."""
+        station_lat = np.asarray(self.lats)
+        station_lon = np.asarray(self.lons)
+        dy = (np.asarray(lats)[:, None] - station_lat[None, :]) * KM_PER_DEG_LAT
+        dx = (np.asarray(lons)[:, None] - station_lon[None, :]) * self._lon_scale
+        dist = np.hypot(dx, dy)
+        with np.errstate(divide="ignore"):
+            weights = 1.0 / dist ** self.power
+        exact = dist < 1e-6
+        hit_rows = exact.any(axis=1)
+        # A point on a station takes that station's value exactly.
+        weights[hit_rows] = exact[hit_rows]
+        weights /= weights.sum(axis=1, keepdims=True)
+        return weights @ np.column_stack([self.values[field] for field in FIELDS])
+
+    def _idw(self, lat: float, lon: float, field: str) -> float:
+        total = weight_sum = 0.0
+        for station_lat, station_lon, value in zip(self.lats, self.lons, self.values[field]):
+            dist = math.hypot((lat - station_lat) * KM_PER_DEG_LAT, (lon - station_lon) * self._lon_scale)
+            if dist < 1e-6:
+                return value
+            weight = 1.0 / dist ** self.power
+            total += weight * value
+            weight_sum += weight
+        return total / weight_sum
+
+    def value_at(self, lat: float, lon: float, field: str = "aqi") -> float:
+        """Interpolated value at a coordinate: a bilinear raster lookup inside the field's box, direct IDW outside it."""
+        if self._raster is None or not (self.south <= lat < self.north and self.west <= lon < self.east):
+            return self._idw(lat, lon, field)
+        k = FIELDS.index(field)
+        fi = (lat - self.south) / self.resolution
+        fj = (lon - self.west) / self.resolution
+        i, j = int(fi), int(fj)
+        di, dj = fi - i, fj - j
+        r = self._raster
+        top = r[i, j, k] * (1 - dj) + r[i, j + 1, k] * dj
+        bottom = r[i + 1, j, k] * (1 - dj) + r[i + 1, j + 1, k] * dj
+        return float(top * (1 - di) + bottom * di)
+
+    def reading_at(self, lat: float, lon: float) -> Dict[str, float]:
+        values = {field: self.value_at(lat, lon, field) for field in FIELDS}
+        values["aqi"] = round(values["aqi"])
+        values["aqi_category"] = category_for_aqi(values["aqi"])
+        return values
+
+    def station(self, name: str) -> Optional[Dict[str, float]]:
+        """The measured values at a named station (a ward centroid); microsecond dict lookup."""
+        return self.stations.get(name)
+
+    def nearest_station(self, lat: float, lon: float) -> str:
+        """Name of the closest station, e.g. the ward a coordinate falls in."""
+        nearest = min(range(len(self.names)), key=lambda i: math.hypot((lat - self.lats[i]) * KM_PER_DEG_LAT, (lon - self.lons[i]) * self._lon_scale))
+        return self.names[nearest]
+
+    def summary_text(self, top: int = 3) -> str:
+        """Compact neighbourhood breakdown for prompts.
+
+        AQI is rounded to 5 and PM2.5 given as its NAQI band, so small drifts leave the text
+        (and the stage-memo fingerprints built from it) unchanged.
+        """
+        def rounded(aqi: float) -> int:
+            return int(5 * round(aqi / 5))
+        ranked = sorted(self.stations.items(), key=lambda item: (-rounded(item[1]["aqi"]), item[0]))
+        def describe(name: str, values: Dict[str, float]) -> str:
+            aqi = rounded(values["aqi"])
+            return f"{name} {aqi} ({category_for_aqi(aqi)}, PM2.5 {pm25_band_text(values['pm25'])})"
+        worst = ", ".join(describe(name, values) for name, values in ranked[:top])
+        best = ", ".join(describe(name, values) for name, values in ranked[::-1][:top])
+        return f"{len(ranked)} neighbourhoods; worst: {worst}; cleanest: {best}"
+
+class AQIGrid:
+    """Fetches point readings concurrently through AQIAnalyzer's cache and builds interpolated fields"""
+    def __init__(self, analyzer: AQIAnalyzer, max_workers: int = GRID_WORKERS) -> None:
+        self.analyzer = analyzer
+        self.max_workers = max_workers
+
+    def fetch_points(self, points: Sequence[Tuple[float, float]]) -> List[Optional[AQIReading]]:
+        """Readings for each point in order (None where the fetch failed), fetched concurrently."""
+        def fetch(lat: float, lon: float) -> Optional[AQIReading]:
+            try:
+                return self.analyzer.fetch_reading_at(lat, lon)
+            except Exception as exc:
+                logger.warning("No AQI reading at %.4f,%.4f: %s", lat, lon, exc)
+                count("aqi_grid.failed_points")
+                return None
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, max(1, len(points))), thread_name_prefix="aqi-grid") as executor:
+            # Each worker runs in the caller's context so cache counters and freshness land on this request.
+            futures = [executor.submit(contextvars.copy_context().run, fetch, lat, lon) for lat, lon in points]
+            return [future.result() for future in futures]
+
+    def build_field(self, points: Sequence[Tuple[float, float]], names: Optional[Sequence[str]] = None) -> AQIField:
+        readings = self.fetch_points(points)
+        names = list(names) if names is not None else [f"{lat:.4f},{lon:.4f}" for lat, lon in points]
+        kept = [(name, reading) for name, reading in zip(names, readings) if reading is not None]
+        if not kept:
+            raise ValueError("No AQI readings available for any grid point")
+        return AQIField(ReadingBatch.from_readings(reading for _, reading in kept), [name for name, _ in kept])
+
+    def grid_field(self, south: float, west: float, north: float, east: float, rows: int, cols: int) -> AQIField:
+        return self.build_field(grid_points(south, west, north, east, rows, cols))
+
+    def ward_field(self, city: str, wait: bool = True) -> Optional[AQIField]:
+        """Interpolated field over the city's ward centroids; None if the city has no wards.
+
+        Fresh fields return at once and stale ones return while a background refresh runs.
+        With nothing cached, wait=False starts that refresh and returns None instead of
+        blocking on one rate-limited call per ward.
+        """
+        wards = CITY_WARDS.get(city.strip().lower())
+        if not wards:
+            return None
+        cache_key = ("aqi_field", city.strip().lower())
+        field = SHARED_CACHE.get(cache_key)
+        if field is not None:
+            return field
+        stale = SHARED_CACHE.get_entry(cache_key, stale_for=SWR_WINDOW_SECONDS)
+        if stale is None and wait:
+            return SINGLE_FLIGHT.do(cache_key, self._refresh_ward_field, cache_key, wards)
+        SINGLE_FLIGHT.do_in_background(cache_key, self._refresh_ward_field, cache_key, wards, Priority.BATCH)
+        return stale[0] if stale is not None else None
+
+    def _refresh_ward_field(self, cache_key: tuple, wards: List[Ward], priority: Priority = Priority.INTERACTIVE) -> AQIField:
+        # Background refreshes queue behind interactive requests for OpenWeatherMap tokens.
+        with request_priority(priority):
+            field = self.build_field([(ward.lat, ward.lon) for ward in wards], [ward.name for ward in wards])
+        SHARED_CACHE.set(cache_key, field, ttl=AQI_TTL_SECONDS)
+        return field
+
+    def neighbourhood_summary(self, city: str, wait: bool = True) -> Optional[str]:
+        field = self.ward_field(city, wait)
+        return field.summary_text() if field is not None else None
@@ -0,0 +1,189 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import threading
+from concurrent.futures import FIRST_COMPLETED, Executor, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, Optional, Set, TextIO, Tuple, Union
+from pydantic import ValidationError
+from llm_budget import budget_caller
+from rate_limit import Priority, request_priority
+from schemas import AnalyzeRequest, AnalyzeResponse
+
+# Columns that carry JSON objects when the input is CSV.
+JSON_COLUMNS = ("healthcare_api_data", "epidemic_signal", "resource_status")
+
+def read_inputs(path: str) -> Iterator[Tuple[str, Union[Dict, json.JSONDecodeError]]]:
+    """Yield (input id, row) from a JSONL or CSV file; rows without an `id` are numbered by position.
+
+    A line or JSON cell that does not parse is yielded as its JSONDecodeError so the run can
+    report it as invalid and carry on.
+    """
+    handle = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+    try:
+        if path.lower().endswith(".csv"):
+            for index, row in enumerate(csv.DictReader(handle), start=1):
+                row = {k: v for k, v in row.items() if v not in (None, "")}
+                input_id = str(row.pop("id", index))
+                try:
+                    for column in JSON_COLUMNS:
+                        if column in row:
+                            row[column] = json.loads(row[column])
+                except json.JSONDecodeError as e:
+                    yield input_id, json.JSONDecodeError(f"{column}: {e.msg}", e.doc, e.pos)
+                    continue
+                yield input_id, row
+        else:
+            for index, line in enumerate(handle, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield str(index), e
+                    continue
+                if not isinstance(row, dict):
+                    yield str(index), json.JSONDecodeError("expected a JSON object", line, 0)
+                    continue
+                yield str(row.pop("id", index)), row
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+
+def load_checkpoint(path: Optional[str]) -> Set[str]:
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as f:
+        return {line.strip() for line in f if line.strip()}
+
+# Per-worker pipeline state. agno Agents keep per-run state, so each worker thread
+# (and so each process-pool worker) builds its own set of agents.
+_worker_local = threading.local()
+_worker_notification_config: Optional[Dict] = None
+_worker_reuse_within: Optional[float] = None
+_worker_caller: Optional[str] = None
+_worker_lock = threading.Lock()
+
+def _init_worker(notification_config: Optional[Dict], reuse_within: Optional[float], caller: Optional[str] = None) -> None:
+    global _worker_notification_config, _worker_reuse_within, _worker_caller
+    _worker_notification_config = notification_config
+    _worker_reuse_within = reuse_within
+    _worker_caller = caller
+
+def _invalid_json(input_id: str, error: json.JSONDecodeError) -> Dict:
+    """The same record shape as a validation failure, for a row that is not valid JSON."""
+    return {"id": input_id, "status": "invalid", "error": [{"type": "json_invalid", "loc": [], "msg": str(error)}]}
+
+def _analyze(input_id: str, row: Dict) -> Dict:
+    """Run one input through the pipeline and return its NDJSON record; never raises."""
+    # Imported here so process-pool workers load the pipeline themselves.
+    from main import build_agents, run_analysis
+    try:
+        request = AnalyzeRequest.model_validate(row)
+    except ValidationError as e:
+        return {"id": input_id, "status": "invalid", "error": json.loads(e.json())}
+    agents = getattr(_worker_local, "agents", None)
+    if agents is None:
+        with _worker_lock:
+            agents = _worker_local.agents = build_agents()
+    options = {} if _worker_reuse_within is None else {"reuse_within": _worker_reuse_within}
+    try:
+        # Batch work yields upstream quota to interactive requests sharing the rate limits.
+        with budget_caller(_worker_caller), request_priority(Priority.BATCH):
+            result = run_analysis(
+                request.to_user_input(),
+                healthcare_api_data=request.healthcare_api_data,
+                epidemic_signal=request.epidemic_signal,
+                resource_status=request.resource_status,
+                agents=agents,
+                notification_config=_worker_notification_config,
+                **options
+            )
+    except Exception as e:
+        return {"id": input_id, "status": "error", "error": str(e)}
+    return {"id": input_id, "status": "ok", "result": AnalyzeResponse.from_result(result).model_dump()}
+
+class BatchRunner:
+    """Fans inputs out over a worker pool and streams one NDJSON record per input as each completes"""
+    def __init__(self, workers: int = 4, processes: bool = False, notification_config: Optional[Dict] = None, reuse_within: Optional[float] = None, checkpoint_path: Optional[str] = None, caller: Optional[str] = "batch") -> None:
+        self.workers = workers
+        self.processes = processes
+        self.notification_config = notification_config
+        self.reuse_within = reuse_within
+        self.checkpoint_path = checkpoint_path
+        self.caller = caller
+        self.stats = {"ok": 0, "error": 0, "invalid": 0, "skipped": 0}
+
+    def _executor(self) -> Executor:
+        if self.processes:
+            # Each process has its own caches; share rate limits across them with RATE_LIMIT_STATE_DIR.
+            return ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(self.notification_config, self.reuse_within, self.caller))
+        _init_worker(self.notification_config, self.reuse_within, self.caller)
+        return ThreadPoolExecutor(self.workers, thread_name_prefix="batch")
+
+    def run(self, inputs: Iterator[Tuple[str, Union[Dict, json.JSONDecodeError]]], out: TextIO) -> Dict[str, int]:
+        done = load_checkpoint(self.checkpoint_path)
+        checkpoint = open(self.checkpoint_path, "a", encoding="utf-8") if self.checkpoint_path else None
+        # Keep a bounded window in flight so huge input files are streamed, not loaded whole.
+        max_in_flight = self.workers * 2
+        pending = set()
+        try:
+            with self._executor() as executor:
+                for input_id, row in inputs:
+                    if input_id in done:
+                        self.stats["skipped"] += 1
+                        continue
+                    if isinstance(row, json.JSONDecodeError):
+                        self._write(_invalid_json(input_id, row), out, checkpoint)
+                        continue
+                    if len(pending) >= max_in_flight:
+                        finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        self._emit(finished, out, checkpoint)
+                    pending.add(executor.submit(_analyze, input_id, row))
+                while pending:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    self._emit(finished, out, checkpoint)
+        finally:
+            if checkpoint:
+                checkpoint.close()
+        return self.stats
+
+    def _emit(self, finished, out: TextIO, checkpoint: Optional[TextIO]) -> None:
+        for future in finished:
+            self._write(future.result(), out, checkpoint)
+
+    def _write(self, record: Dict, out: TextIO, checkpoint: Optional[TextIO]) -> None:
+        self.stats[record["status"]] += 1
+        out.write(json.dumps(record, default=str) + "\n")
+        out.flush()
+        # Checkpoint only successes, after the record is written: a crash can repeat
+        # an input on resume but never lose one, and failures are retried.
+        if checkpoint and record["status"] == "ok":
+            checkpoint.write(record["id"] + "\n")
+            checkpoint.flush()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the analysis pipeline over a JSONL or CSV file of locations and profiles, writing NDJSON")
+    parser.add_argument("input", help="JSONL or .csv file of AnalyzeRequest rows (optional `id` column); - for JSONL on stdin")
+    parser.add_argument("-o", "--output", default="-", help="NDJSON output path (appended to), default stdout")
+    parser.add_argument("--checkpoint", help="file of completed input ids; inputs listed there are skipped on resume")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--processes", action="store_true", help="use a process pool instead of threads")
+    parser.add_argument("--reuse-within", type=float, help="seconds an identical stored run is reused (default RUN_REUSE_SECONDS)")
+    parser.add_argument("--caller", default="batch", help="name the LLM token budget is charged to")
+    parser.add_argument("--notification-config", help="JSON file with Twilio settings and recipients; alerts are queued for approval")
+    args = parser.parse_args()
+    notification_config = None
+    if args.notification_config:
+        with open(args.notification_config, encoding="utf-8") as f:
+            notification_config = json.load(f)
+    runner = BatchRunner(args.workers, args.processes, notification_config, args.reuse_within, args.checkpoint, args.caller)
+    out = sys.stdout if args.output == "-" else open(args.output, "a", encoding="utf-8")
+    try:
+        stats = runner.run(read_inputs(args.input), out)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(json.dumps(stats), file=sys.stderr)
+    sys.exit(1 if stats["error"] or stats["invalid"] else 0)
@@ -0,0 +1,164 @@
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+from singleflight import SINGLE_FLIGHT
+from tracing import count
+
+logger = logging.getLogger(__name__)
+
+
+def location_key(city: str, state: str, country: str) -> tuple:
+    """Normalised (city, state, country) key used for every per-location cache entry."""
+    state = state if state and state.lower() != 'none' else ''
+    return (city.strip().lower(), state.strip().lower(), country.strip().lower())
+
+
+class TTLCache:
+    """Thread-safe, size-bounded in-process cache whose entries expire after a per-entry TTL"""
+    def __init__(self, default_ttl: float = 600, max_entries: int = 10000, keep_expired_for: float = 6 * 3600, purge_every: float = 60) -> None:
+        self.default_ttl = default_ttl
+        # Least recently used entries are evicted beyond this many.
+        self.max_entries = max_entries
+        # Expired entries stay servable as stale fallbacks for this long, then are purged.
+        self.keep_expired_for = keep_expired_for
+        self.purge_every = purge_every
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_purge = time.time()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self.get_entry(key)
+        return entry[0] if entry else None
+
+    def get_entry(self, key: Hashable, stale_for: float = 0) -> Optional[Tuple[Any, float]]:
+        """Return (value, stored_at) for an entry that expired less than `stale_for` seconds ago, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, stored_at, expires_at = entry
+            if time.time() >= expires_at + stale_for:
+                return None
+            self._entries.move_to_end(key)
+            return value, stored_at
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        now = time.time()
+        with self._lock:
+            self._entries[key] = (value, now, now + (self.default_ttl if ttl is None else ttl))
+            self._entries.move_to_end(key)
+            if now - self._last_purge >= self.purge_every:
+                self._purge_expired(now)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                count("cache.evicted")
+
+    def _purge_expired(self, now: float) -> None:
+        cutoff = now - self.keep_expired_for
+        expired = [k for k, (_, _, expires_at) in self._entries.items() if expires_at < cutoff]
+        for k in expired:
+            del self._entries[k]
+        self._last_purge = now
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def keys(self, namespace: Optional[str] = None) -> List[Hashable]:
+        with self._lock:
+            keys = list(self._entries)
+        if namespace is None:
+            return keys
+        return [k for k in keys if isinstance(k, tuple) and k and k[0] == namespace]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# How long past expiry an entry may still be served when its upstream is failing.
+STALE_FALLBACK_SECONDS = 6 * 3600
+# Stale-while-revalidate: entries expired less than this long ago are served at once
+# while a background refresh runs. 0 turns the mode off (callers wait for upstream).
+SWR_WINDOW_SECONDS = float(os.getenv("SWR_WINDOW_SECONDS", "1800"))
+
+# Process-wide cache shared by every analyzer/agent instance, so data fetched for
+# one user's request is reused by the next user asking about the same location.
+SHARED_CACHE = TTLCache(
+    max_entries=int(os.getenv("CACHE_MAX_ENTRIES", "10000")), keep_expired_for=max(STALE_FALLBACK_SECONDS, SWR_WINDOW_SECONDS)
+)
+
+@dataclass
+class Freshness:
+    """How old the data behind one part of a result is"""
+    fetched_at: Optional[float]
+    stale: bool = False
+    revalidating: bool = False
+
+    def as_dict(self, now: Optional[float] = None) -> Dict[str, Any]:
+        now = time.time() if now is None else now
+        age = None if self.fetched_at is None else round(max(0.0, now - self.fetched_at), 1)
+        return {"fetched_at": self.fetched_at, "age_seconds": age, "stale": self.stale, "revalidating": self.revalidating}
+
+_freshness: contextvars.ContextVar = contextvars.ContextVar("data_freshness", default=None)
+
+@contextmanager
+def track_freshness() -> Iterator[Dict[str, Freshness]]:
+    """Collect the Freshness of every source fetched inside the block, keyed by source."""
+    collected: Dict[str, Freshness] = {}
+    token = _freshness.set(collected)
+    try:
+        yield collected
+    finally:
+        _freshness.reset(token)
+
+def note_freshness(source: str, freshness: Freshness) -> None:
+    collected = _freshness.get()
+    if collected is not None:
+        collected[source] = freshness
+
+def fetch_through(cache_key: tuple, refresh: Callable[..., Any], *args, source: str, swr_window: Optional[float] = None) -> Any:
+    """Serve cache_key from SHARED_CACHE, calling refresh(*args) to fill it.
+
+    Fresh entries return at once. Within the stale-while-revalidate window the stale
+    value returns at once and refresh runs in the background. Otherwise callers wait
+    for refresh (coalesced per key), falling back to anything within
+    STALE_FALLBACK_SECONDS if it fails.
+    """
+    swr_window = SWR_WINDOW_SECONDS if swr_window is None else swr_window
+    entry = SHARED_CACHE.get_entry(cache_key)
+    if entry is not None:
+        count(f"cache.{source}.hit")
+        note_freshness(source, Freshness(entry[1]))
+        return entry[0]
+    if swr_window > 0:
+        stale = SHARED_CACHE.get_entry(cache_key, stale_for=swr_window)
+        if stale is not None:
+            count(f"cache.{source}.stale")
+            revalidating = SINGLE_FLIGHT.do_in_background(cache_key, refresh, *args)
+            note_freshness(source, Freshness(stale[1], stale=True, revalidating=revalidating or SINGLE_FLIGHT.is_in_flight(cache_key)))
+            return stale[0]
+    count(f"cache.{source}.miss")
+    try:
+        # Concurrent misses for the same key share a single upstream fetch.
+        value = SINGLE_FLIGHT.do(cache_key, refresh, *args)
+    except Exception as exc:
+        stale = SHARED_CACHE.get_entry(cache_key, stale_for=STALE_FALLBACK_SECONDS)
+        if stale is None:
+            raise
+        count(f"cache.{source}.stale")
+        logger.warning("Serving cached %s for %s: %s", source, cache_key[1:], exc)
+        note_freshness(source, Freshness(stale[1], stale=True))
+        return stale[0]
+    note_freshness(source, Freshness(time.time()))
+    return value
@@ -0,0 +1,312 @@
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Event metrics are summed per time bucket; gauges keep each facility's latest value.
+EVENT_METRICS = ("admissions", "er_visits")
+GAUGE_METRICS = ("beds_occupied", "beds_total")
+FEED_WINDOW_HOURS = float(os.getenv("FEED_WINDOW_HOURS", "24"))
+FEED_BUCKET_MINUTES = float(os.getenv("FEED_BUCKET_MINUTES", "60"))
+# Facilities beyond this many are evicted least-recently-updated first, so memory stays bounded.
+FEED_MAX_FACILITIES = int(os.getenv("FEED_MAX_FACILITIES", "10000"))
+# The "recent" part of the window that trends compare against the whole window.
+TREND_HOURS = 6
+# Longest rendering of an arbitrary caller-supplied payload in a prompt.
+PAYLOAD_CHAR_LIMIT = 1200
+
+def state_key(state: Optional[str]) -> str:
+    # Same normalisation as hospital_resources.get_hospital_count.
+    return (state or "").lower().replace(" ", "")
+
+def _parse_timestamp(value: Any) -> Optional[float]:
+    if value in (None, ""):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(str(value).strip()).timestamp()
+
+def _parse_number(value: Any) -> Optional[float]:
+    if value in (None, "", "NA"):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    return float(str(value).replace(",", ""))
+
+def iter_feed(path: str) -> Iterator[Optional[Dict]]:
+    """Yield feed rows one at a time from a JSONL or CSV file (- for JSONL on stdin) without loading it whole.
+
+    A JSONL line that does not parse is yielded as None, which FeedAggregator.ingest counts as skipped.
+    """
+    handle = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+    try:
+        if path.lower().endswith(".csv"):
+            for row in csv.DictReader(handle):
+                yield {k: v for k, v in row.items() if v not in (None, "")}
+        else:
+            for line in handle:
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    yield None
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+
+class RollingCounter:
+    """Bucketed sums of event metrics over a sliding window that ends at the newest timestamp seen"""
+    def __init__(self, window_seconds: float, bucket_seconds: float) -> None:
+        self.window_seconds = window_seconds
+        self.bucket_seconds = bucket_seconds
+        self.latest: Optional[float] = None
+        self.buckets: Dict[float, Dict[str, float]] = {}
+
+    def add(self, timestamp: float, values: Dict[str, float]) -> bool:
+        """Add values at timestamp; False if the row is older than the window and was dropped."""
+        start = timestamp - timestamp % self.bucket_seconds
+        if self.latest is None or start > self.latest:
+            self.latest = start
+            self._prune()
+        if start <= self.latest - self.window_seconds:
+            return False
+        totals = self.buckets.setdefault(start, {})
+        for name, value in values.items():
+            totals[name] = totals.get(name, 0.0) + value
+        return True
+
+    def _prune(self) -> None:
+        cutoff = self.latest - self.window_seconds
+        for start in [s for s in self.buckets if s <= cutoff]:
+            del self.buckets[start]
+
+    def total(self, name: str, last_seconds: Optional[float] = None) -> float:
+        if self.latest is None:
+            return 0.0
+        since = self.latest - (self.window_seconds if last_seconds is None else last_seconds)
+        return sum(totals.get(name, 0.0) for start, totals in self.buckets.items() if start > since)
+
+    @property
+    def observed_seconds(self) -> float:
+        """How much of the window the held buckets actually cover."""
+        return self.latest - min(self.buckets) + self.bucket_seconds if self.buckets else 0.0
+
+    def trend(self, name: str, recent_seconds: float) -> Optional[float]:
+        """Rate over the recent part of the window relative to the rate over all the data held (1.0 = steady).
+
+        None until the data reaches back past the recent part, since there is nothing to compare it with.
+        """
+        # Only the span actually covered counts: a feed that started an hour ago is not a surge.
+        observed = self.observed_seconds
+        window_total = self.total(name)
+        if not window_total or observed <= recent_seconds:
+            return None
+        recent_rate = self.total(name, recent_seconds) / recent_seconds
+        return round(recent_rate / (window_total / observed), 2)
+
+@dataclass
+class FacilityStatus:
+    state: str
+    name: str
+    events: RollingCounter
+    gauges: Dict[str, float] = field(default_factory=dict)
+    updated_at: float = 0.0
+
+    @property
+    def occupancy(self) -> Optional[float]:
+        total = self.gauges.get("beds_total")
+        if not total or "beds_occupied" not in self.gauges:
+            return None
+        return self.gauges["beds_occupied"] / total
+
+class FeedAggregator:
+    """Streams hospital feed rows into bounded rolling aggregates per state and facility"""
+    def __init__(self, window_hours: float = FEED_WINDOW_HOURS, bucket_minutes: float = FEED_BUCKET_MINUTES, max_facilities: int = FEED_MAX_FACILITIES) -> None:
+        self.window_seconds = window_hours * 3600
+        self.bucket_seconds = bucket_minutes * 60
+        self.max_facilities = max_facilities
+        self._states: Dict[str, RollingCounter] = {}
+        self._state_names: Dict[str, str] = {}
+        self._facilities: "OrderedDict[tuple, FacilityStatus]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"rows": 0, "skipped": 0, "late": 0, "evicted": 0}
+
+    def _counter(self) -> RollingCounter:
+        return RollingCounter(self.window_seconds, self.bucket_seconds)
+
+    def ingest(self, row: Optional[Dict]) -> bool:
+        """Fold one feed row in; malformed rows, rows without a state or with unparseable values are counted and skipped."""
+        if not isinstance(row, dict):
+            with self._lock:
+                self.stats["skipped"] += 1
+            return False
+        try:
+            state = row.get("state")
+            if not isinstance(state, str) or not state.strip():
+                # A numeric, nested or blank state can't be keyed, so the row is as malformed as a bad number.
+                raise ValueError(f"unusable state {state!r}")
+            timestamp = _parse_timestamp(row.get("timestamp"))
+            events = {name: _parse_number(row.get(name)) for name in EVENT_METRICS}
+            gauges = {name: _parse_number(row.get(name)) for name in GAUGE_METRICS}
+        except (TypeError, ValueError):
+            state = None
+        with self._lock:
+            if not state:
+                self.stats["skipped"] += 1
+                return False
+            timestamp = time.time() if timestamp is None else timestamp
+            events = {name: value for name, value in events.items() if value is not None}
+            key = state_key(state)
+            self.stats["rows"] += 1
+            self._state_names.setdefault(key, state)
+            if not self._states.setdefault(key, self._counter()).add(timestamp, events):
+                self.stats["late"] += 1
+                return False
+            facility_name = row.get("facility") or row.get("facility_id")
+            if facility_name:
+                self._update_facility(key, str(facility_name), timestamp, events, gauges)
+            return True
+
+    def _update_facility(self, key: str, name: str, timestamp: float, events: Dict[str, float], gauges: Dict[str, Optional[float]]) -> None:
+        facility = self._facilities.get((key, name))
+        if facility is None:
+            facility = self._facilities[(key, name)] = FacilityStatus(key, name, self._counter())
+            while len(self._facilities) > self.max_facilities:
+                self._facilities.popitem(last=False)
+                self.stats["evicted"] += 1
+        else:
+            self._facilities.move_to_end((key, name))
+        facility.events.add(timestamp, events)
+        if timestamp >= facility.updated_at:
+            facility.gauges.update({name: value for name, value in gauges.items() if value is not None})
+            facility.updated_at = timestamp
+
+    def ingest_stream(self, rows: Iterable[Optional[Dict]]) -> int:
+        accepted = 0
+        for row in rows:
+            accepted += self.ingest(row)
+        return accepted
+
+    def ingest_file(self, path: str) -> int:
+        return self.ingest_stream(iter_feed(path))
+
+    def states(self) -> List[str]:
+        with self._lock:
+            return [self._state_names[key] for key in self._states]
+
+    def summary(self, state: Optional[str], top_n: int = 3) -> Optional[Dict[str, Any]]:
+        """Rolling totals, trends and bed occupancy for one state; None if nothing has been ingested for it."""
+        key = state_key(state)
+        with self._lock:
+            counter = self._states.get(key)
+            if counter is None:
+                return None
+            facilities = [f for f in self._facilities.values() if f.state == key]
+            summary: Dict[str, Any] = {
+                "state": self._state_names[key],
+                "window_hours": self.window_seconds / 3600,
+                "observed_hours": counter.observed_seconds / 3600,
+                "as_of": counter.latest,
+                "facilities": len(facilities),
+            }
+            for name in EVENT_METRICS:
+                summary[name] = counter.total(name)
+                summary[f"{name}_trend"] = counter.trend(name, TREND_HOURS * 3600)
+            reporting = [f for f in facilities if f.occupancy is not None]
+            if reporting:
+                occupied = sum(f.gauges["beds_occupied"] for f in reporting)
+                total = sum(f.gauges["beds_total"] for f in reporting)
+                summary.update(beds_occupied=occupied, beds_total=total, occupancy=round(occupied / total, 3))
+                fullest = sorted(reporting, key=lambda f: f.occupancy, reverse=True)[:top_n]
+                summary["fullest"] = [{"facility": f.name, "occupancy": round(f.occupancy, 3)} for f in fullest]
+            admitting = [(f.name, f.events.total("admissions")) for f in facilities]
+            busiest = sorted((a for a in admitting if a[1]), key=lambda a: a[1], reverse=True)[:top_n]
+            if busiest:
+                summary["busiest"] = [{"facility": name, "admissions": admissions} for name, admissions in busiest]
+            return summary
+
+def _trend_text(trend: Optional[float], observed_hours: float) -> str:
+    return "" if trend is None else f" (last {TREND_HOURS}h running at {trend:.1f}x the {observed_hours:g}h average)"
+
+def format_feed_summary(summary: Dict[str, Any]) -> str:
+    """One compact line per aspect of a FeedAggregator summary, for prompts."""
+    lines = [
+        f"- Last {summary['window_hours']:g}h across {summary['facilities']} reporting facilities: "
+        f"{summary['admissions']:,.0f} admissions{_trend_text(summary['admissions_trend'], summary['observed_hours'])}, "
+        f"{summary['er_visits']:,.0f} ER visits{_trend_text(summary['er_visits_trend'], summary['observed_hours'])}"
+    ]
+    if "occupancy" in summary:
+        lines.append(f"- Beds occupied: {summary['beds_occupied']:,.0f}/{summary['beds_total']:,.0f} ({summary['occupancy']:.0%})")
+        lines.append("- Fullest: " + ", ".join(f"{f['facility']} {f['occupancy']:.0%}" for f in summary["fullest"]))
+    if "busiest" in summary:
+        lines.append("- Most admissions: " + ", ".join(f"{f['facility']} {f['admissions']:,.0f}" for f in summary["busiest"]))
+    return "\n".join(lines)
+
+def _feed_rows(data: Any) -> Optional[List[Dict]]:
+    # A payload is a feed if it is (or holds) a list of rows carrying any feed metric.
+    candidates = [data] if isinstance(data, list) else [v for v in data.values() if isinstance(v, list)] if isinstance(data, dict) else []
+    for rows in candidates:
+        if rows and all(isinstance(r, dict) for r in rows) and any(m in rows[0] for m in EVENT_METRICS + GAUGE_METRICS):
+            return rows
+    return None
+
+def compact_payload(data: Any, state: Optional[str] = None, limit: int = PAYLOAD_CHAR_LIMIT) -> str:
+    """Render caller-supplied data for a prompt: feed rows are aggregated, anything else is compact JSON capped at limit."""
+    rows = _feed_rows(data)
+    if rows is not None:
+        aggregator = FeedAggregator()
+        aggregator.ingest_stream(dict(row, state=row.get("state") or state or "unknown") for row in rows)
+        summaries = [aggregator.summary(name) for name in aggregator.states()]
+        return "\n".join(f"{s['state']}:\n{format_feed_summary(s)}" for s in summaries)
+    text = json.dumps(data, separators=(",", ":"), default=str)
+    return text if len(text) <= limit else text[:limit] + "…(truncated)"
+
+HOSPITAL_FEEDS = FeedAggregator()
+
+def start_feed_ingest(paths: Optional[str] = None) -> Optional[threading.Thread]:
+    """Ingest the comma-separated HOSPITAL_FEED_PATHS into HOSPITAL_FEEDS on a daemon thread."""
+    paths = os.getenv("HOSPITAL_FEED_PATHS", "") if paths is None else paths
+    paths = [p.strip() for p in paths.split(",") if p.strip()]
+    if not paths:
+        return None
+    def ingest_all() -> None:
+        for path in paths:
+            try:
+                accepted = HOSPITAL_FEEDS.ingest_file(path)
+                logger.info("Ingested %d rows from hospital feed %s", accepted, path)
+            except Exception:
+                logger.exception("Failed to ingest hospital feed %s", path)
+    thread = threading.Thread(target=ingest_all, name="hospital-feed-ingest", daemon=True)
+    thread.start()
+    return thread
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream JSONL or CSV hospital feeds and print rolling per-state summaries")
+    parser.add_argument("paths", nargs="+", help="feed files (rows with state, facility, timestamp, admissions, er_visits, beds_occupied, beds_total); - for stdin")
+    parser.add_argument("--state", help="only summarise this state/UT")
+    parser.add_argument("--window-hours", type=float, default=FEED_WINDOW_HOURS)
+    parser.add_argument("--text", action="store_true", help="print the prompt text instead of JSON")
+    args = parser.parse_args()
+    aggregator = FeedAggregator(window_hours=args.window_hours)
+    for path in args.paths:
+        aggregator.ingest_file(path)
+    for name in [args.state] if args.state else aggregator.states():
+        summary = aggregator.summary(name)
+        if summary is None:
+            continue
+        print(f"{summary['state']}:\n{format_feed_summary(summary)}" if args.text else json.dumps(summary))
+    print(json.dumps(aggregator.stats), file=sys.stderr)
@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from run_store import DEFAULT_RUN_STORE_PATH
+from tracing import count
+
+# Stage outputs live alongside the run history unless STAGE_MEMO_DB points elsewhere.
+DEFAULT_STAGE_MEMO_PATH = os.getenv("STAGE_MEMO_DB", DEFAULT_RUN_STORE_PATH)
+# A memoized output is reused for unchanged inputs for at most this long; 0 disables stage memoization.
+DEFAULT_MEMO_SECONDS = float(os.getenv("STAGE_MEMO_SECONDS", str(6 * 3600)))
+# How often put() sweeps out outputs older than the memo's retention.
+MEMO_PRUNE_SECONDS = float(os.getenv("STAGE_MEMO_PRUNE_SECONDS", "3600"))
+# Bump when a stage's prompt or output format changes so older memoized outputs stop matching.
+STAGE_VERSIONS = {"health": 2, "planning": 2, "threshold": 1}
+
+# Upper band edges per pollutant in µg/m³ (India NAQI breakpoints; CO converted from mg/m³).
+POLLUTANT_BANDS: Dict[str, Tuple[float, ...]] = {
+    "pm25": (30, 60, 90, 120, 250),
+    "pm10": (50, 100, 250, 350, 430),
+    "no2": (40, 80, 180, 280, 400),
+    "o3": (50, 100, 168, 208, 748),
+    "so2": (40, 80, 380, 800, 1600),
+    "co": (1000, 2000, 10000, 17000, 34000),
+}
+# Weather only shifts the advice at this granularity.
+WEATHER_STEPS = {"temperature": 3.0, "humidity": 10.0, "wind_speed": 5.0}
+
+def band(value: Optional[float], edges: Sequence[float]) -> Optional[int]:
+    if value is None:
+        return None
+    for index, edge in enumerate(edges):
+        if value <= edge:
+            return index
+    return len(edges)
+
+def aqi_view(aqi_data: Dict[str, float]) -> Dict[str, Any]:
+    """The part of a reading the agents' answers depend on: category, pollutant bands and coarse weather."""
+    view: Dict[str, Any] = {"aqi_category": aqi_data.get("aqi_category")}
+    for name, edges in POLLUTANT_BANDS.items():
+        view[name] = band(aqi_data.get(name), edges)
+    for name, step in WEATHER_STEPS.items():
+        value = aqi_data.get(name)
+        view[name] = None if value is None else int(value // step)
+    return view
+
+def article_set(articles: Iterable) -> List[str]:
+    """Order-sensitive identities of the articles a stage sees (links, or titles when there is no link)."""
+    return [article.link or article.title for article in articles]
+
+def fingerprint(stage: str, inputs: Any) -> str:
+    """Content hash of a stage's inputs, salted with the stage's version."""
+    payload = {"stage": stage, "version": STAGE_VERSIONS.get(stage, 1), "inputs": inputs}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+class StageMemo:
+    """SQLite memo of stage outputs keyed by (stage, input fingerprint)"""
+    def __init__(self, path: str = DEFAULT_STAGE_MEMO_PATH, retain_seconds: float = DEFAULT_MEMO_SECONDS, prune_every: float = MEMO_PRUNE_SECONDS) -> None:
+        self.path = path
+        # Outputs older than this can no longer be reused by run() at the default max_age, so put() prunes them.
+        self.retain_seconds = retain_seconds
+        self.prune_every = prune_every
+        self._last_prune = 0.0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS stage_memo (
+                stage TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                output TEXT NOT NULL,
+                PRIMARY KEY (stage, fingerprint)
+            );
+            CREATE INDEX IF NOT EXISTS idx_stage_memo_created ON stage_memo (created_at);
+        """)
+        self._conn.commit()
+        self.stats = {"hits": 0, "misses": 0, "pruned": 0}
+
+    def get(self, stage: str, key: str, max_age: float = DEFAULT_MEMO_SECONDS) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT output FROM stage_memo WHERE stage = ? AND fingerprint = ? AND created_at >= ?",
+                (stage, key, time.time() - max_age)
+            ).fetchone()
+            self.stats["hits" if row else "misses"] += 1
+        return json.loads(row[0]) if row else None
+
+    def put(self, stage: str, key: str, output: Any) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO stage_memo (stage, fingerprint, created_at, output) VALUES (?, ?, ?, ?)",
+                (stage, key, time.time(), json.dumps(output))
+            )
+            self._conn.commit()
+            due = time.time() - self._last_prune >= self.prune_every
+        if due:
+            self.prune(self.retain_seconds)
+
+    def prune(self, older_than: float = DEFAULT_MEMO_SECONDS) -> int:
+        """Delete outputs that can no longer be reused; returns how many were removed."""
+        with self._lock:
+            self._last_prune = time.time()
+            cursor = self._conn.execute("DELETE FROM stage_memo WHERE created_at < ?", (self._last_prune - older_than,))
+            self._conn.commit()
+            self.stats["pruned"] += cursor.rowcount
+            return cursor.rowcount
+
+    def run(self, stage: str, inputs: Any, compute: Callable[[], Any], max_age: float = DEFAULT_MEMO_SECONDS, store: Callable[[], bool] = lambda: True, encode: Callable[[Any], Any] = lambda v: v, decode: Callable[[Any], Any] = lambda v: v) -> Any:
+        """Return the memoized output for these inputs, or compute it and (if store() allows) memoize it."""
+        if max_age <= 0:
+            return compute()
+        key = fingerprint(stage, inputs)
+        cached = self.get(stage, key, max_age)
+        if cached is not None:
+            count(f"memo.{stage}.hit")
+            return decode(cached)
+        count(f"memo.{stage}.miss")
+        # Checked before computing: an output produced under a reduced LLM budget is not worth keeping.
+        keep = store()
+        output = compute()
+        if keep:
+            self.put(stage, key, encode(output))
+        return output
+
+_memos: Dict[str, StageMemo] = {}
+_memos_lock = threading.Lock()
+
+def get_stage_memo(path: str = DEFAULT_STAGE_MEMO_PATH) -> StageMemo:
+    with _memos_lock:
+        if path not in _memos:
+            _memos[path] = StageMemo(path)
+        return _memos[path]
@@ -0,0 +1,138 @@
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+from resilience import call_upstream
+from singleflight import SINGLE_FLIGHT, prompt_key
+from llm_budget import FULL, LLM_BUDGETS
+from tracing import count, record_llm_usage, set_attribute
+
+logger = logging.getLogger(__name__)
+
+GEMINI_MODEL_ID = "gemini-2.5-flash"
+# Gemini only accepts explicit context caches above this many tokens. Shorter
+# instructions still benefit from implicit prefix caching, because they now lead
+# every request as the system instruction instead of being interleaved with data.
+GEMINI_MIN_CACHE_TOKENS = 1024
+GEMINI_CONTEXT_CACHE_TTL = int(os.getenv("GEMINI_CONTEXT_CACHE_TTL", "3600"))
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English prose; good enough for budgets and savings reports.
+    return len(text) // 4
+
+def build_gemini_agent(gemini_key: str, cached_content: Optional[str] = None, **kwargs):
+    """Construct an agno Agent backed by Gemini, importing the SDK only now."""
+    # agno and google-genai account for most of our import time, so nothing imports them at module level.
+    from agno.agent import Agent
+    from agno.models.google import Gemini
+    model_options = {"cached_content": cached_content} if cached_content else {}
+    return Agent(
+        model=Gemini(
+            id=GEMINI_MODEL_ID,
+            api_key=gemini_key,
+            **model_options
+        ),
+        markdown=True,
+        **kwargs
+    )
+
+def create_context_cache(gemini_key: str, instructions: str, ttl: int = GEMINI_CONTEXT_CACHE_TTL) -> str:
+    """Upload instructions as a cached Gemini system instruction and return the cache name."""
+    from google import genai
+    from google.genai import types
+    client = genai.Client(api_key=gemini_key)
+    cache = client.caches.create(
+        model=GEMINI_MODEL_ID,
+        config=types.CreateCachedContentConfig(system_instruction=instructions, ttl=f"{ttl}s")
+    )
+    return cache.name
+
+class GeminiAgent:
+    """Base for the LLM agents: builds the agno Agent on first use and runs prompts through single-flight and the upstream guards"""
+    name = "gemini"
+    # Static per-agent instructions, sent as the system message (or a context cache) rather than inline.
+    instructions = ""
+
+    def __init__(self, gemini_key: str) -> None:
+        self.gemini_key = gemini_key
+        self._agent = None
+        self._agent_expires_at: Optional[float] = None
+        self._agent_lock = threading.Lock()
+        self._context_cached = False
+        self._stats_lock = threading.Lock()
+        self.prompt_stats = {"calls": 0, "variable_bytes": 0, "instruction_bytes_not_sent": 0, "cached_tokens": 0}
+
+    def _build_agent(self):
+        if not self.instructions:
+            return build_gemini_agent(self.gemini_key)
+        if estimate_tokens(self.instructions) >= GEMINI_MIN_CACHE_TOKENS:
+            try:
+                cache_name = create_context_cache(self.gemini_key, self.instructions)
+            except Exception as exc:
+                logger.warning("Gemini context cache unavailable for %s agent, sending instructions per request: %s", self.name, exc)
+            else:
+                self._context_cached = True
+                # Rebuild a minute before the cache expires so no request hits a dead cache.
+                self._agent_expires_at = time.time() + GEMINI_CONTEXT_CACHE_TTL - 60
+                return build_gemini_agent(self.gemini_key, cached_content=cache_name)
+        self._context_cached = False
+        return build_gemini_agent(self.gemini_key, instructions=self.instructions)
+
+    def _agent_expired(self) -> bool:
+        return self._agent is None or (self._agent_expires_at is not None and time.time() >= self._agent_expires_at)
+
+    @property
+    def agent(self):
+        if self._agent_expired():
+            with self._agent_lock:
+                if self._agent_expired():
+                    self._agent_expires_at = None
+                    self._agent = self._build_agent()
+        return self._agent
+
+    def budget_mode(self) -> str:
+        """llm_budget mode for this agent's next call; anything but FULL means answer more cheaply."""
+        mode = LLM_BUDGETS.mode(self.name)
+        if mode != FULL:
+            LLM_BUDGETS.record_degraded(self.name)
+            count(f"llm.{self.name}.{mode}")
+        return mode
+
+    def _call_model(self, prompt: str):
+        response = self.agent.run(prompt)
+        # Recorded here rather than in _run so coalesced followers don't count the same tokens again.
+        input_tokens, output_tokens, cached_tokens = record_llm_usage(self.name, response)
+        if not input_tokens and not output_tokens:
+            # No usage metadata from the SDK: estimate instead.
+            input_tokens, output_tokens = estimate_tokens(self.instructions + prompt), estimate_tokens(response.content or "")
+        LLM_BUDGETS.charge(self.name, input_tokens + output_tokens)
+        variable_bytes = len(prompt.encode("utf-8"))
+        set_attribute("llm.variable_bytes", variable_bytes)
+        with self._stats_lock:
+            self.prompt_stats["calls"] += 1
+            self.prompt_stats["variable_bytes"] += variable_bytes
+            self.prompt_stats["cached_tokens"] += cached_tokens
+            if self._context_cached:
+                self.prompt_stats["instruction_bytes_not_sent"] += len(self.instructions.encode("utf-8"))
+        return response
+
+    def prefix_savings(self) -> Dict[str, float]:
+        """Measured effect of moving the static instructions out of the per-request prompt."""
+        with self._stats_lock:
+            stats = dict(self.prompt_stats)
+        instruction_bytes = len(self.instructions.encode("utf-8"))
+        stats.update(
+            instruction_bytes=instruction_bytes,
+            instruction_tokens=estimate_tokens(self.instructions),
+            context_cached=self._context_cached,
+        )
+        if stats["calls"]:
+            # Share of each old inline prompt that was the repeated static block.
+            stats["static_share"] = round(instruction_bytes / (instruction_bytes + stats["variable_bytes"] / stats["calls"]), 3)
+        return stats
+
+    def _run(self, prompt: str) -> str:
+        # Identical prompts in flight at the same time share one Gemini call.
+        response = SINGLE_FLIGHT.do(prompt_key(self.name, prompt), call_upstream, "gemini", self._call_model, prompt)
+        return response.content
@@ -1,7 +1,33 @@
-from typing import Dict, List
+from typing import Dict, List, Optional
 from dataclasses import dataclass
-from agno.agent import Agent
-from agno.models.google import Gemini
+from cache import SHARED_CACHE, location_key
+from gemini_agent import GeminiAgent
+from llm_budget import EXHAUSTED, FULL
+
+HEALTH_INSTRUCTIONS = """You are a health advisor for people exposed to air pollution.
+Each request gives the air quality, weather conditions, hourly forecast and recent pollution news for a location, and the user's medical conditions and planned activity.
+Please provide comprehensive, actionable health recommendations covering:
+1. **Current Situation Analysis**
+2. **Health Impact Assessment**
+3. **Activity Recommendations**
+4. **Safety Precautions**
+5. **Optimal Timing** (base this on the hourly forecast when one is provided)
+6. **Risk Alerts**
+7. **Alternative Suggestions**
+8. **Long-term Awareness**
+Provide clear, practical advice that the user can immediately act upon."""
+
+# Full recommendations are reused for the same cohort while the LLM budget is tight.
+COHORT_TTL_SECONDS = 6 * 3600
+
+# Canned guidance per AQI category for when the budget is spent and no cohort answer exists.
+FALLBACK_ADVICE = {
+    "Good": "Air quality is good. Outdoor activities are fine for everyone.",
+    "Fair": "Air quality is acceptable. Unusually sensitive people should watch for symptoms during long outdoor exertion.",
+    "Moderate": "Sensitive groups (asthma, heart or lung conditions, children, older adults) should shorten prolonged outdoor exertion.",
+    "Poor": "Limit outdoor exertion; sensitive groups should stay indoors. Wear an N95 mask outside and keep windows closed.",
+    "Very Poor": "Avoid outdoor activity. Stay indoors with windows closed, run an air purifier if available, and wear an N95 mask if you must go out.",
+}
 
 @dataclass
 class UserInput:
@@ -18,23 +44,44 @@ class NewsArticle:
     link: str
     date: str = None
 
-class HealthRecommendationAgent:
+class HealthRecommendationAgent(GeminiAgent):
     """Generate health recommendations using Gemini AI"""
-    def __init__(self, gemini_key: str) -> None:
-        self.agent = Agent(
-            model=Gemini(
-                id="gemini-2.5-flash",
-                api_key=gemini_key
-            ),
-            markdown=True
-        )
+    name = "health"
+    instructions = HEALTH_INSTRUCTIONS
+    # Articles arrive ranked (news_ranking); only the best few reach the prompt.
+    news_top_k = 5
 
-    def get_recommendations(self, aqi_data: Dict[str, float], user_input: UserInput, news_articles: List[NewsArticle]) -> str:
-        prompt = self._create_prompt(aqi_data, user_input, news_articles)
-        response = self.agent.run(prompt)
-        return response.content
+    def get_recommendations(self, aqi_data: Dict[str, float], user_input: UserInput, news_articles: List[NewsArticle], forecast_summary: Optional[str] = None, local_aqi: Optional[str] = None) -> str:
+        mode = self.budget_mode()
+        cohort_key = self._cohort_key(aqi_data, user_input)
+        if mode != FULL:
+            cached = SHARED_CACHE.get(cohort_key)
+            if cached is not None:
+                return cached
+            if mode == EXHAUSTED:
+                return self._fallback_recommendations(aqi_data, user_input, forecast_summary)
+        prompt = self._create_prompt(aqi_data, user_input, news_articles, forecast_summary, local_aqi)
+        recommendations = self._run(prompt)
+        SHARED_CACHE.set(cohort_key, recommendations, ttl=COHORT_TTL_SECONDS)
+        return recommendations
 
-    def _create_prompt(self, aqi_data: Dict[str, float], user_input: UserInput, news_articles: List[NewsArticle]) -> str:
+    def _cohort_key(self, aqi_data: Dict[str, float], user_input: UserInput) -> tuple:
+        # Same place, same air and same reported conditions: the advice differs only in detail.
+        conditions = (user_input.medical_conditions or "").strip().lower()
+        return ("health_cohort",) + location_key(user_input.city, user_input.state, user_input.country) + (aqi_data['aqi_category'], conditions)
+
+    def _fallback_recommendations(self, aqi_data: Dict[str, float], user_input: UserInput, forecast_summary: Optional[str] = None) -> str:
+        advice = FALLBACK_ADVICE.get(aqi_data['aqi_category'], "Check local advisories before heading out.")
+        text = f"**Current Situation:** AQI {aqi_data['aqi']} ({aqi_data['aqi_category']}), PM2.5 {aqi_data['pm25']} µg/m³ in {user_input.city}.\n\n"
+        text += f"**Recommendation:** {advice}\n"
+        if user_input.medical_conditions:
+            text += f"\n**Your Conditions ({user_input.medical_conditions}):** Keep prescribed medication at hand and follow your doctor's air-quality plan.\n"
+        if forecast_summary:
+            text += f"\n**Optimal Timing:** {forecast_summary}\n"
+        text += "\n_Personalised recommendations are temporarily unavailable; this is general guidance._"
+        return text
+
+    def _create_prompt(self, aqi_data: Dict[str, float], user_input: UserInput, news_articles: List[NewsArticle], forecast_summary: Optional[str] = None, local_aqi: Optional[str] = None) -> str:
         location = f"{user_input.city}"
         if user_input.state and user_input.state.lower() != 'none':
             location += f", {user_input.state}"
@@ -42,12 +89,19 @@ class HealthRecommendationAgent:
         news_context = ""
         if news_articles:
             news_context = "\n**Recent News & Events:**\n"
-            for article in news_articles[:5]:
+            for article in news_articles[:self.news_top_k]:
                 news_context += f"- {article.title}: {article.snippet}\n"
         else:
             news_context = "\n**Recent News:** No recent pollution alerts or news found.\n"
+        if forecast_summary:
+            forecast_context = f"**Hourly Air Quality Forecast:**\n        - {forecast_summary}"
+        else:
+            forecast_context = "**Hourly Air Quality Forecast:** Not available."
+        # Ward-level readings, when the city has them: which parts of town to avoid or prefer.
+        local_context = f"**Neighbourhood AQI:** {local_aqi}" if local_aqi else ""
+        # Only the per-request data; the static instructions go out once as the system message.
         return f"""
-        Based on the following air quality, weather conditions, and recent pollution news in {location}:
+        **Location:** {location}
         **Air Quality Data (as of {aqi_data['timestamp']}):**
         - Overall AQI: {aqi_data['aqi']} ({aqi_data['aqi_category']})
         - PM2.5 Level: {aqi_data['pm25']} µg/m³
@@ -60,18 +114,10 @@ class HealthRecommendationAgent:
         - Temperature: {aqi_data['temperature']}°C
         - Humidity: {aqi_data['humidity']}%
         - Wind Speed: {aqi_data['wind_speed']:.2f} km/h
+        {forecast_context}
+        {local_context}
         {news_context}
         **User's Context:**
         - Medical Conditions: {user_input.medical_conditions or 'None reported'}
         - Planned Activity: {user_input.planned_activity}
-        Please provide comprehensive, actionable health recommendations covering:
-        1. **Current Situation Analysis**
-        2. **Health Impact Assessment**
-        3. **Activity Recommendations**
-        4. **Safety Precautions**
-        5. **Optimal Timing**
-        6. **Risk Alerts**
-        7. **Alternative Suggestions**
-        8. **Long-term Awareness**
-        Provide clear, practical advice that the user can immediately act upon.
         """
@@ -0,0 +1,170 @@
+import contextvars
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+# Agents run at full fidelity below DEGRADE_AT of any budget, degrade above it,
+# and stop calling the model once a budget is spent.
+FULL = "full"
+DEGRADED = "degraded"
+EXHAUSTED = "exhausted"
+
+MINUTE = 60
+DAY = 24 * 3600
+
+# (tokens per minute, tokens per day), prompt plus completion.
+DEFAULT_AGENT_BUDGETS: Dict[str, Tuple[int, int]] = {
+    "health": (60_000, 2_000_000),
+    "planning": (80_000, 3_000_000),
+    "threshold": (20_000, 1_000_000),
+}
+DEFAULT_CALLER_BUDGET: Tuple[int, int] = (100_000, 3_000_000)
+DEFAULT_DEGRADE_AT = 0.8
+# Caller budgets kept at once; past this the least recently charged caller is forgotten.
+DEFAULT_MAX_CALLERS = 1000
+
+_current_caller: contextvars.ContextVar = contextvars.ContextVar("llm_caller", default=None)
+
+@contextmanager
+def budget_caller(caller: Optional[str]) -> Iterator[None]:
+    """Charge the enclosed LLM calls to caller (a tenant, API client or batch job)."""
+    token = _current_caller.set(caller)
+    try:
+        yield
+    finally:
+        _current_caller.reset(token)
+
+def current_caller() -> Optional[str]:
+    return _current_caller.get()
+
+class TokenWindow:
+    """Sliding-window sum of tokens spent in the last window_seconds"""
+    def __init__(self, limit: int, window_seconds: float) -> None:
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self._spent = deque()
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float) -> None:
+        while self._spent and self._spent[0][0] <= now - self.window_seconds:
+            self._total -= self._spent.popleft()[1]
+
+    def add(self, tokens: int) -> None:
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            self._spent.append((now, tokens))
+            self._total += tokens
+
+    def used(self) -> int:
+        with self._lock:
+            self._expire(time.time())
+            return self._total
+
+    def fraction(self) -> float:
+        return self.used() / self.limit if self.limit > 0 else 0.0
+
+class TokenBudget:
+    """Per-minute and per-day token windows for one agent or caller"""
+    def __init__(self, per_minute: int, per_day: int) -> None:
+        self.windows = {"minute": TokenWindow(per_minute, MINUTE), "day": TokenWindow(per_day, DAY)}
+
+    def add(self, tokens: int) -> None:
+        for window in self.windows.values():
+            window.add(tokens)
+
+    def fraction(self) -> float:
+        return max(window.fraction() for window in self.windows.values())
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        return {name: {"used": window.used(), "limit": window.limit} for name, window in self.windows.items()}
+
+class BudgetManager:
+    """Tracks Gemini token spend per agent and per caller and decides how far each call should degrade"""
+    def __init__(self, agent_budgets: Optional[Dict[str, Tuple[int, int]]] = None, caller_budget: Tuple[int, int] = DEFAULT_CALLER_BUDGET, degrade_at: float = DEFAULT_DEGRADE_AT, max_callers: int = DEFAULT_MAX_CALLERS) -> None:
+        self.degrade_at = degrade_at
+        self.caller_budget = caller_budget
+        self.max_callers = max_callers
+        self._agent_limits = dict(DEFAULT_AGENT_BUDGETS, **(agent_budgets or {}))
+        self._agents = {name: TokenBudget(*limits) for name, limits in self._agent_limits.items()}
+        self._callers: "OrderedDict[str, TokenBudget]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.degraded_calls: Dict[str, int] = {}
+
+    def reset(self) -> None:
+        """Forget all spend and degraded-call counts, as if the process had just started."""
+        with self._lock:
+            self._agents = {name: TokenBudget(*limits) for name, limits in self._agent_limits.items()}
+            self._callers = OrderedDict()
+            self.degraded_calls = {}
+
+    @classmethod
+    def from_env(cls) -> "BudgetManager":
+        """Build from LLM_BUDGET_<AGENT>="per_minute,per_day", LLM_BUDGET_CALLER, LLM_BUDGET_DEGRADE_AT and LLM_BUDGET_MAX_CALLERS."""
+        def parse(raw: str) -> Tuple[int, int]:
+            per_minute, per_day = raw.split(",")
+            return int(per_minute), int(per_day)
+        agent_budgets = {}
+        for name in DEFAULT_AGENT_BUDGETS:
+            raw = os.getenv(f"LLM_BUDGET_{name.upper()}")
+            if raw:
+                agent_budgets[name] = parse(raw)
+        raw_caller = os.getenv("LLM_BUDGET_CALLER")
+        return cls(
+            agent_budgets,
+            parse(raw_caller) if raw_caller else DEFAULT_CALLER_BUDGET,
+            float(os.getenv("LLM_BUDGET_DEGRADE_AT", str(DEFAULT_DEGRADE_AT))),
+            int(os.getenv("LLM_BUDGET_MAX_CALLERS", str(DEFAULT_MAX_CALLERS)))
+        )
+
+    def _budgets_for(self, agent: str, caller: Optional[str]) -> list:
+        with self._lock:
+            budgets = []
+            if agent in self._agents:
+                budgets.append(self._agents[agent])
+            if caller is not None:
+                if caller in self._callers:
+                    self._callers.move_to_end(caller)
+                else:
+                    self._callers[caller] = TokenBudget(*self.caller_budget)
+                    while len(self._callers) > self.max_callers:
+                        self._callers.popitem(last=False)
+                budgets.append(self._callers[caller])
+            return budgets
+
+    def mode(self, agent: str, caller: Optional[str] = None) -> str:
+        """FULL, DEGRADED or EXHAUSTED for the next call by agent on behalf of caller (default: the current caller)."""
+        caller = current_caller() if caller is None else caller
+        return self._mode_for(max((budget.fraction() for budget in self._budgets_for(agent, caller)), default=0.0))
+
+    def _mode_for(self, fraction: float) -> str:
+        if fraction >= 1.0:
+            return EXHAUSTED
+        return DEGRADED if fraction >= self.degrade_at else FULL
+
+    def charge(self, agent: str, tokens: int, caller: Optional[str] = None) -> None:
+        caller = current_caller() if caller is None else caller
+        for budget in self._budgets_for(agent, caller):
+            budget.add(tokens)
+
+    def record_degraded(self, agent: str) -> None:
+        with self._lock:
+            self.degraded_calls[agent] = self.degraded_calls.get(agent, 0) + 1
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            agents = dict(self._agents)
+            callers = dict(self._callers)
+            degraded_calls = dict(self.degraded_calls)
+        return {
+            "degrade_at": self.degrade_at,
+            "agents": {name: dict(budget.snapshot(), mode=self._mode_for(budget.fraction())) for name, budget in agents.items()},
+            "callers": {name: dict(budget.snapshot(), mode=self._mode_for(budget.fraction())) for name, budget in callers.items()},
+            "degraded_calls": degraded_calls,
+        }
+
+LLM_BUDGETS = BudgetManager.from_env()
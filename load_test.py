@@ -0,0 +1,296 @@
+import argparse
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from aqi_analyzer import AQIAnalyzer
+from aqi_grid import AQIGrid
+from cache import SHARED_CACHE
+from fingerprint import DEFAULT_MEMO_SECONDS, StageMemo
+from gemini_agent import GeminiAgent
+from health_recommendation_agent import HealthRecommendationAgent, UserInput
+from llm_budget import LLM_BUDGETS
+from main import PipelineAgents, run_analysis
+from rate_limit import GOVERNOR
+from planning_agent import PlanningAgent
+from pollution_news_agent import PollutionNewsAgent
+from run_store import DEFAULT_REUSE_SECONDS, RunStore
+from threshold_agent import ThresholdAgent
+
+logger = logging.getLogger(__name__)
+
+# (city, state) by rough traffic share; users pick from these with Zipf skew, most popular first.
+CITIES: List[Tuple[str, str]] = [
+    ("Delhi", "Delhi"), ("Mumbai", "Maharashtra"), ("Bengaluru", "Karnataka"), ("Kolkata", "West Bengal"),
+    ("Chennai", "Tamil Nadu"), ("Hyderabad", "Telangana"), ("Pune", "Maharashtra"), ("Ahmedabad", "Gujarat"),
+    ("Lucknow", "Uttar Pradesh"), ("Jaipur", "Rajasthan"), ("Kanpur", "Uttar Pradesh"), ("Patna", "Bihar"),
+    ("Nagpur", "Maharashtra"), ("Indore", "Madhya Pradesh"), ("Bhopal", "Madhya Pradesh"), ("Ludhiana", "Punjab"),
+    ("Chandigarh", "Chandigarh"), ("Guwahati", "Assam"), ("Kochi", "Kerala"), ("Bhubaneswar", "Odisha"),
+]
+ACTIVITIES = ["Morning walk", "Running", "Cycling to work", "School commute", "Outdoor sports", "Shopping", "Evening walk"]
+# Most users leave the field empty, as in ui.py's default.
+CONDITIONS = ["", "", "", "", "Asthma", "COPD", "Heart disease", "Pregnancy", "Allergies"]
+
+def zipf_weights(n: int, s: float) -> List[float]:
+    return [1 / (rank ** s) for rank in range(1, n + 1)]
+
+def percentile(sorted_values: List[float], p: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, math.ceil(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def rate_limit_waits() -> Dict[str, float]:
+    """Total seconds callers have spent queued on each upstream's token bucket."""
+    return {name: sum(m["wait_total"] for m in bucket["by_priority"].values()) for name, bucket in GOVERNOR.metrics().items()}
+
+def _jitter(ms: float) -> float:
+    return ms * random.uniform(0.5, 1.5) / 1000
+
+def _seed(*parts: str) -> int:
+    return int(hashlib.md5("|".join(parts).encode("utf-8")).hexdigest()[:8], 16)
+
+class UpstreamCounter:
+    """Counts calls that reached each upstream stand-in"""
+    def __init__(self) -> None:
+        self.calls: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def hit(self, upstream: str) -> None:
+        with self._lock:
+            self.calls[upstream] = self.calls.get(upstream, 0) + 1
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.calls)
+
+class StandInAQIAnalyzer(AQIAnalyzer):
+    """AQIAnalyzer whose HTTP layer answers locally with synthetic OpenWeatherMap payloads"""
+    def __init__(self, counter: UpstreamCounter, latency_ms: float) -> None:
+        super().__init__(api_key="load-test")
+        self.counter = counter
+        self.latency_ms = latency_ms
+
+    def _request_json(self, url: str):
+        self.counter.hit("openweathermap")
+        time.sleep(_jitter(self.latency_ms))
+        now = int(time.time())
+        if url.startswith(self.base_geo_url):
+            seed = _seed(url.split("q=")[1].split("&")[0])
+            return [{"lat": 8 + seed % 2500 / 100, "lon": 68 + seed % 2900 / 100}]
+        level = 1 + _seed(url.split("lat=")[1].split("&")[0]) % 5
+        if url.startswith(self.base_forecast_url):
+            return {"list": [
+                {"dt": now - now % 3600 + hour * 3600, "main": {"aqi": max(1, min(5, level + (hour % 6) // 3 - 1))}, "components": {"pm2_5": 20.0 * level + hour, "pm10": 35.0 * level}}
+                for hour in range(48)
+            ]}
+        if url.startswith(self.base_air_url):
+            return {"list": [{"dt": now, "main": {"aqi": level}, "components": {
+                "pm2_5": 22.0 * level, "pm10": 38.0 * level, "co": 300.0 * level, "no2": 12.0 * level, "o3": 30.0, "so2": 6.0
+            }}]}
+        return {"main": {"temp": 24 + level * 2, "humidity": 40 + level * 8}, "wind": {"speed": 6 - level}, "timezone": 19800}
+
+class StandInNewsAgent(PollutionNewsAgent):
+    """PollutionNewsAgent whose Serper search answers locally"""
+    def __init__(self, counter: UpstreamCounter, latency_ms: float) -> None:
+        super().__init__(api_key="load-test")
+        self.counter = counter
+        self.latency_ms = latency_ms
+
+    def _search(self, query: str, country: str) -> dict:
+        self.counter.hit("serper")
+        time.sleep(_jitter(self.latency_ms))
+        return {"organic": [
+            {"title": f"{query.title()} #{i}", "snippet": f"AQI and smog update: {query}.", "link": f"https://news.example/{_seed(query)}/{i}", "date": f"{i + 1} hours ago"}
+            for i in range(5)
+        ]}
+
+@dataclass
+class StandInResponse:
+    content: str
+    metrics: Dict[str, List[int]]
+
+class StandInModel:
+    """Answers agno's Agent.run with a canned Gemini-style reply after a model-like delay"""
+    REPLY = "**Surge Risk Level:** MEDIUM\nKeep outdoor activity short.\nSURGE_RISK_LEVEL: MEDIUM\nALERT_NEEDED: NO\nALERT_LEVEL: LOW\nREASON: Conditions are within expected range."
+
+    def __init__(self, counter: UpstreamCounter, latency_ms: float) -> None:
+        self.counter = counter
+        self.latency_ms = latency_ms
+
+    def run(self, prompt: str) -> StandInResponse:
+        self.counter.hit("gemini")
+        time.sleep(_jitter(self.latency_ms))
+        return StandInResponse(self.REPLY, {"input_tokens": [len(prompt) // 4], "output_tokens": [len(self.REPLY) // 4]})
+
+def build_stand_in_agents(counter: UpstreamCounter, owm_ms: float, serper_ms: float, gemini_ms: float) -> PipelineAgents:
+    """The real pipeline agents with their network calls answered by local stand-ins."""
+    aqi_analyzer = StandInAQIAnalyzer(counter, owm_ms)
+    agents = PipelineAgents(
+        aqi_analyzer=aqi_analyzer,
+        news_agent=StandInNewsAgent(counter, serper_ms),
+        health_agent=HealthRecommendationAgent(gemini_key="load-test"),
+        planning_agent=PlanningAgent(gemini_key="load-test"),
+        threshold_agent=ThresholdAgent(gemini_key="load-test"),
+        aqi_grid=AQIGrid(aqi_analyzer)
+    )
+    for agent in (agents.health_agent, agents.planning_agent, agents.threshold_agent):
+        # Sub-agents too (e.g. planning's short_agent for DEGRADED budgets), so no path reaches Gemini.
+        for model_user in [agent] + [v for v in vars(agent).values() if isinstance(v, GeminiAgent)]:
+            model_user._agent = StandInModel(counter, gemini_ms)
+    return agents
+
+class LoadTest:
+    """Simulates concurrent ui.py sessions submitting the analysis form and aggregates what they observed"""
+    def __init__(self, agents: PipelineAgents, counter: UpstreamCounter, users: int, duration: float, think_ms: float = 2000, skew: float = 1.1, reuse_within: float = DEFAULT_REUSE_SECONDS, memo_within: float = DEFAULT_MEMO_SECONDS, data_dir: Optional[str] = None) -> None:
+        self.agents = agents
+        self.counter = counter
+        self.users = users
+        self.duration = duration
+        self.think_ms = think_ms
+        self.weights = zipf_weights(len(CITIES), skew)
+        self.reuse_within = reuse_within
+        self.memo_within = memo_within
+        self.data_dir = data_dir or tempfile.mkdtemp(prefix="load-test-")
+        self._lock = threading.Lock()
+        self.latencies: List[float] = []
+        self.counters: Dict[str, int] = {}
+        self.results = {"ok": 0, "error": 0, "session_cached": 0, "served_from_store": 0}
+
+    def _form(self, rng: random.Random) -> UserInput:
+        city, state = rng.choices(CITIES, weights=self.weights)[0]
+        return UserInput(city=city, state=state, country="India", medical_conditions=rng.choice(CONDITIONS), planned_activity=rng.choice(ACTIVITIES))
+
+    def _session(self, index: int, deadline: float, run_store: RunStore, stage_memo: StageMemo) -> None:
+        rng = random.Random(index)
+        # Like ui.py's st.session_state["analyses"]: a session re-submitting the same form is not re-run.
+        analyses = set()
+        while time.time() < deadline:
+            time.sleep(rng.expovariate(1000 / self.think_ms) if self.think_ms > 0 else 0)
+            user_input = self._form(rng)
+            form_inputs = (user_input.city, user_input.state, user_input.country, user_input.medical_conditions, user_input.planned_activity)
+            if form_inputs in analyses:
+                with self._lock:
+                    self.results["session_cached"] += 1
+                continue
+            start = time.perf_counter()
+            try:
+                result = run_analysis(
+                    user_input, healthcare_api_data={}, epidemic_signal=None, resource_status=None, agents=self.agents,
+                    run_store=run_store, reuse_within=self.reuse_within, stage_memo=stage_memo, memo_within=self.memo_within
+                )
+            except Exception:
+                logger.exception("user %d: analysis for %s failed", index, user_input.city)
+                with self._lock:
+                    self.results["error"] += 1
+                continue
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            analyses.add(form_inputs)
+            with self._lock:
+                self.latencies.append(elapsed_ms)
+                self.results["ok"] += 1
+                self.results["served_from_store"] += result.served_from_store
+                for name, n in (result.usage or {}).get("counters", {}).items():
+                    self.counters[name] = self.counters.get(name, 0) + n
+
+    def run(self) -> Dict:
+        run_store = RunStore(os.path.join(self.data_dir, f"runs-{self.users}.db"))
+        stage_memo = StageMemo(os.path.join(self.data_dir, f"memo-{self.users}.db"))
+        upstream_before = self.counter.snapshot()
+        waits_before = rate_limit_waits()
+        deadline = time.time() + self.duration
+        start = time.perf_counter()
+        threads = [threading.Thread(target=self._session, args=(i, deadline, run_store, stage_memo), name=f"user-{i}") for i in range(self.users)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.report(time.perf_counter() - start, upstream_before, waits_before)
+
+    def _ratio(self, prefix: str, hits: Tuple[str, ...] = ("hit",)) -> Optional[float]:
+        counts = {name[len(prefix) + 1:]: n for name, n in self.counters.items() if name.startswith(prefix + ".")}
+        total = sum(counts.values())
+        return round(sum(counts.get(h, 0) for h in hits) / total, 3) if total else None
+
+    def report(self, elapsed: float, upstream_before: Dict[str, int], waits_before: Dict[str, float]) -> Dict:
+        latencies = sorted(self.latencies)
+        upstream = {name: n - upstream_before.get(name, 0) for name, n in self.counter.snapshot().items()}
+        requests = self.results["ok"]
+        return {
+            "users": self.users,
+            "elapsed_s": round(elapsed, 1),
+            "requests": requests,
+            "errors": self.results["error"],
+            "session_cached": self.results["session_cached"],
+            "throughput_rps": round(requests / elapsed, 2) if elapsed else 0.0,
+            "latency_ms": {f"p{p}": None if percentile(latencies, p) is None else round(percentile(latencies, p), 1) for p in (50, 90, 95, 99)},
+            "hit_ratio": {
+                "run_store": round(self.results["served_from_store"] / requests, 3) if requests else None,
+                # Stale-while-revalidate answers are served from cache too.
+                "aqi": self._ratio("cache.aqi", ("hit", "stale")),
+                "news": self._ratio("cache.news", ("hit", "stale")),
+                "forecast": self._ratio("cache.forecast"),
+                "memo.health": self._ratio("memo.health"),
+                "memo.planning": self._ratio("memo.planning"),
+                "memo.threshold": self._ratio("memo.threshold"),
+            },
+            # LLM calls answered more cheaply because an agent's token budget ran low (llm.<agent>.<mode>).
+            "llm_degraded": {name[len("llm."):]: n for name, n in sorted(self.counters.items()) if name.startswith("llm.") and name.endswith((".degraded", ".exhausted"))},
+            "upstream_calls": upstream,
+            "upstream_calls_per_request": {name: round(n / requests, 2) for name, n in upstream.items()} if requests else {},
+            # Queueing on the RATE_LIMIT_* token buckets; usually what caps a node before CPU does.
+            "rate_limit_wait_ms_per_request": {
+                name: round((wait - waits_before.get(name, 0.0)) * 1000 / requests, 1) for name, wait in rate_limit_waits().items()
+            } if requests else {},
+        }
+
+def _print_report(report: Dict) -> None:
+    latency = report["latency_ms"]
+    print(f"{report['users']:>4} users  {report['requests']:>6} req  {report['throughput_rps']:>7.2f} req/s  "
+          f"p50 {latency['p50']} ms  p95 {latency['p95']} ms  p99 {latency['p99']} ms  errors {report['errors']}")
+    print("      hit ratio: " + "  ".join(f"{name} {value}" for name, value in report["hit_ratio"].items() if value is not None))
+    print("      upstream calls/request: " + "  ".join(f"{name} {n}" for name, n in sorted(report["upstream_calls_per_request"].items())))
+    print("      rate-limit wait ms/request: " + "  ".join(f"{name} {ms}" for name, ms in sorted(report["rate_limit_wait_ms_per_request"].items())))
+    if report["llm_degraded"]:
+        print("      degraded LLM calls: " + "  ".join(f"{name} {n}" for name, n in report["llm_degraded"].items()))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate concurrent ui.py users against the pipeline wired to local upstream stand-ins")
+    parser.add_argument("--users", default="1,5,10,25,50", help="comma-separated concurrent-user levels to step through")
+    parser.add_argument("--duration", type=float, default=30, help="seconds per level")
+    parser.add_argument("--think-ms", type=float, default=2000, help="mean pause between a user's submissions")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of city popularity")
+    parser.add_argument("--owm-ms", type=float, default=150, help="mean OpenWeatherMap stand-in latency")
+    parser.add_argument("--serper-ms", type=float, default=400, help="mean Serper stand-in latency")
+    parser.add_argument("--gemini-ms", type=float, default=2500, help="mean Gemini stand-in latency")
+    parser.add_argument("--reuse-within", type=float, default=DEFAULT_REUSE_SECONDS)
+    parser.add_argument("--memo-within", type=float, default=DEFAULT_MEMO_SECONDS)
+    parser.add_argument("--slo-p95-ms", type=float, help="report the most users whose p95 latency stays within this")
+    parser.add_argument("--json", action="store_true", help="print one JSON report per level")
+    args = parser.parse_args()
+    counter = UpstreamCounter()
+    data_dir = tempfile.mkdtemp(prefix="load-test-")
+    reports = []
+    for users in (int(n) for n in args.users.split(",")):
+        # Every level starts cold, like a freshly started node: empty caches, full rate-limit buckets and LLM budgets.
+        SHARED_CACHE.clear()
+        GOVERNOR.reset()
+        LLM_BUDGETS.reset()
+        agents = build_stand_in_agents(counter, args.owm_ms, args.serper_ms, args.gemini_ms)
+        report = LoadTest(agents, counter, users, args.duration, args.think_ms, args.skew, args.reuse_within, args.memo_within, data_dir).run()
+        reports.append(report)
+        if args.json:
+            print(json.dumps(report))
+        else:
+            _print_report(report)
+    if args.slo_p95_ms is not None:
+        within = [r["users"] for r in reports if r["requests"] and not r["errors"] and r["latency_ms"]["p95"] <= args.slo_p95_ms]
+        print(f"max users within p95 <= {args.slo_p95_ms:g} ms: {max(within) if within else 'none'}", file=sys.stderr)
@@ -1,9 +1,20 @@
 import os
+from dataclasses import dataclass
+from typing import Dict, Optional
 from aqi_analyzer import AQIAnalyzer
+from aqi_grid import AQIGrid
+from cache import Freshness, location_key, track_freshness
+from feed_ingest import HOSPITAL_FEEDS, format_feed_summary
+from fingerprint import DEFAULT_MEMO_SECONDS, StageMemo, aqi_view, article_set, get_stage_memo
+from llm_budget import FULL, LLM_BUDGETS
 from pollution_news_agent import PollutionNewsAgent, NewsArticle
 from health_recommendation_agent import HealthRecommendationAgent, UserInput
 from planning_agent import PlanningAgent
 from threshold_agent import ThresholdAgent, AlertLevel
+from notification_agent import get_notification_agent
+from news_ranking import rank_articles
+from run_store import DEFAULT_REUSE_SECONDS, RunRecord, RunStore, get_run_store, request_key
+from tracing import TRACER, current_trace
 
 
 def get_api_keys():
@@ -14,44 +25,227 @@ def get_api_keys():
         'gemini': os.getenv("GEMINI_KEY")
     }
 
-# Example orchestrator function
+@dataclass
+class PipelineAgents:
+    aqi_analyzer: AQIAnalyzer
+    news_agent: PollutionNewsAgent
+    health_agent: HealthRecommendationAgent
+    planning_agent: PlanningAgent
+    threshold_agent: ThresholdAgent
+    # Ward-level AQI for cities in aqi_grid.CITY_WARDS; None skips the neighbourhood stage.
+    aqi_grid: Optional[AQIGrid] = None
+
 
-def analyze_conditions(user_input, api_keys=None, healthcare_api_data=None, epidemic_signal=None, resource_status=None):
+def build_agents(api_keys=None) -> PipelineAgents:
+    """Construct the analyzer and agents once so callers can reuse them across requests."""
     if api_keys is None:
         api_keys = get_api_keys()
     aqi_analyzer = AQIAnalyzer(api_key=api_keys['openweathermap'])
-    news_agent = PollutionNewsAgent(api_key=api_keys['serper'])
-    health_agent = HealthRecommendationAgent(gemini_key=api_keys['gemini'])
-    planning_agent = PlanningAgent(gemini_key=api_keys['gemini'])
-    threshold_agent = ThresholdAgent(gemini_key=api_keys['gemini'])
-    aqi_data = aqi_analyzer.fetch_aqi_data(
-        city=user_input.city,
-        state=user_input.state,
-        country=user_input.country
+    return PipelineAgents(
+        aqi_analyzer=aqi_analyzer,
+        news_agent=PollutionNewsAgent(api_key=api_keys['serper']),
+        health_agent=HealthRecommendationAgent(gemini_key=api_keys['gemini']),
+        planning_agent=PlanningAgent(gemini_key=api_keys['gemini']),
+        threshold_agent=ThresholdAgent(gemini_key=api_keys['gemini']),
+        aqi_grid=AQIGrid(aqi_analyzer)
     )
-    news_articles = news_agent.fetch_news(
-        city=user_input.city,
-        state=user_input.state,
-        country=user_input.country
-    )
-    recommendations = health_agent.get_recommendations(
-        aqi_data,
+
+@dataclass
+class AnalysisResult:
+    aqi_data: Dict[str, float]
+    news_summary: str
+    recommendations: str
+    hospital_plan: str
+    alert_needed: bool
+    alert_level: AlertLevel
+    reason: str
+    run_id: Optional[int] = None
+    served_from_store: bool = False
+    # Token, cost, stage-latency and cache counters for this request (see tracing.Trace.summary).
+    usage: Optional[Dict] = None
+    # Age of the data behind this result per source ("aqi", "news"; "run" when served from the store).
+    data_age: Optional[Dict] = None
+
+    def as_tuple(self) -> tuple:
+        return self.recommendations, self.news_summary, self.hospital_plan, self.alert_needed, self.alert_level, self.reason
+
+    @classmethod
+    def from_record(cls, record: RunRecord) -> "AnalysisResult":
+        return cls(
+            aqi_data=record.aqi_data,
+            news_summary=record.news_summary,
+            recommendations=record.recommendations,
+            hospital_plan=record.hospital_plan,
+            alert_needed=record.alert_needed,
+            alert_level=AlertLevel(record.alert_level),
+            reason=record.reason,
+            run_id=record.id,
+            served_from_store=True,
+            data_age={"run": Freshness(record.created_at, stale=True).as_dict()}
+        )
+
+# Example orchestrator function
+
+def analyze_conditions(user_input, api_keys=None, healthcare_api_data=None, epidemic_signal=None, resource_status=None, agents=None, notification_config=None):
+    return run_analysis(
         user_input,
-        news_articles
-    )
-    news_summary = news_agent.format_news_summary(news_articles)
-    hospital_plan = planning_agent.create_plan(
-        aqi_data,
-        news_summary,
-        healthcare_api_data or {},
-        epidemic_signal,
-        resource_status,
-        state=user_input.state
-    )
-    alert_needed, alert_level, reason = threshold_agent.evaluate_alert_needed(
-        aqi_data,
-        hospital_plan,
-        recommendations
+        api_keys=api_keys,
+        healthcare_api_data=healthcare_api_data,
+        epidemic_signal=epidemic_signal,
+        resource_status=resource_status,
+        agents=agents,
+        notification_config=notification_config
+    ).as_tuple()
+
+def run_analysis(user_input, api_keys=None, healthcare_api_data=None, epidemic_signal=None, resource_status=None, agents=None, notification_config=None, run_store: Optional[RunStore] = None, reuse_within: float = DEFAULT_REUSE_SECONDS, stage_memo: Optional[StageMemo] = None, memo_within: float = DEFAULT_MEMO_SECONDS) -> AnalysisResult:
+    """Run the full pipeline, or return an identical run recorded within `reuse_within` seconds.
+
+    LLM stages whose fingerprinted inputs match an output memoized within `memo_within` seconds reuse it.
+    """
+    with TRACER.span("analyze", city=user_input.city, state=user_input.state, country=user_input.country) as span, track_freshness() as freshness:
+        result = _run_pipeline(user_input, api_keys, healthcare_api_data, epidemic_signal, resource_status, agents, notification_config, run_store, reuse_within, stage_memo, memo_within)
+        if result.data_age is None:
+            result.data_age = {source: f.as_dict() for source, f in freshness.items()}
+        span.attributes["served_from_store"] = result.served_from_store
+        span.attributes["alert_level"] = result.alert_level.value
+        result.usage = current_trace().summary()
+        return result
+
+def _run_pipeline(user_input, api_keys, healthcare_api_data, epidemic_signal, resource_status, agents, notification_config, run_store: Optional[RunStore], reuse_within: float, stage_memo: Optional[StageMemo] = None, memo_within: float = DEFAULT_MEMO_SECONDS) -> AnalysisResult:
+    run_store = run_store or get_run_store()
+    stage_memo = stage_memo or get_stage_memo()
+    key = request_key(user_input, healthcare_api_data, epidemic_signal, resource_status)
+    if reuse_within > 0:
+        with TRACER.span("stage.run_store"):
+            recent = run_store.find_recent(key, reuse_within)
+        if recent is not None:
+            # The original run already handled any alert; don't queue it twice.
+            return AnalysisResult.from_record(recent)
+    if agents is None:
+        agents = build_agents(api_keys)
+    aqi_analyzer = agents.aqi_analyzer
+    news_agent = agents.news_agent
+    health_agent = agents.health_agent
+    planning_agent = agents.planning_agent
+    threshold_agent = agents.threshold_agent
+    with TRACER.span("stage.aqi"):
+        aqi_data = aqi_analyzer.fetch_aqi_data(
+            city=user_input.city,
+            state=user_input.state,
+            country=user_input.country
+        )
+    with TRACER.span("stage.forecast"):
+        try:
+            forecast_summary = aqi_analyzer.get_forecast_summary(
+                city=user_input.city,
+                state=user_input.state,
+                country=user_input.country
+            )
+        except Exception:
+            # The forecast only sharpens the timing advice; never fail the request over it.
+            forecast_summary = None
+    local_aqi = None
+    if agents.aqi_grid is not None:
+        with TRACER.span("stage.neighbourhoods"):
+            try:
+                # Never blocks on a cold city: the first request starts the ward fetch and later ones use it.
+                local_aqi = agents.aqi_grid.neighbourhood_summary(user_input.city, wait=False)
+            except Exception:
+                # Like the forecast, ward detail refines the advice but is not required for it.
+                local_aqi = None
+    with TRACER.span("stage.news"):
+        news_articles = news_agent.fetch_news(
+            city=user_input.city,
+            state=user_input.state,
+            country=user_input.country
+        )
+        # Rank once by relevance and recency; each agent then takes its own top-k.
+        news_articles = rank_articles(news_articles, user_input.city, user_input.state)
+    # Each LLM stage is keyed by a fingerprint of what its answer depends on (AQI category and pollutant
+    # bands rather than raw readings), so sweeps over unchanged conditions skip the model entirely.
+    reading = aqi_view(aqi_data)
+    with TRACER.span("stage.health"):
+        recommendations = stage_memo.run(
+            "health",
+            {
+                "aqi": reading,
+                "location": location_key(user_input.city, user_input.state, user_input.country),
+                "medical_conditions": (user_input.medical_conditions or "").strip().lower(),
+                "planned_activity": (user_input.planned_activity or "").strip().lower(),
+                "news": article_set(news_articles[:health_agent.news_top_k]),
+                "forecast": forecast_summary,
+                "local_aqi": local_aqi,
+            },
+            lambda: health_agent.get_recommendations(
+                aqi_data,
+                user_input,
+                news_articles,
+                forecast_summary,
+                local_aqi
+            ),
+            memo_within,
+            store=lambda: LLM_BUDGETS.mode(health_agent.name) == FULL
+        )
+    news_summary = news_agent.format_news_summary(news_articles[:planning_agent.news_top_k])
+    with TRACER.span("stage.planning"):
+        feed_summary = HOSPITAL_FEEDS.summary(user_input.state) if user_input.state else None
+        hospital_plan = stage_memo.run(
+            "planning",
+            {
+                "aqi": reading,
+                "state": (user_input.state or "").strip().lower(),
+                "news": article_set(news_articles[:planning_agent.news_top_k]),
+                "healthcare_api_data": healthcare_api_data or {},
+                "epidemic_signal": epidemic_signal,
+                "resource_status": resource_status,
+                "hospital_feed": format_feed_summary(feed_summary) if feed_summary else None,
+                "local_aqi": local_aqi,
+            },
+            lambda: planning_agent.create_plan(
+                aqi_data,
+                news_summary,
+                healthcare_api_data or {},
+                epidemic_signal,
+                resource_status,
+                state=user_input.state,
+                local_aqi=local_aqi
+            ),
+            memo_within,
+            store=lambda: LLM_BUDGETS.mode(planning_agent.name) == FULL
+        )
+    with TRACER.span("stage.threshold"):
+        alert_needed, alert_level, reason = stage_memo.run(
+            "threshold",
+            {"aqi": reading, "hospital_plan": hospital_plan, "recommendations": recommendations},
+            lambda: threshold_agent.evaluate_alert_needed(
+                aqi_data,
+                hospital_plan,
+                recommendations
+            ),
+            memo_within,
+            store=lambda: LLM_BUDGETS.mode(threshold_agent.name) == FULL,
+            encode=lambda output: [output[0], output[1].value, output[2]],
+            decode=lambda output: (output[0], AlertLevel(output[1]), output[2])
+        )
+    if alert_needed and notification_config:
+        # Queued for operator approval; never blocks the request on a human decision.
+        with TRACER.span("stage.approval"):
+            get_notification_agent(notification_config).request_human_approval(
+                alert_level,
+                reason,
+                aqi_data,
+                recipients=notification_config.get('recipients', []),
+                location=f"{user_input.city},{user_input.state},{user_input.country}"
+            )
+    result = AnalysisResult(
+        aqi_data=aqi_data,
+        news_summary=news_summary,
+        recommendations=recommendations,
+        hospital_plan=hospital_plan,
+        alert_needed=alert_needed,
+        alert_level=alert_level,
+        reason=reason
     )
-    return recommendations, news_summary, hospital_plan, alert_needed, alert_level, reason
+    result.run_id = run_store.record(key, user_input, result)
+    return result
 
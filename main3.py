@@ -1,15 +1,14 @@
 
-import streamlit as st
+import sys
 from typing import Dict, Optional, List
 from dataclasses import dataclass
-from pydantic import BaseModel, Field
-from agno.agent import Agent
-from agno.models.google import Gemini
-import requests
+from schemas import AQIData
 import http.client
 import json
 from datetime import datetime
-from enum import Enum
+from gemini_agent import build_gemini_agent
+from threshold_agent import AlertLevel
+from notification_agent import get_notification_agent
 
 # Streamlit UI Colors
 COLORS = {
@@ -19,58 +18,57 @@ COLORS = {
     "white": "#FFFFFF"
 }
 
-# Streamlit UI Setup
-st.set_page_config(page_title="AQI Health Analyzer", page_icon="🌍", layout="centered")
-st.markdown(f"""
-    <style>
-        .stApp {{
-            background-color: {COLORS['accent']};
-        }}
-        .main-title {{
-            color: {COLORS['primary']};
-            font-size: 2.5rem;
-            font-weight: bold;
-            text-align: center;
-        }}
-        .subtitle {{
-            color: {COLORS['secondary']};
-            font-size: 1.2rem;
-            text-align: center;
-        }}
-        .stButton>button {{
-            background-color: {COLORS['primary']};
-            color: {COLORS['white']};
-        }}
-    </style>
-""", unsafe_allow_html=True)
+def render_page() -> None:
+    """Streamlit UI Setup; only runs under `streamlit run` so the module imports headless."""
+    import streamlit as st
+    st.set_page_config(page_title="AQI Health Analyzer", page_icon="🌍", layout="centered")
+    st.markdown(f"""
+        <style>
+            .stApp {{
+                background-color: {COLORS['accent']};
+            }}
+            .main-title {{
+                color: {COLORS['primary']};
+                font-size: 2.5rem;
+                font-weight: bold;
+                text-align: center;
+            }}
+            .subtitle {{
+                color: {COLORS['secondary']};
+                font-size: 1.2rem;
+                text-align: center;
+            }}
+            .stButton>button {{
+                background-color: {COLORS['primary']};
+                color: {COLORS['white']};
+            }}
+        </style>
+    """, unsafe_allow_html=True)
 
-st.markdown('<div class="main-title">AQI Health Analyzer</div>', unsafe_allow_html=True)
-st.markdown('<div class="subtitle">Get air quality, health recommendations, and pollution news</div>', unsafe_allow_html=True)
+    st.markdown('<div class="main-title">AQI Health Analyzer</div>', unsafe_allow_html=True)
+    st.markdown('<div class="subtitle">Get air quality, health recommendations, and pollution news</div>', unsafe_allow_html=True)
 
-with st.form("user_input_form"):
-    city = st.text_input("City", "Delhi")
-    state = st.text_input("State", "Delhi")
-    country = st.text_input("Country", "India")
-    medical_conditions = st.text_input("Medical Conditions (optional)")
-    planned_activity = st.text_input("Planned Activity", "Morning walk")
-    submitted = st.form_submit_button("Analyze")
+    with st.form("user_input_form"):
+        city = st.text_input("City", "Delhi")
+        state = st.text_input("State", "Delhi")
+        country = st.text_input("Country", "India")
+        medical_conditions = st.text_input("Medical Conditions (optional)")
+        planned_activity = st.text_input("Planned Activity", "Morning walk")
+        submitted = st.form_submit_button("Analyze")
 
-if submitted:
-    st.info("Analyzing conditions...", icon="🔎")
-    # You can call analyze_conditions here and display results
-    # st.write("Results will be shown here.")
+    if submitted:
+        st.info("Analyzing conditions...", icon="🔎")
+        # You can call analyze_conditions here and display results
+        # st.write("Results will be shown here.")
 
-# Define data structures
-class AQIData(BaseModel):
-    aqi: int = Field(description="Air Quality Index (1-5 scale)")
-    pm25: float = Field(description="PM2.5 concentration (μg/m³)")
-    pm10: float = Field(description="PM10 concentration (μg/m³)")
-    co: float = Field(description="CO concentration (μg/m³)")
-    no2: float = Field(description="NO2 concentration (μg/m³)")
-    o3: float = Field(description="O3 concentration (μg/m³)")
-    so2: float = Field(description="SO2 concentration (μg/m³)")
-    timestamp: str = Field(description="Time when the data was recorded")
+def _running_under_streamlit() -> bool:
+    # `streamlit run` has imported streamlit before executing this file; a plain import or `python main3.py` has not.
+    if "streamlit" not in sys.modules:
+        return False
+    from streamlit import runtime
+    return runtime.exists()
 
+# Define data structures
 @dataclass
 class UserInput:
     city: str
@@ -86,13 +84,6 @@ class NewsArticle:
     link: str
     date: Optional[str] = None
 
-class AlertLevel(Enum):
-    """Alert severity levels"""
-    LOW = "low"
-    MEDIUM = "medium"
-    HIGH = "high"
-    CRITICAL = "critical"
-
 class AQIAnalyzer:
     """Fetch AQI and weather data using OpenWeatherMap API"""
     
@@ -113,6 +104,7 @@ class AQIAnalyzer:
         
         geo_url = f"{self.base_geo_url}?q={location_query}&limit=1&appid={self.api_key}"
         
+        import requests
         try:
             response = requests.get(geo_url, timeout=10)
             response.raise_for_status()
@@ -143,6 +135,7 @@ class AQIAnalyzer:
     
     def fetch_aqi_data(self, city: str, state: str, country: str) -> Dict[str, float]:
         """Fetch AQI and weather data from OpenWeatherMap"""
+        import requests
         try:
             lat, lon = self._get_coordinates(city, state, country)
             
@@ -332,13 +325,7 @@ class HealthRecommendationAgent:
     """Generate health recommendations using Gemini AI"""
     
     def __init__(self, gemini_key: str) -> None:
-        self.agent = Agent(
-            model=Gemini(
-                id="gemini-2.5-flash",
-                api_key=gemini_key
-            ),
-            markdown=True
-        )
+        self.agent = build_gemini_agent(gemini_key)
     
     def get_recommendations(
         self,
@@ -419,13 +406,7 @@ class PlanningAgent:
     """Creates hospital planning decisions based on multi-agent data inputs"""
     
     def __init__(self, gemini_key: str) -> None:
-        self.agent = Agent(
-            model=Gemini(
-                id="gemini-2.5-flash",
-                api_key=gemini_key
-            ),
-            markdown=True
-        )
+        self.agent = build_gemini_agent(gemini_key)
     
     def create_plan(
         self,
@@ -514,13 +495,7 @@ class ThresholdAgent:
     """Evaluates conditions and determines if alert notification is needed"""
     
     def __init__(self, gemini_key: str) -> None:
-        self.agent = Agent(
-            model=Gemini(
-                id="gemini-2.5-flash",
-                api_key=gemini_key
-            ),
-            markdown=True
-        )
+        self.agent = build_gemini_agent(gemini_key)
     
     def evaluate_alert_needed(
         self,
@@ -583,96 +558,6 @@ class ThresholdAgent:
         return alert_needed, alert_level, reason
 
 
-class NotificationAgent:
-    """Handles SMS notifications via Twilio with human-in-the-loop approval"""
-    
-    def __init__(self, account_sid: str, auth_token: str, from_number: str) -> None:
-        try:
-            from twilio.rest import Client
-            self.client = Client(account_sid, auth_token)
-            self.from_number = from_number
-        except ImportError:
-            print("⚠️  Twilio library not installed. Install with: pip install twilio")
-            self.client = None
-    
-    def request_human_approval(
-        self,
-        alert_level: AlertLevel,
-        reason: str,
-        aqi_data: Dict[str, float]
-    ) -> bool:
-        """Ask for human approval before sending notification"""
-        print(f"\n{'='*60}")
-        print("🚨 ALERT NOTIFICATION REQUEST")
-        print(f"{'='*60}")
-        print(f"Alert Level: {alert_level.value.upper()}")
-        print(f"Reason: {reason}")
-        print(f"AQI: {aqi_data['aqi']} ({aqi_data['aqi_category']})")
-        print(f"PM2.5: {aqi_data['pm25']} μg/m³")
-        print(f"{'='*60}")
-        
-        while True:
-            response = input("\n📲 Do you want to send SMS notification? (yes/no): ").lower().strip()
-            if response in ['yes', 'y']:
-                return True
-            elif response in ['no', 'n']:
-                print("❌ Notification cancelled by user.")
-                return False
-            else:
-                print("Please enter 'yes' or 'no'")
-    
-    def send_sms(
-        self,
-        to_number: str,
-        alert_level: AlertLevel,
-        aqi_data: Dict[str, float],
-        reason: str
-    ) -> bool:
-        """Send SMS notification via Twilio"""
-        if not self.client:
-            print("❌ Twilio client not initialized")
-            return False
-        
-        # Create message content
-        message_body = self._format_alert_message(alert_level, aqi_data, reason)
-        
-        try:
-            message = self.client.messages.create(
-                body=message_body,
-                from_=self.from_number,
-                to=to_number
-            )
-            print(f"✅ SMS sent successfully! SID: {message.sid}")
-            return True
-        except Exception as e:
-            print(f"❌ Error sending SMS: {str(e)}")
-            return False
-    
-    def _format_alert_message(
-        self,
-        alert_level: AlertLevel,
-        aqi_data: Dict[str, float],
-        reason: str
-    ) -> str:
-        """Format alert message for SMS"""
-        emoji_map = {
-            AlertLevel.CRITICAL: "🔴",
-            AlertLevel.HIGH: "🟠",
-            AlertLevel.MEDIUM: "🟡",
-            AlertLevel.LOW: "🟢"
-        }
-        
-        emoji = emoji_map.get(alert_level, "⚠️")
-        
-        message = f"{emoji} HEALTH ALERT - {alert_level.value.upper()}\n\n"
-        message += f"AQI: {aqi_data['aqi']} ({aqi_data['aqi_category']})\n"
-        message += f"PM2.5: {aqi_data['pm25']} μg/m³\n\n"
-        message += f"{reason}\n\n"
-        message += "Take necessary precautions. Check full report for details."
-        
-        return message
-
-
 def analyze_conditions(
     user_input: UserInput,
     api_keys: Dict[str, str],
@@ -741,24 +626,16 @@ def analyze_conditions(
     if alert_needed and notification_config:
         print(f"\n⚠️  Alert condition detected: {alert_level.value.upper()}")
         
-        notification_agent = NotificationAgent(
-            account_sid=notification_config['account_sid'],
-            auth_token=notification_config['auth_token'],
-            from_number=notification_config['from_number']
-        )
+        notification_agent = get_notification_agent(notification_config)
         
-        # Request human approval
-        if notification_agent.request_human_approval(alert_level, reason, aqi_data):
-            # Send SMS to configured recipients
-            for recipient in notification_config.get('recipients', []):
-                notification_agent.send_sms(
-                    to_number=recipient,
-                    alert_level=alert_level,
-                    aqi_data=aqi_data,
-                    reason=reason
-                )
-        else:
-            print("ℹ️  Notification skipped by user.")
+        # Queue for human approval; approved alerts are sent in the background
+        notification_agent.request_human_approval(
+            alert_level,
+            reason,
+            aqi_data,
+            recipients=notification_config.get('recipients', []),
+            location=f"{user_input.city},{user_input.state},{user_input.country}"
+        )
     elif alert_needed:
         print(f"\n⚠️  Alert condition detected but notification config not provided")
     else:
@@ -767,8 +644,12 @@ def analyze_conditions(
     return recommendations, news_summary, hospital_plan
 
 
+if _running_under_streamlit():
+    render_page()
+
 # ---------- Console Execution Example ----------
-if __name__ == "__main__":
+# For sweeps over many locations use batch_runner.py instead.
+elif __name__ == "__main__":
     
     # API Keys Configuration
     API_KEYS = {
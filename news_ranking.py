@@ -0,0 +1,86 @@
+import math
+import re
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+# Weighted terms that mark an article as about air quality rather than general city news.
+POLLUTION_KEYWORDS: Dict[str, float] = {
+    "aqi": 2.0, "air quality": 2.0, "air pollution": 2.0, "smog": 2.0, "pm2.5": 2.0, "pm 2.5": 2.0,
+    "pm10": 1.5, "pollution": 1.5, "haze": 1.0, "dust": 1.0, "emission": 1.0, "stubble": 1.0,
+    "respiratory": 1.0, "asthma": 1.0, "advisory": 1.0, "alert": 0.5, "ozone": 1.0, "no2": 1.0,
+    "construction": 0.5, "firecracker": 1.0, "grap": 1.0, "mask": 0.5, "hospital": 0.5,
+}
+KEYWORD_SCORE_CAP = 5.0
+# Whole words only (plurals allowed), so "industry", "Iraqi" and "paragraph" don't count as dust, aqi or grap.
+_KEYWORD_PATTERNS = [
+    (re.compile(r"\b" + re.escape(keyword) + r"(?:s|es)?\b", re.IGNORECASE), weight)
+    for keyword, weight in POLLUTION_KEYWORDS.items()
+]
+LOCATION_WEIGHTS = {"city_title": 3.0, "city_snippet": 1.5, "state": 0.5}
+# Recency halves every RECENCY_HALF_LIFE_DAYS; articles with no parseable date score as if this old.
+RECENCY_HALF_LIFE_DAYS = 3.0
+UNKNOWN_AGE_DAYS = 7.0
+RECENCY_WEIGHT = 4.0
+
+_RELATIVE_DATE = re.compile(r"(\d+|an?|one)\s+(second|minute|min|hour|hr|day|week|month|year)s?\s+ago", re.IGNORECASE)
+_UNIT_SECONDS = {
+    "second": 1, "minute": 60, "min": 60, "hour": 3600, "hr": 3600,
+    "day": 86400, "week": 7 * 86400, "month": 30 * 86400, "year": 365 * 86400,
+}
+_ABSOLUTE_FORMATS = ("%b %d, %Y", "%d %b %Y", "%B %d, %Y", "%d %B %Y", "%Y-%m-%d", "%d/%m/%Y")
+
+def parse_article_date(text: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """Epoch seconds for Serper dates such as "2 days ago", "yesterday" or "Oct 17, 2025"; None if unknown."""
+    if not text:
+        return None
+    now = time.time() if now is None else now
+    text = text.strip()
+    lowered = text.lower()
+    if lowered in ("just now", "today"):
+        return now
+    if lowered == "yesterday":
+        return now - 86400
+    match = _RELATIVE_DATE.search(lowered)
+    if match:
+        amount, unit = match.groups()
+        amount = 1 if amount in ("a", "an", "one") else int(amount)
+        return now - amount * _UNIT_SECONDS[unit]
+    for fmt in _ABSOLUTE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).replace(tzinfo=timezone.utc).timestamp()
+        except ValueError:
+            continue
+    return None
+
+def keyword_score(text: str) -> float:
+    return min(KEYWORD_SCORE_CAP, sum(weight for pattern, weight in _KEYWORD_PATTERNS if pattern.search(text)))
+
+def location_score(title: str, snippet: str, city: str, state: Optional[str]) -> float:
+    city = city.strip().lower()
+    score = 0.0
+    if city and city in title.lower():
+        score += LOCATION_WEIGHTS["city_title"]
+    elif city and city in snippet.lower():
+        score += LOCATION_WEIGHTS["city_snippet"]
+    if state and state.lower() != 'none' and state.strip().lower() in f"{title} {snippet}".lower():
+        score += LOCATION_WEIGHTS["state"]
+    return score
+
+def recency_score(published_at: Optional[float], now: float) -> float:
+    age_days = UNKNOWN_AGE_DAYS if published_at is None else max(0.0, (now - published_at) / 86400)
+    return RECENCY_WEIGHT * math.pow(0.5, age_days / RECENCY_HALF_LIFE_DAYS)
+
+def score_article(article, city: str, state: Optional[str] = None, now: Optional[float] = None) -> float:
+    now = time.time() if now is None else now
+    return (
+        location_score(article.title, article.snippet, city, state)
+        + keyword_score(f"{article.title} {article.snippet}")
+        + recency_score(parse_article_date(article.date, now), now)
+    )
+
+def rank_articles(articles: List, city: str, state: Optional[str] = None, k: Optional[int] = None, now: Optional[float] = None) -> List:
+    """Most relevant, most recent articles first; ties keep Serper's order. Returns at most k when given."""
+    now = time.time() if now is None else now
+    ranked = sorted(articles, key=lambda article: -score_article(article, city, state, now))
+    return ranked if k is None else ranked[:k]
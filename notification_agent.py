@@ -1,15 +1,53 @@
-from typing import Dict
-from enum import Enum
+import json
+import threading
+from typing import Dict, List, Optional
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from alert_state import AlertStateStore, DEFAULT_ALERT_STATE_PATH, get_alert_state_store
+from approval_queue import ApprovalQueue, DEFAULT_APPROVAL_QUEUE_PATH, get_approval_queue
+from rate_limit import TokenBucket
+from sms_composer import ComposedMessage, compose_alert
+from resilience import RetryPolicy, call_upstream
+# Share the enum the ThresholdAgent produces so emoji lookups match its levels.
+from threshold_agent import AlertLevel
 
-class AlertLevel(Enum):
-    LOW = "low"
-    MEDIUM = "medium"
-    HIGH = "high"
-    CRITICAL = "critical"
+def is_unsent_failure(exc: BaseException) -> bool:
+    """True only when Twilio cannot have accepted the message: a 429, or a connection that failed before the request went out.
+
+    Read timeouts and dropped connections are not retried, since the SMS may already be on its way.
+    """
+    status = getattr(exc, "status", None)
+    if isinstance(status, int):
+        return status == 429
+    from requests.exceptions import ConnectTimeout, ConnectionError as RequestsConnectionError
+    from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+    if isinstance(exc, ConnectTimeout):
+        return True
+    if isinstance(exc, RequestsConnectionError):
+        reason = getattr(exc.args[0], "reason", None) if exc.args else None
+        return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+    return isinstance(exc, ConnectionRefusedError)
+
+@dataclass
+class DeliveryResult:
+    to_number: str
+    success: bool
+    sid: Optional[str] = None
+    attempts: int = 0
+    error: Optional[str] = None
+    suppressed: bool = False
+    segments: int = 0
+    encoding: Optional[str] = None
 
 class NotificationAgent:
     """Handles SMS notifications via Twilio with human-in-the-loop approval"""
-    def __init__(self, account_sid: str, auth_token: str, from_number: str) -> None:
+    def __init__(self, account_sid: str, auth_token: str, from_number: str, alert_store: Optional[AlertStateStore] = None, approval_queue: Optional[ApprovalQueue] = None, bulk_options: Optional[Dict] = None, max_segments: Optional[int] = 1) -> None:
+        self.alert_store = alert_store
+        # Segment budget per alert; None sends the richest template however many segments it needs.
+        self.max_segments = max_segments
+        self.approval_queue = approval_queue
+        # Extra send_bulk_sms arguments (max_workers, rate_per_second, ...) used for approved alerts.
+        self.bulk_options = bulk_options or {}
         try:
             from twilio.rest import Client
             self.client = Client(account_sid, auth_token)
@@ -17,54 +55,130 @@ class NotificationAgent:
         except ImportError:
             print("⚠️  Twilio library not installed. Install with: pip install twilio")
             self.client = None
+        if self.approval_queue is not None:
+            self.approval_queue.start_dispatcher(self)
 
-    def request_human_approval(self, alert_level: AlertLevel, reason: str, aqi_data: Dict[str, float]) -> bool:
+    @classmethod
+    def from_config(cls, notification_config: Dict) -> "NotificationAgent":
+        """Build an agent with the shared alert-state store and approval queue named in the config."""
+        return cls(
+            account_sid=notification_config['account_sid'],
+            auth_token=notification_config['auth_token'],
+            from_number=notification_config['from_number'],
+            alert_store=get_alert_state_store(notification_config.get('alert_state_path', DEFAULT_ALERT_STATE_PATH)),
+            approval_queue=get_approval_queue(notification_config.get('approval_queue_path', DEFAULT_APPROVAL_QUEUE_PATH)),
+            bulk_options={k: notification_config[k] for k in ('max_workers', 'rate_per_second', 'max_attempts') if k in notification_config},
+            max_segments=notification_config.get('max_segments', 1)
+        )
+
+    def request_human_approval(self, alert_level: AlertLevel, reason: str, aqi_data: Dict[str, float], recipients: List[str], location: str) -> str:
+        """Queue the alert for operator approval and return its id without waiting for a decision."""
+        if self.approval_queue is None:
+            raise RuntimeError("NotificationAgent has no approval queue configured")
+        alert_id = self.approval_queue.submit(alert_level.value, reason, aqi_data, recipients, location)
         print(f"\n{'='*60}")
         print("🚨 ALERT NOTIFICATION REQUEST")
         print(f"{'='*60}")
+        print(f"Alert ID: {alert_id}")
         print(f"Alert Level: {alert_level.value.upper()}")
         print(f"Reason: {reason}")
         print(f"AQI: {aqi_data['aqi']} ({aqi_data['aqi_category']})")
         print(f"PM2.5: {aqi_data['pm25']} μg/m³")
+        print(f"Recipients: {len(recipients)}")
         print(f"{'='*60}")
-        while True:
-            response = input("\n📲 Do you want to send SMS notification? (yes/no): ").lower().strip()
-            if response in ['yes', 'y']:
-                return True
-            elif response in ['no', 'n']:
-                print("❌ Notification cancelled by user.")
-                return False
-            else:
-                print("Please enter 'yes' or 'no'")
+        print(f"⏳ Awaiting approval: python approval_queue.py approve {alert_id}")
+        return alert_id
 
     def send_sms(self, to_number: str, alert_level: AlertLevel, aqi_data: Dict[str, float], reason: str) -> bool:
         if not self.client:
             print("❌ Twilio client not initialized")
             return False
-        message_body = self._format_alert_message(alert_level, aqi_data, reason)
+        composed = self.compose_alert_message(alert_level, aqi_data, reason)
         try:
-            message = self.client.messages.create(
-                body=message_body,
+            message = call_upstream(
+                "twilio",
+                self.client.messages.create,
+                body=composed.body,
                 from_=self.from_number,
                 to=to_number
             )
-            print(f"✅ SMS sent successfully! SID: {message.sid}")
+            print(f"✅ SMS sent successfully! SID: {message.sid} ({composed.segments} {composed.encoding} segment(s))")
             return True
         except Exception as e:
             print(f"❌ Error sending SMS: {str(e)}")
             return False
 
+    def send_bulk_sms(self, recipients: List[str], alert_level: AlertLevel, aqi_data: Dict[str, float], reason: str, max_workers: int = 8, rate_per_second: Optional[float] = None, max_attempts: int = 3, location: Optional[str] = None) -> List[DeliveryResult]:
+        """Send one alert to many recipients concurrently; returns a DeliveryResult per recipient, in order.
+
+        With an alert_store and a location, recipients still inside their cooldown for this
+        level are skipped and reported as suppressed.
+        """
+        if not self.client:
+            return [DeliveryResult(to_number=r, success=False, error="Twilio client not initialized") for r in recipients]
+        suppressed = set()
+        claimed: List[str] = []
+        if self.alert_store and location:
+            # Checked and reserved atomically, so a concurrent send for the same location skips these recipients.
+            claimed, skipped = self.alert_store.claim(recipients, location, alert_level.value)
+            suppressed = set(skipped)
+        composed = self.compose_alert_message(alert_level, aqi_data, reason)
+        message_body = composed.body
+        # The process-wide governor still applies; this caps a single fan-out on top of it.
+        pacer = TokenBucket("twilio-bulk", rate_per_second, 1, max_workers) if rate_per_second else None
+        # Sends are not idempotent: only retry failures where the message cannot have gone out.
+        retry = RetryPolicy(max_attempts=max_attempts, retry_on=is_unsent_failure)
+
+        def deliver(to_number: str) -> DeliveryResult:
+            result = DeliveryResult(to_number=to_number, success=False, segments=composed.segments, encoding=composed.encoding)
+            if to_number in suppressed:
+                result.suppressed = True
+                result.error = f"Suppressed: {alert_level.value} alert already sent within cooldown"
+                return result
+
+            def create():
+                result.attempts += 1
+                return self.client.messages.create(body=message_body, from_=self.from_number, to=to_number)
+            # Paced before call_upstream so waiting here never holds one of the governor's Twilio slots.
+            if pacer:
+                pacer.acquire()
+                pacer.release()
+            try:
+                message = call_upstream("twilio", create, retry=retry)
+            except Exception as e:
+                result.error = str(e)
+                return result
+            result.success = True
+            result.sid = message.sid
+            return result
+
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(recipients)))) as pool:
+                results = list(pool.map(deliver, recipients))
+        except BaseException:
+            if claimed:
+                self.alert_store.release(claimed, location, alert_level.value)
+            raise
+        if claimed:
+            self.alert_store.record_many([r.to_number for r in results if r.success], location, alert_level.value)
+            self.alert_store.release([r.to_number for r in results if not r.success and not r.suppressed], location, alert_level.value)
+        return results
+
+    def compose_alert_message(self, alert_level: AlertLevel, aqi_data: Dict[str, float], reason: str) -> ComposedMessage:
+        """Cheapest SMS rendering within self.max_segments (the richest when uncapped), with its encoding and segment count."""
+        return compose_alert(alert_level.value, aqi_data, reason, self.max_segments)
+
     def _format_alert_message(self, alert_level: AlertLevel, aqi_data: Dict[str, float], reason: str) -> str:
-        emoji_map = {
-            AlertLevel.CRITICAL: "🔴",
-            AlertLevel.HIGH: "🟠",
-            AlertLevel.MEDIUM: "🟡",
-            AlertLevel.LOW: "🟢"
-        }
-        emoji = emoji_map.get(alert_level, "⚠️")
-        message = f"{emoji} HEALTH ALERT - {alert_level.value.upper()}\n\n"
-        message += f"AQI: {aqi_data['aqi']} ({aqi_data['aqi_category']})\n"
-        message += f"PM2.5: {aqi_data['pm25']} μg/m³\n\n"
-        message += f"{reason}\n\n"
-        message += "Take necessary precautions. Check full report for details."
-        return message
+        return self.compose_alert_message(alert_level, aqi_data, reason).body
+
+_agents: Dict[str, NotificationAgent] = {}
+_agents_lock = threading.Lock()
+
+def get_notification_agent(notification_config: Dict) -> NotificationAgent:
+    """Process-wide agent per notification config, so each run reuses one Twilio client and dispatcher."""
+    # Recipients vary per alert and do not change how the agent is built.
+    key = json.dumps({k: v for k, v in notification_config.items() if k != 'recipients'}, sort_keys=True, default=str)
+    with _agents_lock:
+        if key not in _agents:
+            _agents[key] = NotificationAgent.from_config(notification_config)
+        return _agents[key]
@@ -1,35 +1,96 @@
 from typing import Dict, Optional
-from agno.agent import Agent
-from agno.models.google import Gemini
-import json
+from gemini_agent import GeminiAgent
+from llm_budget import DEGRADED, EXHAUSTED
+from threshold_agent import rule_based_level
+from feed_ingest import HOSPITAL_FEEDS, compact_payload, format_feed_summary
 # Import hospital resource data
 from hospital_resources import get_hospital_count, get_resource_breakdown
 
-class PlanningAgent:
+PLANNING_INSTRUCTIONS = """You are a **Hospital Planning Agent for surge preparedness**.
+Each request gives the inputs received from other agents: air quality and weather, a pollution and local news summary, an epidemic risk signal, hospital resource status and healthcare API data.
+Using the available data, generate a **realistic actionable hospital planning response** including:
+1. **Surge Risk Level**
+2. **Patient Load Forecast**
+3. **Staffing Plan**
+4. **Equipment & Supplies**
+5. **Air + Epidemic Precautions**
+6. **Capacity Optimization**
+7. **Festival / Crowd Logistics**
+8. **Resource Allocation Recommendations** (suggest which facilities/resources to use based on situation)
+9. **Plan Summary**
+**IMPORTANT:** End your response with a clear surge risk classification in this exact format:
+SURGE_RISK_LEVEL: [LOW/MEDIUM/HIGH/CRITICAL]"""
+
+# Used while the planning budget is degraded, in place of PLANNING_INSTRUCTIONS' nine-section plan.
+SHORT_PLANNING_INSTRUCTIONS = """You are a **Hospital Planning Agent for surge preparedness** answering in brief.
+Keep the response under 150 words: give only the surge risk, staffing and supplies actions and a one-line summary for the inputs given.
+End your response with: SURGE_RISK_LEVEL: [LOW/MEDIUM/HIGH/CRITICAL]"""
+
+class ShortPlanningAgent(GeminiAgent):
+    """Planning under a degraded budget, with its own short system instructions"""
+    # Shares the planning budget and stage name; only the instructions differ.
+    name = "planning"
+    instructions = SHORT_PLANNING_INSTRUCTIONS
+
+class PlanningAgent(GeminiAgent):
     """Creates hospital planning decisions based on multi-agent data inputs"""
+    name = "planning"
+    # How many ranked articles go into the news summary this agent plans from.
+    news_top_k = 5
+    instructions = PLANNING_INSTRUCTIONS
+
     def __init__(self, gemini_key: str) -> None:
-        self.agent = Agent(
-            model=Gemini(
-                id="gemini-2.5-flash",
-                api_key=gemini_key
-            ),
-            markdown=True
-        )
+        super().__init__(gemini_key)
+        # A separate agno Agent, so degraded calls neither run under nor resend the full instructions.
+        self.short_agent = ShortPlanningAgent(gemini_key)
 
-    def create_plan(self, aqi_data: Dict[str, float], news_summary: str, healthcare_api_data: Dict, epidemic_signal: Optional[Dict] = None, resource_status: Optional[Dict] = None, state: Optional[str] = None) -> str:
+    def create_plan(self, aqi_data: Dict[str, float], news_summary: str, healthcare_api_data: Dict, epidemic_signal: Optional[Dict] = None, resource_status: Optional[Dict] = None, state: Optional[str] = None, local_aqi: Optional[str] = None) -> str:
         # Get hospital resource info for the state/UT
         hospital_info = get_hospital_count(state or "") if state else None
         bed_info = get_resource_breakdown("Bed Strength")
         doctor_info = get_resource_breakdown("Number of Doctors")
         nurse_info = get_resource_breakdown("Number of Nurses")
-        prompt = self._build_prompt(aqi_data, news_summary, healthcare_api_data, epidemic_signal, resource_status, hospital_info, bed_info, doctor_info, nurse_info)
-        response = self.agent.run(prompt)
-        return response.content
+        # Rolling aggregates from the streamed hospital feeds, if any have been ingested for this state.
+        feed_summary = HOSPITAL_FEEDS.summary(state) if state else None
+        mode = self.budget_mode()
+        if mode == EXHAUSTED:
+            return self._static_plan(aqi_data, hospital_info, bed_info, feed_summary)
+        if mode == DEGRADED:
+            return self.short_agent._run(self._build_short_prompt(aqi_data, news_summary, epidemic_signal, resource_status, hospital_info, feed_summary, state, local_aqi))
+        prompt = self._build_prompt(aqi_data, news_summary, healthcare_api_data, epidemic_signal, resource_status, hospital_info, bed_info, doctor_info, nurse_info, feed_summary, state, local_aqi)
+        return self._run(prompt)
+
+    def _build_short_prompt(self, aqi_data: Dict[str, float], news_summary: str, epidemic_signal: Optional[Dict], resource_status: Optional[Dict], hospital_info=None, feed_summary=None, state=None, local_aqi=None) -> str:
+        hospitals = hospital_info.get('Total number of hospitals (public+private)', 'NA') if hospital_info else 'NA'
+        return f"""
+        - AQI: {aqi_data['aqi']} ({aqi_data['aqi_category']}), PM2.5: {aqi_data['pm25']} μg/m³
+        - Neighbourhoods: {local_aqi or 'NA'}
+        - Epidemic signal: {compact_payload(epidemic_signal or {}, state, limit=300)}
+        - Resources: {compact_payload(resource_status or {}, state, limit=300)}; hospitals in state: {hospitals}
+        {format_feed_summary(feed_summary) if feed_summary else ''}
+        - News: {news_summary[:300]}
+        """
+
+    def _static_plan(self, aqi_data: Dict[str, float], hospital_info=None, bed_info=None, feed_summary=None) -> str:
+        # No model call at all: surge risk follows the same AQI thresholds as the threshold agent.
+        surge_risk = rule_based_level(aqi_data['aqi'])
+        plan = f"**Surge Risk Level:** {surge_risk.value.upper()} (AQI {aqi_data['aqi']}, {aqi_data['aqi_category']})\n"
+        if hospital_info:
+            plan += f"**Hospitals in State/UT:** {hospital_info.get('Total number of hospitals (public+private)', 'NA')}\n"
+        if bed_info:
+            plan += f"**Total Bed Strength:** {bed_info.get('Total', 'NA')}\n"
+        if feed_summary:
+            plan += f"**Hospital Feed:**\n{format_feed_summary(feed_summary)}\n"
+        plan += "**Actions:** Review respiratory-ward staffing and nebuliser/oxygen stock; escalate if admissions rise.\n"
+        plan += "_Detailed planning is temporarily unavailable (LLM budget reached)._\n"
+        plan += f"SURGE_RISK_LEVEL: {surge_risk.value.upper()}"
+        return plan
 
-    def _build_prompt(self, aqi_data: Dict[str, float], news_summary: str, healthcare_api_data: Dict, epidemic_signal: Optional[Dict], resource_status: Optional[Dict], hospital_info=None, bed_info=None, doctor_info=None, nurse_info=None) -> str:
-        epidemic_context = json.dumps(epidemic_signal or {"status": "No epidemic risk passed"})
-        resource_context = json.dumps(resource_status or {"status": "No hospital resource data passed"})
-        healthcare_context = json.dumps(healthcare_api_data or {"status": "No healthcare API data shared yet"})
+    def _build_prompt(self, aqi_data: Dict[str, float], news_summary: str, healthcare_api_data: Dict, epidemic_signal: Optional[Dict], resource_status: Optional[Dict], hospital_info=None, bed_info=None, doctor_info=None, nurse_info=None, feed_summary=None, state=None, local_aqi=None) -> str:
+        # Feed-shaped payloads are aggregated and anything else is capped, so prompt size no longer grows with the data.
+        epidemic_context = compact_payload(epidemic_signal or {"status": "No epidemic risk passed"}, state)
+        resource_context = compact_payload(resource_status or {"status": "No hospital resource data passed"}, state)
+        healthcare_context = compact_payload(healthcare_api_data or {"status": "No healthcare API data shared yet"}, state)
         # Format hospital resource info
         hospital_resource_text = ""
         if hospital_info:
@@ -40,8 +101,10 @@ class PlanningAgent:
             hospital_resource_text += f"- Total Doctors: {doctor_info.get('Total', 'NA')}\n"
         if nurse_info:
             hospital_resource_text += f"- Total Nurses: {nurse_info.get('Total', 'NA')}\n"
+        if feed_summary:
+            hospital_resource_text += f"📈 **Hospital Feed (rolling)**\n{format_feed_summary(feed_summary)}\n"
+        # Only the per-request data; the static instructions go out once as the system message.
         return f"""
-        You are a **Hospital Planning Agent for surge preparedness**.
         **Inputs received from other agents:**
         📌 **Air Quality & Weather**
         - AQI: {aqi_data['aqi']} ({aqi_data['aqi_category']})
@@ -50,6 +113,7 @@ class PlanningAgent:
         - Temperature: {aqi_data['temperature']}°C
         - Humidity: {aqi_data['humidity']}%
         - Wind Speed: {aqi_data['wind_speed']:.2f} km/h
+        - Neighbourhood AQI: {local_aqi or 'No ward-level readings for this city'}
         📰 **Pollution / Local News Summary**
         {news_summary}
         🧬 **Epidemic Risk Signal**
@@ -59,17 +123,4 @@ class PlanningAgent:
         {hospital_resource_text}
         🧾 **Healthcare API Sample Data**
         {healthcare_context}
-        ---
-        Using this available data, generate a **realistic actionable hospital planning response** including:
-        1. **Surge Risk Level**
-        2. **Patient Load Forecast**
-        3. **Staffing Plan**
-        4. **Equipment & Supplies**
-        5. **Air + Epidemic Precautions**
-        6. **Capacity Optimization**
-        7. **Festival / Crowd Logistics**
-        8. **Resource Allocation Recommendations** (suggest which facilities/resources to use based on situation)
-        9. **Plan Summary**
-        **IMPORTANT:** End your response with a clear surge risk classification in this exact format:
-        SURGE_RISK_LEVEL: [LOW/MEDIUM/HIGH/CRITICAL]
         """
@@ -2,6 +2,14 @@ from typing import List, Optional
 from dataclasses import dataclass
 import http.client
 import json
+import logging
+from cache import SHARED_CACHE, Freshness, fetch_through, location_key, note_freshness
+from resilience import UpstreamHTTPError, call_upstream
+
+NEWS_TTL_SECONDS = 1800
+SERPER_TIMEOUT_SECONDS = 10
+
+logger = logging.getLogger(__name__)
 
 @dataclass
 class NewsArticle:
@@ -17,6 +25,21 @@ class PollutionNewsAgent:
         self.base_url = "google.serper.dev"
 
     def fetch_news(self, city: str, state: str, country: str) -> List[NewsArticle]:
+        try:
+            return list(fetch_through(("news",) + location_key(city, state, country), self.refresh_news, city, state, country, source="news"))
+        except Exception as exc:
+            # News is supplementary context; the pipeline proceeds without it, but says so.
+            logger.warning("No news available for %s, %s: %s", city, country, exc)
+            note_freshness("news", Freshness(None))
+            return []
+
+    def refresh_news(self, city: str, state: str, country: str, ttl: Optional[float] = None) -> List[NewsArticle]:
+        """Query Serper and store the deduplicated articles in the shared cache."""
+        articles = self._download_news(city, state, country)
+        SHARED_CACHE.set(("news",) + location_key(city, state, country), articles, ttl=NEWS_TTL_SECONDS if ttl is None else ttl)
+        return list(articles)
+
+    def _download_news(self, city: str, state: str, country: str) -> List[NewsArticle]:
         location = f"{city}"
         if state and state.lower() != 'none':
             location += f" {state}"
@@ -26,30 +49,42 @@ class PollutionNewsAgent:
             f"{location} air quality alert"
         ]
         all_articles = []
+        errors = []
         for query in queries:
             try:
-                conn = http.client.HTTPSConnection(self.base_url)
-                payload = json.dumps({"q": query, "gl": country.lower()[:2], "tbs": "qdr:w", "num": 5})
-                headers = {'X-API-KEY': self.api_key, 'Content-Type': 'application/json'}
-                conn.request("POST", "/search", payload, headers)
-                res = conn.getresponse()
-                data = res.read()
-                response_data = json.loads(data.decode("utf-8"))
-                if 'organic' in response_data:
-                    for result in response_data['organic'][:3]:
-                        article = NewsArticle(
-                            title=result.get('title', ''),
-                            snippet=result.get('snippet', ''),
-                            link=result.get('link', ''),
-                            date=result.get('date', 'Recent')
-                        )
-                        all_articles.append(article)
-                conn.close()
-            except Exception:
+                response_data = call_upstream("serper", self._search, query, country)
+            except Exception as exc:
+                logger.warning("Serper query %r failed: %s", query, exc)
+                errors.append(exc)
                 continue
+            for result in response_data.get('organic', [])[:3]:
+                article = NewsArticle(
+                    title=result.get('title', ''),
+                    snippet=result.get('snippet', ''),
+                    link=result.get('link', ''),
+                    date=result.get('date', 'Recent')
+                )
+                all_articles.append(article)
+        if len(errors) == len(queries):
+            # Let the caller fall back to cached news instead of caching an empty result.
+            raise errors[-1]
         unique_articles = self._deduplicate_articles(all_articles)
         return unique_articles
 
+    def _search(self, query: str, country: str) -> dict:
+        conn = http.client.HTTPSConnection(self.base_url, timeout=SERPER_TIMEOUT_SECONDS)
+        try:
+            payload = json.dumps({"q": query, "gl": country.lower()[:2], "tbs": "qdr:w", "num": 5})
+            headers = {'X-API-KEY': self.api_key, 'Content-Type': 'application/json'}
+            conn.request("POST", "/search", payload, headers)
+            res = conn.getresponse()
+            data = res.read().decode("utf-8")
+            if res.status >= 400:
+                raise UpstreamHTTPError("serper", res.status, data)
+            return json.loads(data)
+        finally:
+            conn.close()
+
     def _deduplicate_articles(self, articles: List[NewsArticle]) -> List[NewsArticle]:
         seen_titles = set()
         unique = []
@@ -0,0 +1,198 @@
+import contextvars
+import heapq
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from enum import IntEnum
+from typing import Dict, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: cross-process buckets fall back to per-process ones.
+    fcntl = None
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    BATCH = 1
+
+class RateLimitTimeout(Exception):
+    """Raised when a caller waited longer than its timeout for an upstream slot"""
+
+# (tokens per second, burst capacity, max concurrent requests) per upstream.
+DEFAULT_LIMITS = {
+    "openweathermap": (1.0, 10, 8),
+    "serper": (5.0, 10, 6),
+    "gemini": (2.0, 5, 8),
+    "twilio": (1.0, 5, 4),
+}
+
+_current_priority: contextvars.ContextVar = contextvars.ContextVar("request_priority", default=Priority.INTERACTIVE)
+
+@contextmanager
+def request_priority(priority: Priority) -> Iterator[None]:
+    """Run the enclosed upstream calls at the given priority (interactive by default)."""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+class _LocalTokens:
+    def __init__(self, rate: float, capacity: int) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Take one token; return 0 on success or the seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+class _FileTokens:
+    """Token state kept in a flock-guarded file so several processes share one bucket"""
+    def __init__(self, path: str, rate: float, capacity: int) -> None:
+        self.path = path
+        self.rate = rate
+        self.capacity = capacity
+
+    def take(self) -> float:
+        with open(self.path, "a+") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                handle.seek(0)
+                raw = handle.read()
+                now = time.time()
+                state = json.loads(raw) if raw else {"tokens": self.capacity, "updated": now}
+                tokens = min(self.capacity, state["tokens"] + (now - state["updated"]) * self.rate)
+                wait = 0.0
+                if tokens >= 1:
+                    tokens -= 1
+                else:
+                    wait = (1 - tokens) / self.rate
+                handle.seek(0)
+                handle.truncate()
+                handle.write(json.dumps({"tokens": tokens, "updated": now}))
+                handle.flush()
+                return wait
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+class TokenBucket:
+    """Rate and concurrency limit for one upstream, serving queued callers in priority order"""
+    def __init__(self, name: str, rate: float, capacity: int, max_concurrency: int, state_dir: Optional[str] = None) -> None:
+        self.name = name
+        self.max_concurrency = max_concurrency
+        if state_dir and fcntl is not None:
+            os.makedirs(state_dir, exist_ok=True)
+            self._tokens = _FileTokens(os.path.join(state_dir, f"{name}.bucket"), rate, capacity)
+        else:
+            self._tokens = _LocalTokens(rate, capacity)
+        self._cond = threading.Condition()
+        self._waiters = []
+        self._seq = 0
+        self._in_flight = 0
+        self._metrics = {p.name.lower(): {"acquired": 0, "timeouts": 0, "wait_total": 0.0, "wait_max": 0.0} for p in Priority}
+
+    def acquire(self, priority: Priority = Priority.INTERACTIVE, timeout: Optional[float] = None) -> float:
+        """Block until a token and a concurrency slot are free; return the seconds waited."""
+        start = time.monotonic()
+        deadline = None if timeout is None else start + timeout
+        with self._cond:
+            self._seq += 1
+            ticket = (int(priority), self._seq)
+            heapq.heappush(self._waiters, ticket)
+            try:
+                while True:
+                    wait = None
+                    if self._waiters[0] == ticket and self._in_flight < self.max_concurrency:
+                        wait = self._tokens.take()
+                        if wait <= 0:
+                            break
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._metrics[priority.name.lower()]["timeouts"] += 1
+                            raise RateLimitTimeout(f"Timed out after {timeout}s waiting for {self.name}")
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self._cond.wait(wait)
+            except BaseException:
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+                raise
+            heapq.heappop(self._waiters)
+            self._in_flight += 1
+            waited = time.monotonic() - start
+            metrics = self._metrics[priority.name.lower()]
+            metrics["acquired"] += 1
+            metrics["wait_total"] += waited
+            metrics["wait_max"] = max(metrics["wait_max"], waited)
+            self._cond.notify_all()
+        return waited
+
+    def release(self) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def snapshot(self) -> Dict:
+        with self._cond:
+            by_priority = {}
+            for name, m in self._metrics.items():
+                by_priority[name] = dict(m, wait_avg=m["wait_total"] / m["acquired"] if m["acquired"] else 0.0)
+            return {"in_flight": self._in_flight, "queued": len(self._waiters), "by_priority": by_priority}
+
+class RateGovernor:
+    """Process-wide set of per-upstream token buckets shared by every client"""
+    def __init__(self, limits: Optional[Dict[str, tuple]] = None, state_dir: Optional[str] = None) -> None:
+        self.state_dir = state_dir
+        self._limits = dict(DEFAULT_LIMITS, **(limits or {}))
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "RateGovernor":
+        """Build from RATE_LIMIT_<UPSTREAM>="rate,burst,concurrency" and RATE_LIMIT_STATE_DIR."""
+        limits = {}
+        for name in DEFAULT_LIMITS:
+            raw = os.getenv(f"RATE_LIMIT_{name.upper()}")
+            if raw:
+                rate, burst, concurrency = raw.split(",")
+                limits[name] = (float(rate), int(burst), int(concurrency))
+        return cls(limits, state_dir=os.getenv("RATE_LIMIT_STATE_DIR") or None)
+
+    def bucket(self, upstream: str) -> TokenBucket:
+        with self._lock:
+            if upstream not in self._buckets:
+                rate, capacity, concurrency = self._limits.get(upstream, (1.0, 1, 1))
+                self._buckets[upstream] = TokenBucket(upstream, rate, capacity, concurrency, self.state_dir)
+            return self._buckets[upstream]
+
+    @contextmanager
+    def acquire(self, upstream: str, priority: Optional[Priority] = None, timeout: Optional[float] = None) -> Iterator[float]:
+        bucket = self.bucket(upstream)
+        waited = bucket.acquire(_current_priority.get() if priority is None else priority, timeout)
+        try:
+            yield waited
+        finally:
+            bucket.release()
+
+    def reset(self) -> None:
+        """Drop every bucket so the next call starts full with fresh metrics (e.g. between load-test runs)."""
+        with self._lock:
+            self._buckets.clear()
+
+    def metrics(self) -> Dict[str, Dict]:
+        with self._lock:
+            buckets = dict(self._buckets)
+        return {name: bucket.snapshot() for name, bucket in buckets.items()}
+
+GOVERNOR = RateGovernor.from_env()
@@ -0,0 +1,181 @@
+import math
+import time
+from array import array
+from dataclasses import dataclass, fields
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; ReadingBatch's array columns work without it
+    np = None
+
+# Format of the legacy dict's 'timestamp' string (local time, as AQIAnalyzer has always produced it).
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+POLLUTANTS = ("pm25", "pm10", "co", "no2", "o3", "so2")
+WEATHER = ("temperature", "humidity", "wind_speed")
+# OpenWeatherMap's five categories; stored as small integer codes in batches.
+CATEGORIES = ("Good", "Fair", "Moderate", "Poor", "Very Poor", "Unknown")
+
+@dataclass(slots=True)
+class AQIReading:
+    """One air-quality and weather observation with a numeric epoch timestamp"""
+    aqi: int
+    aqi_category: str
+    pm25: float
+    pm10: float
+    co: float
+    no2: float
+    o3: float
+    so2: float
+    timestamp: float
+    temperature: Optional[float] = None
+    humidity: Optional[float] = None
+    wind_speed: Optional[float] = None
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, float], lat: Optional[float] = None, lon: Optional[float] = None) -> "AQIReading":
+        """Build from the legacy fetch_aqi_data dict, parsing its timestamp string."""
+        timestamp = data['timestamp']
+        if isinstance(timestamp, str):
+            timestamp = datetime.strptime(timestamp, TIMESTAMP_FORMAT).timestamp()
+        return cls(
+            aqi=int(data['aqi']),
+            aqi_category=data.get('aqi_category') or "Unknown",
+            pm25=float(data['pm25']),
+            pm10=float(data['pm10']),
+            co=float(data['co']),
+            no2=float(data['no2']),
+            o3=float(data['o3']),
+            so2=float(data['so2']),
+            timestamp=float(timestamp),
+            temperature=data.get('temperature'),
+            humidity=data.get('humidity'),
+            wind_speed=data.get('wind_speed'),
+            lat=data.get('lat', lat),
+            lon=data.get('lon', lon)
+        )
+
+    def to_dict(self) -> Dict[str, float]:
+        """The legacy dict the agents' prompts are written against."""
+        return {
+            'aqi': self.aqi,
+            'aqi_category': self.aqi_category,
+            'temperature': self.temperature,
+            'humidity': self.humidity,
+            'wind_speed': self.wind_speed,
+            'pm25': self.pm25,
+            'pm10': self.pm10,
+            'co': self.co,
+            'no2': self.no2,
+            'o3': self.o3,
+            'so2': self.so2,
+            'timestamp': datetime.fromtimestamp(self.timestamp).strftime(TIMESTAMP_FORMAT)
+        }
+
+    @property
+    def age_seconds(self) -> float:
+        return time.time() - self.timestamp
+
+# Column layout shared by ReadingBatch and its NumPy structured-array form.
+_FLOAT_COLUMNS = POLLUTANTS + ("timestamp",) + WEATHER + ("lat", "lon")
+NUMPY_DTYPE = [("aqi", "i2"), ("category", "i1")] + [(name, "f8") for name in _FLOAT_COLUMNS]
+
+def _category_code(category: str) -> int:
+    return CATEGORIES.index(category) if category in CATEGORIES else CATEGORIES.index("Unknown")
+
+def _float_or_nan(value: Optional[float]) -> float:
+    return math.nan if value is None else float(value)
+
+def _nan_to_none(value: float) -> Optional[float]:
+    return None if math.isnan(value) else value
+
+class ReadingBatch:
+    """Struct-of-arrays collection of readings: one compact typed column per field instead of a dict per reading"""
+    def __init__(self) -> None:
+        self.aqi = array("h")
+        self.category = array("b")
+        self.columns: Dict[str, array] = {name: array("d") for name in _FLOAT_COLUMNS}
+
+    @classmethod
+    def from_readings(cls, readings: Iterable[AQIReading]) -> "ReadingBatch":
+        batch = cls()
+        for reading in readings:
+            batch.append(reading)
+        return batch
+
+    @classmethod
+    def from_dicts(cls, rows: Iterable[Dict[str, float]]) -> "ReadingBatch":
+        return cls.from_readings(AQIReading.from_dict(row) for row in rows)
+
+    def append(self, reading: AQIReading) -> None:
+        self.aqi.append(reading.aqi)
+        self.category.append(_category_code(reading.aqi_category))
+        for name, column in self.columns.items():
+            column.append(_float_or_nan(getattr(reading, name)))
+
+    def __len__(self) -> int:
+        return len(self.aqi)
+
+    def __getitem__(self, index: int) -> AQIReading:
+        values = {name: _nan_to_none(column[index]) for name, column in self.columns.items()}
+        return AQIReading(aqi=self.aqi[index], aqi_category=CATEGORIES[self.category[index]], **values)
+
+    def __iter__(self) -> Iterator[AQIReading]:
+        return (self[i] for i in range(len(self)))
+
+    def to_dicts(self) -> List[Dict[str, float]]:
+        return [reading.to_dict() for reading in self]
+
+    def column(self, name: str) -> Union[array, "np.ndarray"]:
+        """A copy of a numeric column (aqi or any float field), as a NumPy array when NumPy is installed.
+
+        A copy rather than a view: while a view of an array.array is alive, appending to it raises
+        BufferError, which would leave the batch's columns at different lengths.
+        """
+        values = self.aqi if name == "aqi" else self.columns[name]
+        return np.array(values, dtype=values.typecode) if np is not None else array(values.typecode, values)
+
+    def _view(self, name: str) -> "np.ndarray":
+        # Zero-copy, so only for use inside a method; never hand it out (see column()).
+        values = self.aqi if name == "aqi" else self.columns[name]
+        return np.frombuffer(values, dtype=values.typecode) if len(values) else np.empty(0, dtype=values.typecode)
+
+    def mean(self, name: str) -> Optional[float]:
+        """Mean of a column, ignoring missing values."""
+        if np is not None and len(self):
+            values = self._view(name)
+            present = values[~np.isnan(values)] if values.dtype.kind == "f" else values
+            return float(present.mean()) if len(present) else None
+        values = [v for v in (self.aqi if name == "aqi" else self.columns[name]) if not math.isnan(v)]
+        return sum(values) / len(values) if values else None
+
+    def category_counts(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for code in self.category:
+            counts[CATEGORIES[code]] = counts.get(CATEGORIES[code], 0) + 1
+        return counts
+
+    def to_numpy(self) -> "np.ndarray":
+        """NumPy structured array with one record per reading (requires numpy)."""
+        if np is None:
+            raise ImportError("ReadingBatch.to_numpy requires numpy (pip install numpy)")
+        records = np.empty(len(self), dtype=NUMPY_DTYPE)
+        records["aqi"] = self._view("aqi")
+        records["category"] = np.frombuffer(self.category, dtype="i1") if len(self) else []
+        for name in _FLOAT_COLUMNS:
+            records[name] = self._view(name)
+        return records
+
+    @classmethod
+    def from_numpy(cls, records: "np.ndarray") -> "ReadingBatch":
+        batch = cls()
+        batch.aqi.extend(int(v) for v in records["aqi"])
+        batch.category.extend(int(v) for v in records["category"])
+        for name in _FLOAT_COLUMNS:
+            batch.columns[name].extend(float(v) for v in records[name])
+        return batch
+
+READING_FIELDS = tuple(f.name for f in fields(AQIReading))
@@ -0,0 +1,166 @@
+import http.client
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, TypeVar
+from rate_limit import GOVERNOR, RateLimitTimeout
+from tracing import TRACER, count
+
+T = TypeVar("T")
+
+class CircuitOpenError(Exception):
+    """Raised without calling the upstream while its breaker is open"""
+
+class UpstreamHTTPError(Exception):
+    """Non-2xx response from an upstream that does not raise on its own (e.g. http.client)"""
+    def __init__(self, upstream: str, status_code: int, body: str = "") -> None:
+        super().__init__(f"{upstream} returned HTTP {status_code}: {body[:200]}")
+        self.status_code = status_code
+
+@dataclass
+class RetryPolicy:
+    max_attempts: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 8.0
+    # Which failures may be retried; None means any transient one (see is_transient).
+    retry_on: Optional[Callable[[BaseException], bool]] = None
+
+    def should_retry(self, exc: BaseException) -> bool:
+        return (self.retry_on or is_transient)(exc)
+
+    def delay(self, attempt: int) -> float:
+        """Full-jitter exponential backoff for the given (1-based) failed attempt."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+# Twilio sends are not idempotent, so only the breaker applies there by default.
+DEFAULT_RETRY_POLICIES = {
+    "openweathermap": RetryPolicy(max_attempts=3, base_delay=0.5),
+    "serper": RetryPolicy(max_attempts=2, base_delay=0.5),
+    "gemini": RetryPolicy(max_attempts=2, base_delay=1.0),
+    "twilio": RetryPolicy(max_attempts=1),
+}
+
+def is_transient(exc: BaseException) -> bool:
+    """Timeouts, connection errors, 5xx and 429 are worth retrying; everything else is not."""
+    status = getattr(exc, "status_code", None)
+    if status is None and isinstance(getattr(exc, "status", None), int):
+        # Twilio's TwilioRestException carries the HTTP status as `status`.
+        status = exc.status
+    response = getattr(exc, "response", None)
+    if status is None and response is not None:
+        status = getattr(response, "status_code", None)
+    if status is not None:
+        return status >= 500 or status == 429
+    return isinstance(exc, (OSError, http.client.HTTPException))
+
+class CircuitBreaker:
+    """Opens after consecutive transient failures and lets one probe through after a cool-off"""
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.stats = {"calls": 0, "failures": 0, "retries": 0, "short_circuited": 0}
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.stats["short_circuited"] += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.stats["calls"] += 1
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["failures"] += 1
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def record_retry(self) -> None:
+        with self._lock:
+            self.stats["retries"] += 1
+
+    def record_ignored(self) -> None:
+        """The call failed for a non-transient reason; count it without tripping the breaker."""
+        with self._lock:
+            self.stats["calls"] += 1
+            self._probe_in_flight = False
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            retry_in = 0.0
+            if self.state == self.OPEN:
+                retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+            return {"state": self.state, "consecutive_failures": self.consecutive_failures, "retry_in": retry_in, **self.stats}
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+def get_breaker(upstream: str) -> CircuitBreaker:
+    with _breakers_lock:
+        if upstream not in _breakers:
+            _breakers[upstream] = CircuitBreaker(upstream)
+        return _breakers[upstream]
+
+def breaker_states() -> Dict[str, Dict]:
+    """Current state and counters of every upstream breaker, for dashboards and health checks."""
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    return {name: breaker.snapshot() for name, breaker in breakers.items()}
+
+def call_upstream(upstream: str, fn: Callable[..., T], *args, retry: Optional[RetryPolicy] = None, **kwargs) -> T:
+    """Call fn through the upstream's rate limiter, breaker and retry policy."""
+    policy = retry or DEFAULT_RETRY_POLICIES.get(upstream, RetryPolicy())
+    breaker = get_breaker(upstream)
+    with TRACER.span(f"upstream.{upstream}", upstream=upstream) as span:
+        attempt = 0
+        while True:
+            attempt += 1
+            span.attributes["attempts"] = attempt
+            if not breaker.allow():
+                span.attributes["circuit_open"] = True
+                raise CircuitOpenError(f"Circuit for {upstream} is open; failing fast")
+            try:
+                with GOVERNOR.acquire(upstream) as waited:
+                    span.attributes["rate_limit_wait_ms"] = span.attributes.get("rate_limit_wait_ms", 0) + round(waited * 1000, 1)
+                    result = fn(*args, **kwargs)
+            except RateLimitTimeout:
+                breaker.record_ignored()
+                raise
+            except Exception as exc:
+                if not is_transient(exc):
+                    breaker.record_ignored()
+                    raise
+                breaker.record_failure()
+                if attempt >= policy.max_attempts or not policy.should_retry(exc):
+                    raise
+                breaker.record_retry()
+                count("upstream.retries")
+                time.sleep(policy.delay(attempt))
+                continue
+            breaker.record_success()
+            return result
@@ -0,0 +1,180 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from cache import location_key
+
+DEFAULT_RUN_STORE_PATH = os.getenv("RUN_STORE_DB", "runs.db")
+# Identical requests newer than this are answered from the store instead of re-running.
+DEFAULT_REUSE_SECONDS = float(os.getenv("RUN_REUSE_SECONDS", "900"))
+
+@dataclass
+class RunRecord:
+    id: int
+    created_at: float
+    request_key: str
+    city: str
+    state: str
+    country: str
+    medical_conditions: Optional[str]
+    planned_activity: str
+    aqi_data: Dict[str, float]
+    news_summary: str
+    recommendations: str
+    hospital_plan: str
+    alert_needed: bool
+    alert_level: str
+    reason: str
+
+def request_key(user_input, healthcare_api_data: Optional[Dict] = None, epidemic_signal: Optional[Dict] = None, resource_status: Optional[Dict] = None) -> str:
+    """Stable hash of everything that determines a run's output."""
+    payload = {
+        "location": list(location_key(user_input.city, user_input.state, user_input.country)),
+        "medical_conditions": (user_input.medical_conditions or "").strip().lower(),
+        "planned_activity": (user_input.planned_activity or "").strip().lower(),
+        "healthcare_api_data": healthcare_api_data or {},
+        "epidemic_signal": epidemic_signal or {},
+        "resource_status": resource_status or {},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+class RunStore:
+    """SQLite history of completed analyses, indexed for location, time and alert-level queries"""
+    COLUMNS = (
+        "id, created_at, request_key, city, state, country, medical_conditions, planned_activity, "
+        "aqi_data, news_summary, recommendations, hospital_plan, alert_needed, alert_level, reason"
+    )
+
+    def __init__(self, path: str = DEFAULT_RUN_STORE_PATH) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created_at REAL NOT NULL,
+                request_key TEXT NOT NULL,
+                location TEXT NOT NULL,
+                city_key TEXT,
+                state_key TEXT,
+                country_key TEXT,
+                city TEXT NOT NULL,
+                state TEXT,
+                country TEXT NOT NULL,
+                medical_conditions TEXT,
+                planned_activity TEXT,
+                aqi REAL,
+                aqi_category TEXT,
+                aqi_data TEXT NOT NULL,
+                news_summary TEXT,
+                recommendations TEXT,
+                hospital_plan TEXT,
+                alert_needed INTEGER NOT NULL,
+                alert_level TEXT NOT NULL,
+                reason TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_runs_request ON runs (request_key, created_at);
+            CREATE INDEX IF NOT EXISTS idx_runs_location ON runs (location, created_at);
+            CREATE INDEX IF NOT EXISTS idx_runs_created ON runs (created_at);
+            CREATE INDEX IF NOT EXISTS idx_runs_alert ON runs (alert_level, created_at);
+        """)
+        self._add_location_key_columns()
+        self._conn.executescript("""
+            CREATE INDEX IF NOT EXISTS idx_runs_city ON runs (city_key, created_at);
+            CREATE INDEX IF NOT EXISTS idx_runs_country ON runs (country_key, created_at);
+        """)
+        self._conn.commit()
+
+    def _add_location_key_columns(self) -> None:
+        """Migrate stores created before history() could filter on city, state or country alone."""
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(runs)")}
+        if "city_key" in existing:
+            return
+        for column in ("city_key", "state_key", "country_key"):
+            self._conn.execute(f"ALTER TABLE runs ADD COLUMN {column} TEXT")
+        rows = self._conn.execute("SELECT id, location FROM runs").fetchall()
+        self._conn.executemany(
+            "UPDATE runs SET city_key = ?, state_key = ?, country_key = ? WHERE id = ?",
+            [tuple(location.split("|")) + (run_id,) for run_id, location in rows]
+        )
+
+    def record(self, key: str, user_input, result) -> int:
+        """Persist a completed run; `result` is any object with the AnalysisResult fields."""
+        loc_key = location_key(user_input.city, user_input.state, user_input.country)
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO runs (created_at, request_key, location, city_key, state_key, country_key, city, state, country, medical_conditions, planned_activity, "
+                "aqi, aqi_category, aqi_data, news_summary, recommendations, hospital_plan, alert_needed, alert_level, reason) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    time.time(), key, "|".join(loc_key), *loc_key,
+                    user_input.city, user_input.state, user_input.country, user_input.medical_conditions, user_input.planned_activity,
+                    result.aqi_data.get('aqi'), result.aqi_data.get('aqi_category'), json.dumps(result.aqi_data),
+                    result.news_summary, result.recommendations, result.hospital_plan,
+                    int(bool(result.alert_needed)), result.alert_level.value, result.reason
+                )
+            )
+            self._conn.commit()
+            return cursor.lastrowid
+
+    def _to_record(self, row: tuple) -> RunRecord:
+        values = list(row)
+        values[8] = json.loads(values[8])
+        values[12] = bool(values[12])
+        return RunRecord(*values)
+
+    def find_recent(self, key: str, max_age: float = DEFAULT_REUSE_SECONDS) -> Optional[RunRecord]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {self.COLUMNS} FROM runs WHERE request_key = ? AND created_at >= ? ORDER BY created_at DESC LIMIT 1",
+                (key, time.time() - max_age)
+            ).fetchone()
+        return self._to_record(row) if row else None
+
+    def history(self, city: Optional[str] = None, state: Optional[str] = None, country: Optional[str] = None, since: Optional[float] = None, until: Optional[float] = None, alert_level: Optional[str] = None, limit: int = 100) -> List[RunRecord]:
+        """Most recent runs first, filtered by location, time range and alert level.
+
+        Location filters match on whichever of city, state and country are given, so city="Delhi" alone matches every Delhi.
+        """
+        clauses, params = [], []
+        parts = location_key(city or "", state or "", country or "")
+        for column, value in zip(("city_key", "state_key", "country_key"), parts):
+            if value:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(until)
+        if alert_level is not None:
+            clauses.append("alert_level = ?")
+            params.append(alert_level)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {self.COLUMNS} FROM runs {where} ORDER BY created_at DESC LIMIT ?", params + [limit]
+            ).fetchall()
+        return [self._to_record(row) for row in rows]
+
+    def alert_counts(self, since: Optional[float] = None) -> Dict[str, int]:
+        """Runs per alert level, for dashboard summaries."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT alert_level, COUNT(*) FROM runs WHERE created_at >= ? GROUP BY alert_level", (since or 0,)
+            ).fetchall()
+        return dict(rows)
+
+_stores: Dict[str, RunStore] = {}
+_stores_lock = threading.Lock()
+
+def get_run_store(path: str = DEFAULT_RUN_STORE_PATH) -> RunStore:
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = RunStore(path)
+        return _stores[path]
@@ -0,0 +1,66 @@
+from typing import Dict, Optional
+from pydantic import BaseModel, Field
+from health_recommendation_agent import UserInput
+
+class AQIData(BaseModel):
+    aqi: int = Field(description="Air Quality Index (OpenWeatherMap 1-5 scale mapped to 0-500)")
+    aqi_category: Optional[str] = Field(default=None, description="OpenWeatherMap category, e.g. Good or Poor")
+    pm25: float = Field(description="PM2.5 concentration (μg/m³)")
+    pm10: float = Field(description="PM10 concentration (μg/m³)")
+    co: float = Field(description="CO concentration (μg/m³)")
+    no2: float = Field(description="NO2 concentration (μg/m³)")
+    o3: float = Field(description="O3 concentration (μg/m³)")
+    so2: float = Field(description="SO2 concentration (μg/m³)")
+    temperature: Optional[float] = Field(default=None, description="Temperature (°C)")
+    humidity: Optional[float] = Field(default=None, description="Relative humidity (%)")
+    wind_speed: Optional[float] = Field(default=None, description="Wind speed (km/h)")
+    timestamp: str = Field(description="Time when the data was recorded")
+
+class AnalyzeRequest(BaseModel):
+    city: str
+    state: str = "None"
+    country: str
+    medical_conditions: Optional[str] = None
+    planned_activity: str
+    healthcare_api_data: Optional[Dict] = None
+    epidemic_signal: Optional[Dict] = None
+    resource_status: Optional[Dict] = None
+
+    def to_user_input(self) -> UserInput:
+        return UserInput(
+            city=self.city,
+            state=self.state,
+            country=self.country,
+            medical_conditions=self.medical_conditions,
+            planned_activity=self.planned_activity
+        )
+
+class AnalyzeResponse(BaseModel):
+    run_id: Optional[int] = None
+    served_from_store: bool = False
+    aqi: AQIData
+    news_summary: str
+    recommendations: str
+    hospital_plan: str
+    alert_needed: bool
+    alert_level: str
+    reason: str
+    usage: Optional[Dict] = Field(default=None, description="Per-request LLM token, cost, stage latency and cache counters")
+    data_age: Optional[Dict] = Field(default=None, description="Per-source fetched_at, age_seconds and staleness of the data used")
+
+    @classmethod
+    def from_result(cls, result) -> "AnalyzeResponse":
+        """Build the response from a main.AnalysisResult."""
+        return cls(
+            run_id=result.run_id,
+            served_from_store=result.served_from_store,
+            aqi=AQIData.model_validate(result.aqi_data),
+            news_summary=result.news_summary,
+            recommendations=result.recommendations,
+            hospital_plan=result.hospital_plan,
+            alert_needed=result.alert_needed,
+            alert_level=result.alert_level.value,
+            reason=result.reason,
+            usage=result.usage,
+            data_age=result.data_age
+        )
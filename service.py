@@ -0,0 +1,234 @@
+import asyncio
+import hmac
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+from pydantic import ValidationError
+from approval_queue import get_approval_queue
+from feed_ingest import HOSPITAL_FEEDS, start_feed_ingest
+from llm_budget import LLM_BUDGETS, budget_caller
+from main import PipelineAgents, build_agents, get_api_keys, run_analysis
+from rate_limit import GOVERNOR
+from resilience import breaker_states
+from schemas import AnalyzeRequest, AnalyzeResponse
+from watchlist import WatchlistPoller, start_watchlist_poller
+
+# Run with: uvicorn service:app --host 0.0.0.0 --port 8000
+SERVICE_WORKERS = int(os.getenv("SERVICE_WORKERS", "4"))
+SERVICE_MAX_QUEUE = int(os.getenv("SERVICE_MAX_QUEUE", "16"))
+SERVICE_REQUEST_TIMEOUT = float(os.getenv("SERVICE_REQUEST_TIMEOUT", "90"))
+# Analyze requests are a few hundred bytes; anything past this is rejected with 413.
+SERVICE_MAX_BODY_BYTES = int(os.getenv("SERVICE_MAX_BODY_BYTES", str(64 * 1024)))
+# Operators send this in X-Admin-Token to use /approvals; unset, the approval routes are disabled.
+SERVICE_ADMIN_TOKEN = os.getenv("SERVICE_ADMIN_TOKEN", "")
+# Clients send X-API-Key; LLM budgets are charged to the caller the key maps to ("caller:key,...").
+# Unset, /analyze is open and every request shares the one ANONYMOUS_CALLER budget.
+SERVICE_API_KEYS = os.getenv("SERVICE_API_KEYS", "")
+ANONYMOUS_CALLER = "anonymous"
+
+def parse_api_keys(raw: str) -> Dict[str, str]:
+    """Map each API key to its caller name from "caller:key,caller:key"."""
+    keys = {}
+    for entry in filter(None, (part.strip() for part in raw.split(","))):
+        caller, _, key = entry.partition(":")
+        if not caller or not key:
+            raise ValueError(f"SERVICE_API_KEYS entry {entry!r} is not caller:key")
+        keys[key] = caller
+    return keys
+
+class AnalyzerService:
+    """Minimal ASGI app exposing the analysis pipeline over JSON with bounded admission"""
+    def __init__(self, max_workers: int = SERVICE_WORKERS, max_queue: int = SERVICE_MAX_QUEUE, request_timeout: float = SERVICE_REQUEST_TIMEOUT, agent_factory: Callable[[], PipelineAgents] = build_agents, max_body_bytes: int = SERVICE_MAX_BODY_BYTES, admin_token: str = SERVICE_ADMIN_TOKEN, api_keys: Optional[Dict[str, str]] = None) -> None:
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.request_timeout = request_timeout
+        self.max_body_bytes = max_body_bytes
+        self.admin_token = admin_token
+        self.api_keys = parse_api_keys(SERVICE_API_KEYS) if api_keys is None else api_keys
+        self.agent_factory = agent_factory
+        # agno Agents keep per-run state, so each worker thread gets its own set.
+        self._local = threading.local()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._poller: Optional[WatchlistPoller] = None
+        self._admitted = 0
+        self._lock = threading.Lock()
+        self.stats = {"accepted": 0, "shed": 0, "timed_out": 0, "failed": 0}
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="analyze")
+        return self._executor
+
+    def _admit(self) -> bool:
+        # Everything admitted is either running or waiting for a worker; beyond that we shed load.
+        with self._lock:
+            if self._admitted >= self.max_workers + self.max_queue:
+                self.stats["shed"] += 1
+                return False
+            self._admitted += 1
+            self.stats["accepted"] += 1
+            return True
+
+    def _release(self, _future=None) -> None:
+        with self._lock:
+            self._admitted -= 1
+
+    def _worker_agents(self) -> PipelineAgents:
+        agents = getattr(self._local, "agents", None)
+        if agents is None:
+            with self._lock:
+                agents = self._local.agents = self.agent_factory()
+        return agents
+
+    def _analyze(self, request: AnalyzeRequest, caller: Optional[str] = None) -> Dict:
+        agents = self._worker_agents()
+        with budget_caller(caller):
+            result = run_analysis(
+                request.to_user_input(),
+                healthcare_api_data=request.healthcare_api_data,
+                epidemic_signal=request.epidemic_signal,
+                resource_status=request.resource_status,
+                agents=agents
+            )
+        return AnalyzeResponse.from_result(result).model_dump()
+
+    async def _handle_analyze(self, body: bytes, caller: Optional[str] = None):
+        try:
+            request = AnalyzeRequest.model_validate_json(body)
+        except ValidationError as e:
+            return 422, {"error": "invalid request", "detail": json.loads(e.json())}
+        if not self._admit():
+            return 503, {"error": "overloaded, retry later"}
+        future = self.executor.submit(self._analyze, request, caller)
+        # Release the slot when the work really finishes, not when the client gives up,
+        # so timed-out requests still count against capacity while they run.
+        future.add_done_callback(self._release)
+        try:
+            return 200, await asyncio.wait_for(asyncio.wrap_future(future), self.request_timeout)
+        except asyncio.TimeoutError:
+            self.stats["timed_out"] += 1
+            return 504, {"error": f"analysis exceeded {self.request_timeout}s"}
+        except Exception as e:
+            self.stats["failed"] += 1
+            return 502, {"error": str(e)}
+
+    def _health(self) -> Dict:
+        with self._lock:
+            admitted = self._admitted
+        return {
+            "status": "ok",
+            "admitted": admitted,
+            "capacity": self.max_workers + self.max_queue,
+            "stats": self.stats,
+            "breakers": breaker_states(),
+            "rate_limits": GOVERNOR.metrics(),
+            "llm_budgets": LLM_BUDGETS.snapshot(),
+            "hospital_feeds": dict(HOSPITAL_FEEDS.stats)
+        }
+
+    def _is_operator(self, headers: Dict[bytes, bytes]) -> bool:
+        token = headers.get(b"x-admin-token", b"")
+        return hmac.compare_digest(token, self.admin_token.encode("utf-8"))
+
+    def _authenticated_caller(self, headers: Dict[bytes, bytes]) -> Optional[str]:
+        """The caller the X-API-Key belongs to, ANONYMOUS_CALLER when no keys are configured, else None."""
+        if not self.api_keys:
+            return ANONYMOUS_CALLER
+        presented = headers.get(b"x-api-key", b"")
+        caller = None
+        # Compare against every key so the response time doesn't reveal how much of a key matched.
+        for key, name in self.api_keys.items():
+            if hmac.compare_digest(presented, key.encode("utf-8")):
+                caller = name
+        return caller
+
+    def _handle_approvals(self, method: str, path: str):
+        queue = get_approval_queue()
+        parts = path.strip("/").split("/")
+        if method == "GET" and len(parts) == 1:
+            return 200, {"pending": [vars(alert) for alert in queue.list()]}
+        if method == "POST" and parts[1:] == ["approve-all"]:
+            return 200, {"approved": queue.approve_all(decided_by="api")}
+        if method == "POST" and len(parts) == 3 and parts[2] in ("approve", "reject"):
+            decide = queue.approve if parts[2] == "approve" else queue.reject
+            if decide(parts[1], decided_by="api"):
+                return 200, {"id": parts[1], "status": parts[2] + "d"}
+            return 409, {"error": f"alert {parts[1]} is not pending"}
+        return 404, {"error": "not found"}
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+        method, path = scope["method"], scope["path"]
+        headers = dict(scope.get("headers") or [])
+        if method == "POST" and path == "/analyze":
+            # LLM token budgets are tracked per caller, identified by its API key rather than anything it claims.
+            caller = self._authenticated_caller(headers)
+            body = await self._read_body(receive)
+            if caller is None:
+                status, payload = 401, {"error": "valid X-API-Key required"}
+            elif body is None:
+                status, payload = 413, {"error": f"request body exceeds {self.max_body_bytes} bytes"}
+            else:
+                status, payload = await self._handle_analyze(body, caller)
+        elif method == "GET" and path == "/healthz":
+            status, payload = 200, self._health()
+        elif path == "/approvals" or path.startswith("/approvals/"):
+            # Approving sends SMS to every recipient, so only operators holding the admin token may use these routes.
+            if not self.admin_token:
+                status, payload = 403, {"error": "approvals API disabled; set SERVICE_ADMIN_TOKEN"}
+            elif not self._is_operator(headers):
+                status, payload = 401, {"error": "operator X-Admin-Token required"}
+            else:
+                # SQLite work stays off the event loop, on the default executor rather than behind queued analyses.
+                status, payload = await asyncio.get_running_loop().run_in_executor(None, self._handle_approvals, method, path)
+        else:
+            status, payload = 404, {"error": "not found"}
+        await self._send_json(send, status, payload)
+
+    async def _lifespan(self, receive, send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                start_feed_ingest()
+                # Keep AQI and news warm for core cities so their requests are served from cache.
+                api_keys = get_api_keys()
+                if api_keys['openweathermap'] and api_keys['serper']:
+                    self._poller = start_watchlist_poller(api_keys)
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self._poller is not None:
+                    # stop() joins the poller thread, so keep it off the event loop.
+                    await asyncio.get_running_loop().run_in_executor(None, self._poller.stop)
+                    self._poller = None
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False, cancel_futures=True)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _read_body(self, receive) -> Optional[bytes]:
+        """The request body, or None once it grows past max_body_bytes."""
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if len(body) > self.max_body_bytes:
+                return None
+            if not message.get("more_body"):
+                return body
+
+    async def _send_json(self, send, status: int, payload: Dict) -> None:
+        body = json.dumps(payload, default=str).encode("utf-8")
+        headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        if status == 503:
+            headers.append((b"retry-after", b"5"))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+app = AnalyzerService()
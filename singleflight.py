@@ -0,0 +1,76 @@
+import hashlib
+import logging
+import threading
+from typing import Any, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+class _Call:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one execution whose result all callers share"""
+    def __init__(self) -> None:
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.stats = {"executed": 0, "coalesced": 0}
+
+    def do(self, key: Hashable, fn: Callable[..., T], *args, **kwargs) -> T:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.stats["coalesced"] += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.stats["executed"] += 1
+                leader = True
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            # Forget the key before waking followers so later callers start a fresh flight.
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def do_in_background(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> bool:
+        """Start fn in a daemon thread unless a call for key is already in flight; returns whether one was started."""
+        if self.is_in_flight(key):
+            return False
+        threading.Thread(target=self._do_logged, args=(key, fn, args, kwargs), name="singleflight-refresh", daemon=True).start()
+        return True
+
+    def _do_logged(self, key: Hashable, fn: Callable[..., Any], args: tuple, kwargs: dict) -> None:
+        try:
+            self.do(key, fn, *args, **kwargs)
+        except Exception as exc:
+            logger.warning("Background refresh of %s failed: %s", key, exc)
+
+    def is_in_flight(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._calls
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+def prompt_key(agent: str, prompt: str) -> tuple:
+    return ("llm", agent, hashlib.sha256(prompt.encode("utf-8")).hexdigest())
+
+# Shared by the AQI, news and LLM clients, so a thundering herd of identical
+# requests costs one upstream call per distinct key.
+SINGLE_FLIGHT = SingleFlight()
@@ -0,0 +1,103 @@
+import math
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+# GSM 03.38 basic character set; anything outside it (and the extension table)
+# forces the whole message into UCS-2.
+GSM7_BASIC = set(
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+)
+# Extension characters are sent as ESC + char, costing two septets each.
+GSM7_EXTENDED = set("^{}\\[~]|€\f")
+
+GSM7_SINGLE, GSM7_MULTI = 160, 153
+UCS2_SINGLE, UCS2_MULTI = 70, 67
+
+# Common characters in LLM output and our templates that have a GSM-7 stand-in.
+GSM7_TRANSLITERATIONS = {
+    "‘": "'", "’": "'", "“": '"', "”": '"', "–": "-", "—": "-", "…": "...",
+    "µ": "u", "μ": "u", "³": "3", "²": "2", "°": " deg", "•": "-", " ": " ",
+}
+
+@dataclass
+class ComposedMessage:
+    body: str
+    encoding: str
+    segments: int
+    template: str
+
+def is_gsm7(text: str) -> bool:
+    return all(ch in GSM7_BASIC or ch in GSM7_EXTENDED for ch in text)
+
+def _septets(text: str) -> int:
+    return sum(2 if ch in GSM7_EXTENDED else 1 for ch in text)
+
+def count_segments(text: str) -> tuple:
+    """Return (encoding, segments) for text as a carrier would bill it."""
+    if is_gsm7(text):
+        septets = _septets(text)
+        return "GSM-7", 1 if septets <= GSM7_SINGLE else math.ceil(septets / GSM7_MULTI)
+    # UCS-2 counts UTF-16 code units, so emoji outside the BMP take two.
+    units = len(text.encode("utf-16-le")) // 2
+    return "UCS-2", 1 if units <= UCS2_SINGLE else math.ceil(units / UCS2_MULTI)
+
+def to_gsm7(text: str) -> str:
+    """Transliterate what we can and drop whatever still falls outside GSM-7."""
+    text = "".join(GSM7_TRANSLITERATIONS.get(ch, ch) for ch in text)
+    return "".join(ch for ch in text if ch in GSM7_BASIC or ch in GSM7_EXTENDED)
+
+EMOJI_MAP = {"critical": "🔴", "high": "🟠", "medium": "🟡", "low": "🟢"}
+
+def _render(template: str, level: str, aqi_data: Dict[str, float], reason: str) -> str:
+    if template == "full":
+        message = f"{EMOJI_MAP.get(level, '⚠️')} HEALTH ALERT - {level.upper()}\n\n"
+        message += f"AQI: {aqi_data['aqi']} ({aqi_data['aqi_category']})\n"
+        message += f"PM2.5: {aqi_data['pm25']} μg/m³\n\n"
+        message += f"{reason}\n\n"
+        message += "Take necessary precautions. Check full report for details."
+        return message
+    if template == "standard":
+        message = f"HEALTH ALERT - {level.upper()}\n"
+        message += f"AQI: {aqi_data['aqi']} ({aqi_data['aqi_category']})\n"
+        message += f"PM2.5: {aqi_data['pm25']:.0f} ug/m3\n"
+        message += f"{to_gsm7(reason)}\n"
+        message += "Take necessary precautions."
+        return message
+    return f"{level.upper()} AIR ALERT: AQI {aqi_data['aqi']} ({aqi_data['aqi_category']}), PM2.5 {aqi_data['pm25']:.0f}ug/m3. {to_gsm7(reason)}"
+
+# Richest first; ties on segment count go to the earlier template.
+TEMPLATES: List[str] = ["full", "standard", "compact"]
+
+def compose_alert(level: str, aqi_data: Dict[str, float], reason: str, max_segments: Optional[int] = 1) -> ComposedMessage:
+    """Pick the cheapest rendering (fewest segments) that fits max_segments, truncating the reason if nothing fits.
+
+    With max_segments=None there is no segment budget and the richest template is sent as is:
+
+    >>> aqi = {'aqi': 175, 'aqi_category': 'Unhealthy', 'pm25': 80.0}
+    >>> compose_alert('high', aqi, 'Stay indoors.', max_segments=None).template
+    'full'
+    >>> compose_alert('high', aqi, 'Stay indoors.', max_segments=1).template
+    'standard'
+    """
+    candidates = []
+    for template in TEMPLATES:
+        body = _render(template, level, aqi_data, reason)
+        encoding, segments = count_segments(body)
+        candidates.append(ComposedMessage(body, encoding, segments, template))
+    if max_segments is None:
+        return candidates[0]
+    best = min(candidates, key=lambda c: (c.segments, TEMPLATES.index(c.template)))
+    if best.segments <= max_segments:
+        return best
+    # Even the compact form is over budget: shorten the reason until it fits.
+    budget = GSM7_SINGLE if max_segments == 1 else GSM7_MULTI * max_segments
+    compact_reason = to_gsm7(reason)
+    while compact_reason:
+        overflow = _septets(_render("compact", level, aqi_data, compact_reason + "...")) - budget
+        if overflow <= 0:
+            break
+        compact_reason = compact_reason[:max(0, len(compact_reason) - overflow)].rstrip()
+    body = _render("compact", level, aqi_data, compact_reason + "..." if compact_reason else "")
+    encoding, segments = count_segments(body)
+    return ComposedMessage(body, encoding, segments, "compact")
@@ -0,0 +1,55 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List
+
+# Cold-start budget for importing each entry point in a fresh interpreter.
+DEFAULT_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "400"))
+DEFAULT_MODULES = ["main", "main3", "watchlist", "approval_queue"]
+# Heavy SDKs that must only load on first use, never at import.
+LAZY_MODULES = ["agno", "google.genai", "requests", "streamlit", "twilio"]
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({{"ms": elapsed, "eager": [m for m in {lazy!r} if m in sys.modules]}}))
+"""
+
+def measure(module: str, runs: int = 5) -> Dict:
+    """Best-of-runs import time for module in fresh interpreters, plus any lazy SDKs it pulled in."""
+    timings, eager = [], set()
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(module=module, lazy=LAZY_MODULES)],
+            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+        if out.returncode != 0:
+            raise RuntimeError(f"importing {module} failed:\n{out.stderr.strip()}")
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        timings.append(result["ms"])
+        eager.update(result["eager"])
+    return {"module": module, "best_ms": min(timings), "median_ms": sorted(timings)[len(timings) // 2], "eager": sorted(eager)}
+
+def run(modules: List[str], budget_ms: float, runs: int) -> bool:
+    ok = True
+    for module in modules:
+        result = measure(module, runs)
+        over = result["best_ms"] > budget_ms
+        status = "OVER BUDGET" if over else "ok"
+        print(f"{module:16} best {result['best_ms']:7.1f} ms  median {result['median_ms']:7.1f} ms  {status}")
+        if result["eager"]:
+            print(f"{'':16} eagerly imports: {', '.join(result['eager'])}")
+        ok = ok and not over and not result["eager"]
+    return ok
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check import-time cold start of the entry points against a budget")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    sys.exit(0 if run(args.modules, args.budget_ms, args.runs) else 1)
@@ -1,7 +1,8 @@
-from typing import Dict
-from agno.agent import Agent
-from agno.models.google import Gemini
+from typing import Dict, Optional
+from gemini_agent import GeminiAgent
+from llm_budget import FULL
 from enum import Enum
+import re
 
 class AlertLevel(Enum):
     LOW = "low"
@@ -9,21 +10,47 @@ class AlertLevel(Enum):
     HIGH = "high"
     CRITICAL = "critical"
 
-class ThresholdAgent:
+# Mirrors the thresholds in the evaluation prompt, for answering without the model.
+AQI_ALERT_THRESHOLDS = [(200, AlertLevel.CRITICAL), (150, AlertLevel.HIGH), (100, AlertLevel.MEDIUM)]
+LEVEL_ORDER = [AlertLevel.LOW, AlertLevel.MEDIUM, AlertLevel.HIGH, AlertLevel.CRITICAL]
+SURGE_RISK_PATTERN = re.compile(r"SURGE_RISK_LEVEL:\W*(LOW|MEDIUM|HIGH|CRITICAL)", re.IGNORECASE)
+
+def parse_surge_risk(hospital_plan: str) -> Optional[AlertLevel]:
+    match = SURGE_RISK_PATTERN.search(hospital_plan or "")
+    return AlertLevel(match.group(1).lower()) if match else None
+
+def rule_based_level(aqi: float, surge_risk: Optional[AlertLevel] = None) -> AlertLevel:
+    """Alert level from the AQI thresholds, raised to the planning agent's surge risk when that is higher."""
+    level = next((candidate for threshold, candidate in AQI_ALERT_THRESHOLDS if aqi > threshold), AlertLevel.LOW)
+    if surge_risk is not None and LEVEL_ORDER.index(surge_risk) > LEVEL_ORDER.index(level):
+        level = surge_risk
+    return level
+
+THRESHOLD_INSTRUCTIONS = """You are a Threshold Evaluation Agent for a health alert system.
+Each request gives air quality data and excerpts of the hospital plan and health recommendations. Determine if an SMS alert should be sent.
+**Alert Thresholds:**
+- CRITICAL: AQI > 200 OR Surge Risk = Critical OR Very Poor air quality with vulnerable populations
+- HIGH: AQI > 150 OR Surge Risk = High OR Poor air quality with health advisories
+- MEDIUM: AQI > 100 OR Surge Risk = Medium OR Moderate air quality concerns
+- LOW: No alert needed
+Respond in this EXACT format:
+ALERT_NEEDED: [YES/NO]
+ALERT_LEVEL: [CRITICAL/HIGH/MEDIUM/LOW]
+REASON: [Brief explanation in one sentence]"""
+
+class ThresholdAgent(GeminiAgent):
     """Evaluates conditions and determines if alert notification is needed"""
-    def __init__(self, gemini_key: str) -> None:
-        self.agent = Agent(
-            model=Gemini(
-                id="gemini-2.5-flash",
-                api_key=gemini_key
-            ),
-            markdown=True
-        )
+    name = "threshold"
+    instructions = THRESHOLD_INSTRUCTIONS
 
     def evaluate_alert_needed(self, aqi_data: Dict[str, float], hospital_plan: str, recommendations: str) -> tuple[bool, AlertLevel, str]:
-        prompt = f"""
-        You are a Threshold Evaluation Agent for a health alert system.
-        Analyze the following data and determine if an SMS alert should be sent:
+        if self.budget_mode() != FULL:
+            return self._evaluate_by_rules(aqi_data, hospital_plan)
+        return self._parse_response(self._run(self._build_prompt(aqi_data, hospital_plan, recommendations)))
+
+    def _build_prompt(self, aqi_data: Dict[str, float], hospital_plan: str, recommendations: str) -> str:
+        # Only the per-request data; the static instructions go out once as the system message.
+        return f"""
         **Air Quality Data:**
         - AQI: {aqi_data['aqi']} ({aqi_data['aqi_category']})
         - PM2.5: {aqi_data['pm25']} μg/m³
@@ -32,18 +59,9 @@ class ThresholdAgent:
         {hospital_plan[:500]}...
         **Health Recommendations Excerpt:**
         {recommendations[:500]}...
-        **Alert Thresholds:**
-        - CRITICAL: AQI > 200 OR Surge Risk = Critical OR Very Poor air quality with vulnerable populations
-        - HIGH: AQI > 150 OR Surge Risk = High OR Poor air quality with health advisories
-        - MEDIUM: AQI > 100 OR Surge Risk = Medium OR Moderate air quality concerns
-        - LOW: No alert needed
-        Respond in this EXACT format:
-        ALERT_NEEDED: [YES/NO]
-        ALERT_LEVEL: [CRITICAL/HIGH/MEDIUM/LOW]
-        REASON: [Brief explanation in one sentence]
         """
-        response = self.agent.run(prompt)
-        content = response.content
+
+    def _parse_response(self, content: str) -> tuple[bool, AlertLevel, str]:
         alert_needed = "YES" in content and "ALERT_NEEDED: YES" in content
         alert_level = AlertLevel.LOW
         if "CRITICAL" in content:
@@ -56,3 +74,11 @@ class ThresholdAgent:
         if "REASON:" in content:
             reason = content.split("REASON:")[1].split("\n")[0].strip()
         return alert_needed, alert_level, reason
+
+    def _evaluate_by_rules(self, aqi_data: Dict[str, float], hospital_plan: str) -> tuple[bool, AlertLevel, str]:
+        surge_risk = parse_surge_risk(hospital_plan)
+        alert_level = rule_based_level(aqi_data['aqi'], surge_risk)
+        reason = f"AQI {aqi_data['aqi']} ({aqi_data['aqi_category']})"
+        if surge_risk is not None:
+            reason += f" with {surge_risk.value} hospital surge risk"
+        return alert_level != AlertLevel.LOW, alert_level, reason + " (rule-based evaluation)."
@@ -0,0 +1,201 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# USD per million tokens for gemini-2.5-flash; override when pricing or the model changes.
+GEMINI_INPUT_COST_PER_M = float(os.getenv("GEMINI_INPUT_COST_PER_M", "0.30"))
+GEMINI_OUTPUT_COST_PER_M = float(os.getenv("GEMINI_OUTPUT_COST_PER_M", "2.50"))
+# Input tokens served from Gemini's context cache (implicit or explicit) are billed at this rate instead.
+GEMINI_CACHED_INPUT_COST_PER_M = float(os.getenv("GEMINI_CACHED_INPUT_COST_PER_M", "0.075"))
+
+def llm_cost(input_tokens: int, output_tokens: int, cached_tokens: int = 0) -> float:
+    fresh_tokens = max(0, input_tokens - cached_tokens)
+    return (fresh_tokens * GEMINI_INPUT_COST_PER_M + cached_tokens * GEMINI_CACHED_INPUT_COST_PER_M + output_tokens * GEMINI_OUTPUT_COST_PER_M) / 1_000_000
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start: float
+    end: Optional[float] = None
+    status: str = "ok"
+    error: Optional[str] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        return None if self.end is None else (self.end - self.start) * 1000
+
+class Trace:
+    """Per-request accumulator that the spans of one trace report tokens, cost and counters into"""
+    def __init__(self, trace_id: str) -> None:
+        self.trace_id = trace_id
+        self.by_agent: Dict[str, Dict[str, float]] = {}
+        self.counters: Dict[str, int] = {}
+        self.stages_ms: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add_llm_usage(self, agent: str, input_tokens: int, output_tokens: int, cached_tokens: int = 0) -> None:
+        with self._lock:
+            usage = self.by_agent.setdefault(agent, {"calls": 0, "input_tokens": 0, "output_tokens": 0, "cached_tokens": 0, "cost_usd": 0.0})
+            usage["calls"] += 1
+            usage["input_tokens"] += input_tokens
+            usage["output_tokens"] += output_tokens
+            usage["cached_tokens"] += cached_tokens
+            usage["cost_usd"] += llm_cost(input_tokens, output_tokens, cached_tokens)
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            by_agent = {agent: dict(usage, cost_usd=round(usage["cost_usd"], 6)) for agent, usage in self.by_agent.items()}
+            return {
+                "trace_id": self.trace_id,
+                "llm_calls": sum(u["calls"] for u in by_agent.values()),
+                "input_tokens": sum(u["input_tokens"] for u in by_agent.values()),
+                "output_tokens": sum(u["output_tokens"] for u in by_agent.values()),
+                "cached_tokens": sum(u["cached_tokens"] for u in by_agent.values()),
+                "cost_usd": round(sum(u["cost_usd"] for u in by_agent.values()), 6),
+                "by_agent": by_agent,
+                "stages_ms": dict(self.stages_ms),
+                "counters": dict(self.counters),
+            }
+
+class SpanExporter:
+    """Receives every finished span; subclass and pass to Tracer.set_exporter"""
+    def export(self, span: Span) -> None:
+        pass
+
+class InMemoryExporter(SpanExporter):
+    """Keeps finished spans in a list, for tests and ad-hoc inspection"""
+    def __init__(self) -> None:
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def by_trace(self, trace_id: str) -> List[Span]:
+        with self._lock:
+            return [span for span in self.spans if span.trace_id == trace_id]
+
+    def clear(self) -> None:
+        with self._lock:
+            self.spans.clear()
+
+class JsonLinesExporter(SpanExporter):
+    """Appends one JSON object per finished span to a file"""
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(asdict(span), default=str)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("current_trace", default=None)
+
+class Tracer:
+    """Creates nested spans through a context variable and hands finished spans to the exporter"""
+    def __init__(self, exporter: Optional[SpanExporter] = None) -> None:
+        self.exporter = exporter or SpanExporter()
+
+    def set_exporter(self, exporter: SpanExporter) -> None:
+        self.exporter = exporter
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span]:
+        parent: Optional[Span] = _current_span.get()
+        trace: Optional[Trace] = _current_trace.get()
+        if trace is None:
+            trace = Trace(uuid.uuid4().hex)
+        span = Span(name, trace.trace_id, uuid.uuid4().hex[:16], parent.span_id if parent else None, time.time(), attributes=attributes)
+        span_token = _current_span.set(span)
+        trace_token = _current_trace.set(trace)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.end = time.time()
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+            if name.startswith("stage."):
+                trace.stages_ms[name[len("stage."):]] = round(span.duration_ms, 1)
+            try:
+                self.exporter.export(span)
+            except Exception:
+                # Tracing must never break the request it observes.
+                logger.exception("Span exporter failed")
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+def set_attribute(key: str, value: Any) -> None:
+    span = _current_span.get()
+    if span is not None:
+        span.attributes[key] = value
+
+def count(name: str, n: int = 1) -> None:
+    """Increment a counter on the current span and its trace, e.g. cache.hit or upstream.retries."""
+    span = _current_span.get()
+    if span is not None:
+        span.attributes[name] = span.attributes.get(name, 0) + n
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.count(name, n)
+
+def _metric(metrics: Any, name: str) -> int:
+    # agno 1.x reports a dict of per-message lists; 2.x a Metrics object with totals.
+    value = metrics.get(name) if isinstance(metrics, dict) else getattr(metrics, name, None)
+    if isinstance(value, (list, tuple)):
+        return int(sum(v or 0 for v in value))
+    return int(value or 0)
+
+def record_llm_usage(agent: str, response: Any) -> Tuple[int, int, int]:
+    """Attribute the prompt, completion and cached tokens of an agno run response to the current span and trace."""
+    metrics = getattr(response, "metrics", None)
+    if metrics is None:
+        return 0, 0, 0
+    input_tokens = _metric(metrics, "input_tokens")
+    output_tokens = _metric(metrics, "output_tokens")
+    # agno 1.x calls it cached_tokens, 2.x cache_read_tokens.
+    cached_tokens = _metric(metrics, "cached_tokens") or _metric(metrics, "cache_read_tokens")
+    set_attribute("llm.agent", agent)
+    set_attribute("llm.input_tokens", input_tokens)
+    set_attribute("llm.output_tokens", output_tokens)
+    set_attribute("llm.cached_tokens", cached_tokens)
+    set_attribute("llm.cost_usd", round(llm_cost(input_tokens, output_tokens, cached_tokens), 6))
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_llm_usage(agent, input_tokens, output_tokens, cached_tokens)
+    return input_tokens, output_tokens, cached_tokens
+
+def _exporter_from_env() -> SpanExporter:
+    path = os.getenv("TRACE_EXPORT_PATH")
+    return JsonLinesExporter(path) if path else SpanExporter()
+
+# Spans are dropped unless TRACE_EXPORT_PATH is set or an exporter is installed.
+TRACER = Tracer(_exporter_from_env())
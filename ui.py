@@ -1,6 +1,10 @@
 import streamlit as st
 from health_recommendation_agent import UserInput
-from main import analyze_conditions, get_api_keys
+from main import build_agents, get_api_keys, run_analysis
+from watchlist import start_watchlist_poller
+from resilience import breaker_states
+from llm_budget import LLM_BUDGETS
+from approval_queue import get_approval_queue
 
 COLORS = {
   "primary": "#2B4A7A",      
@@ -10,7 +14,34 @@ COLORS = {
   "text_dark": "#222222",
   "white": "#FFFFFF"
 }
+# Analyses kept per session, keyed by form inputs; older ones are dropped first.
+MAX_CACHED_ANALYSES = 5
+
+def format_age(seconds) -> str:
+    if seconds is None:
+        return "unavailable"
+    if seconds < 90:
+        return "just now"
+    if seconds < 5400:
+        return f"{seconds / 60:.0f} min old"
+    return f"{seconds / 3600:.1f} h old"
+
+def get_pipeline_agents():
+    # agno Agents keep per-run state, so each browser session builds and keeps its own set.
+    if "pipeline_agents" not in st.session_state:
+        st.session_state["pipeline_agents"] = build_agents(get_api_keys())
+    return st.session_state["pipeline_agents"]
+
+@st.cache_resource
+def get_watchlist_poller():
+    # Keep AQI and news warm for core cities so their requests are served from cache.
+    api_keys = get_api_keys()
+    if api_keys['openweathermap'] and api_keys['serper']:
+        return start_watchlist_poller(api_keys)
+    return None
+
 st.set_page_config(page_title="AQI Health Analyzer", page_icon="🌍", layout="centered")
+get_watchlist_poller()
 st.markdown(f"""
     <style>
         .stApp {{
@@ -37,6 +68,31 @@ st.markdown(f"""
 st.markdown('<div class="main-title">AQI Health Analyzer</div>', unsafe_allow_html=True)
 st.markdown('<div class="subtitle">Get air quality, health recommendations, and pollution news</div>', unsafe_allow_html=True)
 
+with st.sidebar.expander("Upstream status"):
+    for upstream, breaker in breaker_states().items():
+        st.write(f"{upstream}: {breaker['state']} ({breaker['failures']} failures, {breaker['retries']} retries)")
+    for agent, budget in LLM_BUDGETS.snapshot()["agents"].items():
+        st.write(f"Gemini {agent}: {budget['mode']} ({budget['minute']['used']}/{budget['minute']['limit']} tokens/min, {budget['day']['used']}/{budget['day']['limit']} today)")
+
+with st.sidebar.expander("Pending SMS approvals"):
+    approval_queue = get_approval_queue()
+    pending_alerts = approval_queue.list()
+    if not pending_alerts:
+        st.write("No alerts awaiting approval.")
+    for pending in pending_alerts:
+        st.write(f"**{pending.alert_level.upper()}** · {pending.location} · {len(pending.recipients)} recipients")
+        st.caption(pending.reason)
+        approve_col, reject_col = st.columns(2)
+        if approve_col.button("Approve", key=f"approve_{pending.id}"):
+            approval_queue.approve(pending.id, decided_by="streamlit")
+            st.rerun()
+        if reject_col.button("Reject", key=f"reject_{pending.id}"):
+            approval_queue.reject(pending.id, decided_by="streamlit")
+            st.rerun()
+    if len(pending_alerts) > 1 and st.button("Approve all"):
+        approval_queue.approve_all([p.id for p in pending_alerts], decided_by="streamlit")
+        st.rerun()
+
 with st.form("user_input_form"):
     city = st.text_input("City", "Delhi")
     state = st.text_input("State", "Delhi")
@@ -46,23 +102,45 @@ with st.form("user_input_form"):
     submitted = st.form_submit_button("Analyze")
 
 if submitted:
-    st.info("Analyzing conditions...", icon="🔎")
-    user_input = UserInput(
-        city=city,
-        state=state,
-        country=country,
-        medical_conditions=medical_conditions,
-        planned_activity=planned_activity
-    )
-    API_KEYS = get_api_keys()
-    recommendations, news_summary, hospital_plan, alert_needed, alert_level, reason = analyze_conditions(
-        user_input=user_input,
-        api_keys=API_KEYS,
-        healthcare_api_data={},
-        epidemic_signal=None,
-        resource_status=None,
-        notification_config={}
-    )
+    form_inputs = (city, state, country, medical_conditions, planned_activity)
+    analyses = st.session_state.setdefault("analyses", {})
+    if form_inputs not in analyses:
+        user_input = UserInput(
+            city=city,
+            state=state,
+            country=country,
+            medical_conditions=medical_conditions,
+            planned_activity=planned_activity
+        )
+        with st.spinner("Analyzing conditions..."):
+            analyses[form_inputs] = run_analysis(
+                user_input,
+                healthcare_api_data={},
+                epidemic_signal=None,
+                resource_status=None,
+                agents=get_pipeline_agents()
+            )
+        while len(analyses) > MAX_CACHED_ANALYSES:
+            analyses.pop(next(iter(analyses)))
+    st.session_state["current_analysis"] = form_inputs
+
+# Everything below renders from session state, so widget interactions rerun
+# the script without re-running the pipeline.
+current_analysis = st.session_state.get("current_analysis")
+if current_analysis and current_analysis in st.session_state.get("analyses", {}):
+    city, state, country, medical_conditions, planned_activity = current_analysis
+    result = st.session_state["analyses"][current_analysis]
+    recommendations, news_summary, hospital_plan, alert_needed, alert_level, reason = result.as_tuple()
+    if result.data_age:
+        # Stale-while-revalidate may serve cached data during upstream brownouts; say how old it is.
+        labels = {"aqi": "Air quality & weather", "news": "News", "run": "Stored analysis"}
+        ages = []
+        for source, age in result.data_age.items():
+            text = f"{labels.get(source, source)}: {format_age(age['age_seconds'])}"
+            if age["revalidating"]:
+                text += " (refreshing)"
+            ages.append(text)
+        st.caption(" · ".join(ages))
     st.subheader("📰 Recent Pollution News")
     st.markdown(news_summary)
     st.subheader("✅ Health Recommendations")
@@ -0,0 +1,166 @@
+import heapq
+import os
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from aqi_analyzer import AQIAnalyzer
+from pollution_news_agent import PollutionNewsAgent
+from rate_limit import Priority, request_priority
+
+@dataclass(frozen=True)
+class WatchedLocation:
+    city: str
+    state: str
+    country: str
+
+# Core cities kept warm by default: Mumbai and a spread of its wards, plus Delhi.
+DEFAULT_WATCHLIST = [
+    WatchedLocation("Mumbai", "Maharashtra", "India"),
+    WatchedLocation("Colaba", "Maharashtra", "India"),
+    WatchedLocation("Bandra", "Maharashtra", "India"),
+    WatchedLocation("Andheri", "Maharashtra", "India"),
+    WatchedLocation("Kurla", "Maharashtra", "India"),
+    WatchedLocation("Chembur", "Maharashtra", "India"),
+    WatchedLocation("Borivali", "Maharashtra", "India"),
+    WatchedLocation("Delhi", "Delhi", "India"),
+]
+
+# Upstream calls made by one refresh of each kind (geocoding is cached separately).
+UPSTREAM_COST = {
+    "aqi": ("openweathermap", 2),
+    "news": ("serper", 3),
+}
+
+DEFAULT_INTERVALS = {"aqi": 600, "news": 1800}
+DEFAULT_BUDGETS = {"openweathermap": 1000, "serper": 200}
+
+def load_watchlist(spec: Optional[str] = None) -> List[WatchedLocation]:
+    """Parse "City,State,Country;City,State,Country" (or $AQI_WATCHLIST); falls back to DEFAULT_WATCHLIST."""
+    spec = spec if spec is not None else os.getenv("AQI_WATCHLIST", "")
+    locations = []
+    for item in spec.split(";"):
+        parts = [p.strip() for p in item.split(",")]
+        if len(parts) == 3 and parts[0]:
+            locations.append(WatchedLocation(*parts))
+        elif len(parts) == 2 and parts[0]:
+            locations.append(WatchedLocation(parts[0], "None", parts[1]))
+    return locations or list(DEFAULT_WATCHLIST)
+
+class RequestBudget:
+    """Sliding-window cap on how many upstream requests the poller may spend"""
+    def __init__(self, limit: int, window_seconds: float = 3600) -> None:
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self._spent = deque()
+        self._lock = threading.Lock()
+
+    def try_spend(self, cost: int = 1) -> bool:
+        now = time.time()
+        with self._lock:
+            while self._spent and self._spent[0] <= now - self.window_seconds:
+                self._spent.popleft()
+            if len(self._spent) + cost > self.limit:
+                return False
+            self._spent.extend([now] * cost)
+            return True
+
+    def remaining(self) -> int:
+        now = time.time()
+        with self._lock:
+            return self.limit - sum(1 for t in self._spent if t > now - self.window_seconds)
+
+class WatchlistPoller:
+    """Periodically refreshes AQI, weather and news for a watchlist into the shared cache"""
+    def __init__(self, api_keys: Dict[str, str], locations: Optional[List[WatchedLocation]] = None, intervals: Optional[Dict[str, float]] = None, budgets: Optional[Dict[str, int]] = None, jitter: float = 0.2) -> None:
+        self.locations = locations if locations is not None else load_watchlist()
+        self.intervals = {**DEFAULT_INTERVALS, **(intervals or {})}
+        self.budgets = {name: RequestBudget(limit) for name, limit in {**DEFAULT_BUDGETS, **(budgets or {})}.items()}
+        self.jitter = jitter
+        self.aqi_analyzer = AQIAnalyzer(api_key=api_keys['openweathermap'])
+        self.news_agent = PollutionNewsAgent(api_key=api_keys['serper'])
+        self.stats = {"refreshed": 0, "failed": 0, "skipped_budget": 0}
+        self._schedule = []
+        self._seq = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _jittered(self, interval: float) -> float:
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _push(self, due: float, kind: str, location: WatchedLocation) -> None:
+        self._seq += 1
+        heapq.heappush(self._schedule, (due, self._seq, kind, location))
+
+    def _cache_ttl(self, kind: str) -> float:
+        # Outlive the next scheduled refresh so readers never see a gap between polls.
+        return self.intervals[kind] * (1 + self.jitter) * 2
+
+    def refresh(self, kind: str, location: WatchedLocation) -> bool:
+        upstream, cost = UPSTREAM_COST[kind]
+        if not self.budgets[upstream].try_spend(cost):
+            self.stats["skipped_budget"] += 1
+            return False
+        try:
+            if kind == "aqi":
+                self.aqi_analyzer.refresh_aqi_data(location.city, location.state, location.country, ttl=self._cache_ttl(kind))
+            else:
+                self.news_agent.refresh_news(location.city, location.state, location.country, ttl=self._cache_ttl(kind))
+        except Exception:
+            self.stats["failed"] += 1
+            return False
+        self.stats["refreshed"] += 1
+        return True
+
+    def poll_once(self) -> None:
+        """Refresh every watched location once, ignoring the schedule."""
+        with request_priority(Priority.BATCH):
+            for location in self.locations:
+                for kind in self.intervals:
+                    self.refresh(kind, location)
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        now = time.time()
+        self._schedule = []
+        for location in self.locations:
+            for kind, interval in self.intervals.items():
+                # Spread the first round out so startup does not burst every upstream at once.
+                self._push(now + random.uniform(0, interval * self.jitter), kind, location)
+        self._thread = threading.Thread(target=self._run, name="watchlist-poller", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _run(self) -> None:
+        # Background refreshes always yield upstream capacity to interactive users.
+        with request_priority(Priority.BATCH):
+            self._run_schedule()
+
+    def _run_schedule(self) -> None:
+        while not self._stop.is_set() and self._schedule:
+            due, _, kind, location = self._schedule[0]
+            if self._stop.wait(max(0.0, due - time.time())):
+                break
+            heapq.heappop(self._schedule)
+            self.refresh(kind, location)
+            self._push(time.time() + self._jittered(self.intervals[kind]), kind, location)
+
+_poller: Optional[WatchlistPoller] = None
+_poller_lock = threading.Lock()
+
+def start_watchlist_poller(api_keys: Dict[str, str], locations: Optional[List[WatchedLocation]] = None) -> WatchlistPoller:
+    """Start the process-wide poller once; later calls return the running instance."""
+    global _poller
+    with _poller_lock:
+        if _poller is None:
+            _poller = WatchlistPoller(api_keys, locations)
+            _poller.start()
+        return _poller